@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 from django.core.management.utils import get_random_secret_key
@@ -25,6 +26,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'djoser',
@@ -35,7 +37,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'recipes.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'recipes.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -67,7 +71,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.TokenAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
     'DEFAULT_PAGINATION_CLASS': 'recipes.pagination.StandardResultsSetPagination',
@@ -76,6 +80,11 @@ REST_FRAMEWORK = {
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
+ASGI_APPLICATION = 'foodgram.asgi.application'
+
+# Асинхронные обработчики чтения; foodgram.asgi включает их по умолчанию.
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'false').lower() == 'true'
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -87,6 +96,67 @@ DATABASES = {
     }
 }
 
+# Реплики только для чтения: хосты через запятую, host или host:port.
+DATABASE_REPLICAS = []
+for index, replica in enumerate(filter(None, (
+        host.strip() for host in os.getenv('DB_REPLICA_HOSTS', '').split(',')
+))):
+    host, _, port = replica.partition(':')
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{index}')
+
+DATABASE_ROUTERS = ['recipes.db_router.PrimaryReplicaRouter']
+
+# Сколько секунд после записи клиент читает только с primary.
+DATABASE_PRIMARY_PIN_SECONDS = int(os.getenv('DB_PRIMARY_PIN_SECONDS', 10))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'recipes': {
+        'BACKEND': os.getenv(
+            'RECIPE_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('RECIPE_CACHE_LOCATION', 'recipes'),
+        'TIMEOUT': None,
+    },
+    'tokens': {
+        'BACKEND': os.getenv(
+            'TOKEN_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('TOKEN_CACHE_LOCATION', 'tokens'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+RECIPE_CACHE_ALIAS = 'recipes'
+
+TOKEN_CACHE_ALIAS = 'tokens'
+
+TOKEN_CACHE_TIMEOUT = int(os.getenv('TOKEN_CACHE_TIMEOUT', 60))
+
+# Каталог снимков метрик процессов: общий для всех воркеров сервера.
+METRICS_DIR = os.getenv(
+    'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'foodgram-metrics'))
+
+METRICS_FLUSH_SECONDS = float(os.getenv('METRICS_FLUSH_SECONDS', 5))
+
+RECIPE_CACHE_TIMEOUT = int(os.getenv('RECIPE_CACHE_TIMEOUT', 24 * 60 * 60))
+
+RECIPE_IMAGE_MAX_BYTES = int(
+    os.getenv('RECIPE_IMAGE_MAX_BYTES', 10 * 1024 * 1024))
+
+RECIPE_IMAGE_MAX_DIMENSION = int(
+    os.getenv('RECIPE_IMAGE_MAX_DIMENSION', 6000))
+
+DATA_UPLOAD_MAX_MEMORY_SIZE = RECIPE_IMAGE_MAX_BYTES * 4 // 3 + 1024 * 1024
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
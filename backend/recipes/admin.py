@@ -1,9 +1,16 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.db import transaction
 
 from recipes.models import (
     Favorite, Ingredient, IngredientRecipe,
     Recipe, Tag, TagRecipe, ShoppingList
 )
+from recipes.search import search_recipes
+from recipes.serializers import RecipeSnapshotSerializer
+from recipes.shopping_totals import (
+    add_recipes_to_totals, recipe_amounts, remove_recipes_from_totals,
+    sync_recipe_totals)
 
 
 class TagRecipeInLine(admin.TabularInline):
@@ -34,6 +41,16 @@ class TagAdmin(admin.ModelAdmin):
     list_filter = ('name',)
 
 
+class RecipeChangeList(ChangeList):
+    """Список рецептов, где найденные рецепты идут по релевантности."""
+
+    def get_ordering(self, request, queryset):
+        ordering = super().get_ordering(request, queryset)
+        if self.query and ORDER_VAR not in self.params:
+            return ['-rank', *ordering]
+        return ordering
+
+
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     list_display = ('name', 'text', 'favorites_count')
@@ -47,6 +64,22 @@ class RecipeAdmin(admin.ModelAdmin):
         """Возвращает количество добавлений рецепта в избранное."""
         return Favorite.objects.filter(recipe=obj).count()
 
+    def get_changelist(self, request, **kwargs):
+        return RecipeChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return super().get_search_results(
+                request, queryset, search_term)
+        return search_recipes(queryset, search_term), False
+
+    def save_related(self, request, form, formsets, change):
+        old_amounts = recipe_amounts(form.instance.pk)
+        super().save_related(request, form, formsets, change)
+        sync_recipe_totals(form.instance.pk, old_amounts)
+        RecipeSnapshotSerializer.rebuild(
+            Recipe.objects.filter(pk=form.instance.pk))
+
 
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
@@ -74,3 +107,20 @@ class ShoppingListAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe')
     search_fields = ('user__username', 'recipe__name')
     list_filter = ('user', 'recipe')
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            old = ShoppingList.objects.get(pk=obj.pk)
+            remove_recipes_from_totals(old.user_id, [old.recipe_id])
+        super().save_model(request, obj, form, change)
+        add_recipes_to_totals(obj.user_id, [obj.recipe_id])
+
+    def delete_model(self, request, obj):
+        remove_recipes_from_totals(obj.user_id, [obj.recipe_id])
+        super().delete_model(request, obj)
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        for item in queryset:
+            remove_recipes_from_totals(item.user_id, [item.recipe_id])
+        super().delete_queryset(request, queryset)
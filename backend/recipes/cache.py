@@ -0,0 +1,145 @@
+import time
+from functools import partial
+from hashlib import md5
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+from recipes.metrics import RECIPE_CACHE_HITS, RECIPE_CACHE_MISSES, registry
+
+LIST_VERSION_KEY = 'recipes:list:version'
+DETAIL_VERSION_KEY = 'recipes:detail:{pk}:version'
+TAGS_VERSION_KEY = 'tags:version'
+INGREDIENTS_VERSION_KEY = 'ingredients:version'
+USER_VERSION_KEY = 'users:{pk}:version'
+RESPONSE_KEY = 'recipes:response:{digest}'
+
+
+def get_cache():
+    """Возвращает кэш ответов для анонимного просмотра рецептов."""
+    return caches[settings.RECIPE_CACHE_ALIAS]
+
+
+def get_versions(keys):
+    """
+    Возвращает штампы версий (время изменения в наносекундах).
+
+    Отсутствующий штамп создается с текущим временем: после вытеснения
+    из кэша клиенты получат новый валидатор, а не устаревший.
+    """
+    cache = get_cache()
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        now = time.time_ns()
+        for key in missing:
+            cache.add(key, now, timeout=None)
+        versions.update(cache.get_many(missing))
+    return [versions[key] for key in keys]
+
+
+async def aget_versions(keys):
+    """Асинхронный вариант get_versions()."""
+    cache = get_cache()
+    versions = await cache.aget_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        now = time.time_ns()
+        for key in missing:
+            await cache.aadd(key, now, timeout=None)
+        versions.update(await cache.aget_many(missing))
+    return [versions[key] for key in keys]
+
+
+def touch_versions(keys):
+    """
+    Обновляет штампы версий, сбрасывая зависящие от них ответы.
+
+    Внутри транзакции штампы меняются после ее фиксации: иначе
+    параллельный запрос сохранил бы под новой версией (в кэше ответов
+    или у клиента с новым ETag) еще старые данные.
+    """
+    transaction.on_commit(partial(set_versions, keys))
+
+
+def set_versions(keys):
+    now = time.time_ns()
+    get_cache().set_many({key: now for key in keys}, timeout=None)
+
+
+def invalidate_recipes(recipe_ids):
+    """
+    Сбрасывает закэшированные ответы для переданных рецептов.
+
+    Версии детальных страниц и списков заменяются новыми штампами,
+    поэтому старые записи больше не находятся и вытесняются кэшем.
+    """
+    if not recipe_ids:
+        return
+    touch_versions([LIST_VERSION_KEY] + [
+        DETAIL_VERSION_KEY.format(pk=pk) for pk in recipe_ids])
+
+
+def get_stats():
+    """
+    Возвращает счетчики попаданий и промахов кэша всех процессов.
+
+    Счетчики хранятся в реестре метрик, а не в самом кэше, поэтому
+    складываются между воркерами и при кэше в памяти процесса.
+    """
+    _routes, _responses, counters = registry.collect()
+    return counters[RECIPE_CACHE_HITS], counters[RECIPE_CACHE_MISSES]
+
+
+def request_fingerprint(request, *versions):
+    """Возвращает хэш адреса запроса с отсортированными параметрами."""
+    params = urlencode(sorted(request.query_params.lists()), doseq=True)
+    raw = (f'{versions}:{request.scheme}://{request.get_host()}'
+           f'{request.path}?{params}')
+    return md5(raw.encode()).hexdigest()
+
+
+def cached_response(request, version_key, build_response):
+    """
+    Отдает ответ анонимному пользователю из общего кэша.
+
+    Для авторизованных пользователей ответ всегда строится заново,
+    так как содержит персональные поля.
+    """
+    if request.user.is_authenticated:
+        return build_response()
+    cache = get_cache()
+    key = RESPONSE_KEY.format(digest=request_fingerprint(
+        request, *get_versions([version_key])))
+    data = cache.get(key)
+    if data is not None:
+        registry.increment(RECIPE_CACHE_HITS)
+        return Response(data)
+    registry.increment(RECIPE_CACHE_MISSES)
+    response = build_response()
+    if response.status_code == status.HTTP_200_OK:
+        cache.set(key, response.data, settings.RECIPE_CACHE_TIMEOUT)
+    return response
+
+
+async def acached_response(request, version_key, build_response):
+    """Асинхронный вариант cached_response() для корутины build_response."""
+    if request.user.is_authenticated:
+        return await build_response()
+    cache = get_cache()
+    key = RESPONSE_KEY.format(digest=request_fingerprint(
+        request, *await aget_versions([version_key])))
+    data = await cache.aget(key)
+    if data is not None:
+        registry.increment(RECIPE_CACHE_HITS)
+        return Response(data)
+    registry.increment(RECIPE_CACHE_MISSES)
+    response = await build_response()
+    if response.status_code == status.HTTP_200_OK:
+        await cache.aset(
+            key, response.data, settings.RECIPE_CACHE_TIMEOUT)
+    return response
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Warning, register
+
+
+def is_process_local(alias):
+    """Проверяет, хранит ли кэш записи только в памяти процесса."""
+    return isinstance(caches[alias], LocMemCache)
+
+
+@register(deploy=True)
+def check_shared_caches(app_configs, **kwargs):
+    """
+    Предупреждает о кэшах в памяти процесса при развертывании.
+
+    Воркеры сервера не видят записей друг друга в таких кэшах.
+    """
+    warnings = []
+    if is_process_local(settings.RECIPE_CACHE_ALIAS):
+        warnings.append(Warning(
+            'Кэш рецептов хранится в памяти процесса.',
+            hint=('Штампы версий не доходят до других воркеров: они '
+                  'отдают устаревшие ответы, ETag и подсказки индекса '
+                  'ингредиентов. Задайте общий RECIPE_CACHE_BACKEND, '
+                  'например Redis.'),
+            id='recipes.W001'))
+        if settings.DATABASE_REPLICAS:
+            warnings.append(Warning(
+                'Закрепление клиентов за primary хранится в памяти процесса.',
+                hint=('Запрос, попавший в другой воркер после записи, '
+                      'читает с отстающей реплики. Задайте общий '
+                      'RECIPE_CACHE_BACKEND, например Redis.'),
+                id='recipes.W002'))
+    if is_process_local(settings.TOKEN_CACHE_ALIAS):
+        warnings.append(Warning(
+            'Кэш токенов хранится в памяти процесса.',
+            hint=('Выход и смена пароля сбрасывают токен только в одном '
+                  'воркере, остальные принимают его еще до '
+                  'TOKEN_CACHE_TIMEOUT секунд. Задайте общий '
+                  'TOKEN_CACHE_BACKEND, например Redis.'),
+            id='recipes.W003'))
+    return warnings
@@ -1,6 +1,21 @@
 PAGE_SIZE = 6
 PAGE_SIZE_QUERY_PARAM = 'limit'
 MAX_PAGE_SIZE = 100
+MAX_BATCH_SIZE = 100
+CURSOR_QUERY_PARAM = 'cursor'
+RECIPE_CURSOR_ORDERING = ('-created_at', '-id')
+FEED_CURSOR_ORDERING = ('-created_at', '-recipe_id')
+FEED_FANOUT_BATCH_SIZE = 1000
+FEED_BACKFILL_SIZE = 100
+
+SEARCH_CONFIG = 'russian'
+SHOPPING_LIST_CHUNK_SIZE = 500
+
+IMAGE_VARIANTS = (
+    ('thumbnail', (320, 320)),
+    ('medium', (960, 960)),
+)
+IMAGE_VARIANT_QUALITY = 80
 
 RETURN_STR_LENGTH = 30
 CHAR_MAX_LENGTH = 200
@@ -9,3 +24,9 @@ SLUG_MAX_LENGTH = 200
 MAX_POSITIVE_INT_FIELD = 2147483647
 MIN_INGREDIENT_AMOUNT = 1
 MIN_COOKING_TIME = 1
+
+DEFAULT_TAGS = (
+    ('веганский', 'vegan'),
+    ('безглютеновый', 'gluten_free'),
+    ('низкокалорийный', 'low_calorie'),
+)
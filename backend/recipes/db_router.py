@@ -0,0 +1,91 @@
+import random
+from contextvars import ContextVar
+from hashlib import md5
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+from recipes.cache import get_cache
+
+PRIMARY_PIN_KEY = 'db:primary:{digest}'
+
+_read_alias = ContextVar('read_alias', default=None)
+
+
+def pin_key(credentials):
+    """Возвращает ключ закрепления клиента за primary."""
+    return PRIMARY_PIN_KEY.format(digest=md5(credentials.encode()).hexdigest())
+
+
+def pin_to_primary(credentials):
+    """
+    Направляет чтения клиента на primary на короткое время.
+
+    За это время реплики успевают получить его изменения, и только что
+    созданные рецепт или подписка не пропадают из ответов. Отметка
+    хранится в кэше рецептов: он должен быть общим для воркеров.
+    """
+    if settings.DATABASE_REPLICAS:
+        get_cache().set(
+            pin_key(credentials), True,
+            settings.DATABASE_PRIMARY_PIN_SECONDS)
+
+
+async def apin_to_primary(credentials):
+    """Асинхронный вариант pin_to_primary()."""
+    if settings.DATABASE_REPLICAS:
+        await get_cache().aset(
+            pin_key(credentials), True,
+            settings.DATABASE_PRIMARY_PIN_SECONDS)
+
+
+def get_credentials(request):
+    """Возвращает заголовок Authorization запроса или None."""
+    return request.META.get('HTTP_AUTHORIZATION') or None
+
+
+def can_read_from_replica(request):
+    """
+    Проверяет, можно ли читать данные запроса с реплики.
+
+    Закрепление клиента здесь не учитывается. Запросы с сессионной
+    cookie (админка) всегда идут на primary.
+    """
+    return (request.method in SAFE_METHODS
+            and bool(settings.DATABASE_REPLICAS)
+            and settings.SESSION_COOKIE_NAME not in request.COOKIES)
+
+
+def use_read_database(alias):
+    """Задает базу для чтений текущего запроса; None означает primary."""
+    _read_alias.set(alias)
+
+
+def choose_replica():
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+class PrimaryReplicaRouter:
+    """
+    Направляет чтения безопасных запросов на реплики, остальное на primary.
+
+    Реплика выбирается middleware на весь запрос. После первой записи
+    и внутри транзакций чтения идут на primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        _read_alias.set(None)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,78 @@
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from recipes.cache import LIST_VERSION_KEY, touch_versions
+from recipes.constants import (
+    FEED_BACKFILL_SIZE, FEED_FANOUT_BATCH_SIZE, RECIPE_CURSOR_ORDERING)
+from recipes.models import FeedEntry, FeedFanout, Recipe
+from users.models import Subscription
+
+
+def fan_out_batch(recipe, after=0, batch_size=FEED_FANOUT_BATCH_SIZE):
+    """
+    Добавляет рецепт в ленты следующей пачки подписчиков автора.
+
+    Подписчики перебираются по возрастанию id, начиная после after.
+    Возвращает id последнего подписчика пачки или None,
+    если подписчики закончились.
+    """
+    followers = list(Subscription.objects.filter(
+        following_id=recipe.author_id, user_id__gt=after
+    ).order_by('user_id').values_list('user_id', flat=True)[:batch_size])
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(
+            user_id=user_id, recipe_id=recipe.pk,
+            author_id=recipe.author_id, created_at=recipe.created_at)
+         for user_id in followers),
+        ignore_conflicts=True)
+    if len(followers) < batch_size:
+        return None
+    return followers[-1]
+
+
+def publish_recipe(recipe):
+    """
+    Раскладывает новый рецепт в ленты подписчиков автора.
+
+    Первая пачка обрабатывается сразу. Если подписчиков больше,
+    остаток ставится в очередь команды process_feed_fanout.
+    """
+    last_user_id = fan_out_batch(recipe)
+    if last_user_id is not None:
+        FeedFanout.objects.update_or_create(
+            recipe=recipe, defaults={'last_user_id': last_user_id})
+
+
+def process_fanout(fanout, batch_size=FEED_FANOUT_BATCH_SIZE):
+    """Завершает отложенную раздачу, сохраняя прогресс после каждой пачки."""
+    last_user_id = fanout.last_user_id
+    while last_user_id is not None:
+        last_user_id = fan_out_batch(
+            fanout.recipe, last_user_id, batch_size)
+        touch_versions([LIST_VERSION_KEY])
+        if last_user_id is not None:
+            fanout.last_user_id = last_user_id
+            fanout.save(update_fields=('last_user_id',))
+    fanout.delete()
+
+
+def backfill_feed(user_id, author_ids):
+    """Добавляет в ленту подписчика последние рецепты новых авторов."""
+    recipes = Recipe.objects.filter(author_id__in=author_ids).annotate(
+        row_number=Window(
+            RowNumber(), partition_by=F('author'),
+            order_by=RECIPE_CURSOR_ORDERING)
+    ).filter(row_number__lte=FEED_BACKFILL_SIZE).values_list(
+        'id', 'author_id', 'created_at')
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(
+            user_id=user_id, recipe_id=recipe_id,
+            author_id=author_id, created_at=created_at)
+         for recipe_id, author_id, created_at in recipes),
+        ignore_conflicts=True)
+
+
+def trim_feed(user_id, author_ids):
+    """Удаляет из ленты подписчика рецепты авторов, от которых он отписался."""
+    FeedEntry.objects.filter(
+        user_id=user_id, author_id__in=author_ids).delete()
@@ -1,14 +1,134 @@
 import base64
+import binascii
+import hashlib
+import re
+from io import BytesIO
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import (
+    InMemoryUploadedFile, TemporaryUploadedFile)
+from PIL import Image
 from rest_framework import serializers
 
+DATA_URL_RE = re.compile(r'data:image/(?P<ext>[a-z0-9.+-]+);base64,')
+CHUNK_SIZE = 64 * 1024
+HEADER_PROBE_SIZE = 1024 * 1024
+
+
+def image_size(file):
+    """Возвращает размеры изображения по заголовку или None."""
+    position = file.tell()
+    file.seek(0)
+    try:
+        return Image.open(file).size
+    except (OSError, EOFError, ValueError):
+        return None
+    finally:
+        file.seek(position)
+
 
 class Base64ImageField(serializers.ImageField):
+    """
+    Поле изображения в формате data URL.
+
+    Base64 декодируется частями: небольшие файлы остаются в памяти,
+    большие переносятся во временный файл на диске. Размер файла
+    и разрешение проверяются до окончания декодирования, а хэш
+    содержимого считается попутно для хранилища картинок.
+    """
+
+    default_error_messages = {
+        'malformed': 'Некорректные данные изображения в base64.',
+        'too_large': 'Размер изображения превышает {max_bytes} байт.',
+        'too_many_pixels': ('Изображение больше {max_dimension} пикселей '
+                            'по ширине или высоте.'),
+    }
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            _format, imgstr = data.split(';base64,')
-            ext = _format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            data = self.decode(data)
 
         return super().to_internal_value(data)
+
+    def decode(self, data):
+        match = DATA_URL_RE.match(data)
+        if match is None or (len(data) - match.end()) % 4:
+            self.fail('malformed')
+        max_bytes = settings.RECIPE_IMAGE_MAX_BYTES
+        if (len(data) - match.end()) // 4 * 3 - 2 > max_bytes:
+            self.fail('too_large', max_bytes=max_bytes)
+        name = f'temp.{match["ext"]}'
+        content_type = f'image/{match["ext"]}'
+        file = BytesIO()
+        digest = hashlib.sha256()
+        size_checked = False
+        try:
+            for start in range(match.end(), len(data), CHUNK_SIZE):
+                try:
+                    chunk = base64.b64decode(
+                        data[start:start + CHUNK_SIZE], validate=True)
+                except binascii.Error:
+                    self.fail('malformed')
+                file.write(chunk)
+                digest.update(chunk)
+                if (isinstance(file, BytesIO) and file.tell()
+                        > settings.FILE_UPLOAD_MAX_MEMORY_SIZE):
+                    file = self.move_to_disk(file, name, content_type)
+                if not size_checked and file.tell() <= HEADER_PROBE_SIZE:
+                    size_checked = self.check_dimensions(file)
+            if not size_checked:
+                self.check_dimensions(file)
+        except Exception:
+            file.close()
+            raise
+        size = file.tell()
+        file.seek(0)
+        if isinstance(file, BytesIO):
+            file = InMemoryUploadedFile(
+                file, None, name, content_type, size, None)
+        file.size = size
+        file.sha256 = digest.hexdigest()
+        return file
+
+    @staticmethod
+    def move_to_disk(buffer, name, content_type):
+        """Переносит декодированное начало файла во временный файл."""
+        file = TemporaryUploadedFile(name, content_type, 0, None)
+        file.write(buffer.getbuffer())
+        buffer.close()
+        return file
+
+    def check_dimensions(self, file):
+        """Проверяет разрешение, если заголовок уже декодирован."""
+        max_dimension = settings.RECIPE_IMAGE_MAX_DIMENSION
+        try:
+            size = image_size(file)
+        except Image.DecompressionBombError:
+            self.fail('too_many_pixels', max_dimension=max_dimension)
+        if size is None:
+            return False
+        if max(size) > max_dimension:
+            self.fail('too_many_pixels', max_dimension=max_dimension)
+        return True
+
+
+class ImageVariantField(serializers.ReadOnlyField):
+    """
+    URL уменьшенной копии картинки рецепта.
+
+    Пока копия не создана, возвращается адрес оригинала.
+    """
+
+    def __init__(self, variant, **kwargs):
+        kwargs['source'] = '*'
+        super().__init__(**kwargs)
+        self.variant = variant
+
+    def to_representation(self, recipe):
+        if not recipe.image:
+            return None
+        name = recipe.image_variants.get(self.variant)
+        url = default_storage.url(name) if name else recipe.image.url
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
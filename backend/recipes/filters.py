@@ -1,6 +1,9 @@
 from django_filters import rest_framework as filters
+from rest_framework import serializers
 
+from recipes.constants import CURSOR_QUERY_PARAM
 from recipes.models import Ingredient, Recipe
+from recipes.search import search_recipes
 
 
 class IngredientFilter(filters.FilterSet):
@@ -16,12 +19,14 @@ class RecipeFilter(filters.FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart')
     tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    search = filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
         fields = ('author', 'tags',
                   'is_favorited',
-                  'is_in_shopping_cart')
+                  'is_in_shopping_cart',
+                  'search')
 
     def filter_is_favorited(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
@@ -32,3 +37,12 @@ class RecipeFilter(filters.FilterSet):
         if value and self.request.user.is_authenticated:
             return queryset.filter(shopping_lists__user=self.request.user)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        # Курсор продолжает выборку по created_at и потерял бы порядок
+        # по релевантности, поэтому поиск листается только по страницам.
+        if CURSOR_QUERY_PARAM in self.request.query_params:
+            raise serializers.ValidationError({
+                name: 'Поиск не поддерживает параметр '
+                      f'{CURSOR_QUERY_PARAM}, используйте page.'})
+        return search_recipes(queryset, value)
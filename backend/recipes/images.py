@@ -0,0 +1,102 @@
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps, features
+
+from recipes.constants import IMAGE_VARIANT_QUALITY, IMAGE_VARIANTS
+from recipes.models import Recipe
+from recipes.storage import lock_name
+
+SOURCE_KEY = 'source'
+
+
+def variant_format():
+    """Возвращает формат копий: WebP, если Pillow его поддерживает."""
+    return ('WEBP', 'webp') if features.check('webp') else ('JPEG', 'jpg')
+
+
+def needs_variants(image_name, variants):
+    """Проверяет, устарели ли копии относительно текущей картинки."""
+    return bool(image_name) and variants.get(SOURCE_KEY) != image_name
+
+
+def render_variants(image_name):
+    """
+    Создает уменьшенные копии картинки рядом с оригиналом.
+
+    Возвращает словарь путей копий по названиям вариантов
+    вместе с именем исходного файла.
+    """
+    image_format, extension = variant_format()
+    stem = os.path.splitext(image_name)[0]
+    variants = {SOURCE_KEY: image_name}
+    storage = Recipe._meta.get_field('image').storage
+    with storage.open(image_name) as file, Image.open(file) as image:
+        image.draft('RGB', max(size for _name, size in IMAGE_VARIANTS))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA') or image_format == 'JPEG':
+            image = image.convert('RGB')
+        for name, size in IMAGE_VARIANTS:
+            variant = image.copy()
+            variant.thumbnail(size, Image.LANCZOS)
+            buffer = BytesIO()
+            variant.save(buffer, image_format, quality=IMAGE_VARIANT_QUALITY)
+            path = f'{stem}_{name}.{extension}'
+            default_storage.delete(path)
+            variants[name] = default_storage.save(
+                path, ContentFile(buffer.getvalue()))
+    return variants
+
+
+def variant_paths(image_name):
+    """Возвращает возможные пути копий картинки во всех форматах."""
+    stem = os.path.splitext(image_name)[0]
+    return [
+        f'{stem}_{name}.{extension}'
+        for name, _size in IMAGE_VARIANTS
+        for extension in ('webp', 'jpg')
+    ]
+
+
+def refresh_variants(recipe):
+    """
+    Пересоздает копии картинки рецепта, если она изменилась.
+
+    Если у другого рецепта та же картинка, его копии используются
+    повторно без повторной обработки.
+    """
+    image_name = recipe.image.name
+    if not needs_variants(image_name, recipe.image_variants):
+        return False
+    variants = Recipe.objects.filter(
+        image_variants__source=image_name
+    ).values_list('image_variants', flat=True).first()
+    if variants is None:
+        variants = render_variants(image_name)
+    Recipe.objects.filter(pk=recipe.pk).update(image_variants=variants)
+    recipe.image_variants = variants
+    return True
+
+
+@transaction.atomic
+def release_image(image_name):
+    """
+    Удаляет файл картинки и ее копии, если на нее не ссылается ни один рецепт.
+
+    Одинаковые картинки хранятся в одном файле, поэтому файл удаляется
+    только вместе с последним использующим его рецептом. Ссылки
+    проверяются под блокировкой имени: она дожидается фиксации загрузок,
+    которые в этот момент переиспользуют файл.
+    """
+    if not image_name:
+        return False
+    lock_name(image_name)
+    if Recipe.objects.filter(image=image_name).exists():
+        return False
+    Recipe._meta.get_field('image').storage.delete(image_name)
+    for path in variant_paths(image_name):
+        default_storage.delete(path)
+    return True
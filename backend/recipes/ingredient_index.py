@@ -0,0 +1,60 @@
+from bisect import bisect_left
+from itertools import chain
+
+from recipes.cache import INGREDIENTS_VERSION_KEY, get_versions
+from recipes.models import Ingredient
+
+MAX_CHAR = chr(0x10FFFF)
+
+
+def normalize(value):
+    """Приводит название к виду для поиска: без регистра, ё -> е."""
+    return value.strip().casefold().replace('ё', 'е')
+
+
+class IngredientIndex:
+    """
+    Отсортированный индекс названий ингредиентов в памяти процесса.
+
+    Совпадения по началу названия ищутся бинарным поиском,
+    вхождения в середину названия возвращаются после них.
+    """
+
+    def __init__(self, ingredients):
+        self.entries = sorted(
+            ((normalize(ingredient['name']), ingredient)
+             for ingredient in ingredients),
+            key=lambda entry: (entry[0], entry[1]['name'], entry[1]['id']))
+        self.keys = [key for key, _ingredient in self.entries]
+
+    @classmethod
+    def from_database(cls):
+        return cls(Ingredient.objects.values(
+            'id', 'name', 'measurement_unit'))
+
+    def search(self, query):
+        query = normalize(query)
+        start = bisect_left(self.keys, query)
+        end = bisect_left(self.keys, query + MAX_CHAR, lo=start)
+        contained = (
+            ingredient
+            for key, ingredient in chain(
+                self.entries[:start], self.entries[end:])
+            if query in key
+        )
+        prefixed = (ingredient for _key, ingredient in self.entries[start:end])
+        return list(chain(prefixed, contained))
+
+
+_index = None
+_index_version = None
+
+
+def get_ingredient_index():
+    """Возвращает индекс, перестраивая его после изменения ингредиентов."""
+    global _index, _index_version
+    version, = get_versions([INGREDIENTS_VERSION_KEY])
+    if _index is None or version != _index_version:
+        _index = IngredientIndex.from_database()
+        _index_version = version
+    return _index
@@ -0,0 +1,95 @@
+import csv
+import json
+from itertools import islice
+
+from recipes.utils import slug_color
+
+BATCH_SIZE = 1000
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+def iter_csv_rows(file):
+    """Построчно читает пары (название, единица измерения) из CSV."""
+    for row in csv.reader(file):
+        if row:
+            name, measurement_unit = row
+            yield name, measurement_unit
+
+
+def iter_json_rows(file):
+    """
+    Потоково читает JSON-массив объектов ингредиентов.
+
+    Файл разбирается кусками, поэтому в памяти не держится целиком.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    while True:
+        chunk = file.read(JSON_CHUNK_SIZE)
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if not started and position < len(buffer):
+                if buffer[position] != '[':
+                    raise ValueError('Ожидается JSON-массив ингредиентов.')
+                started = True
+                position += 1
+                continue
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break
+            yield item['name'], item['measurement_unit']
+        if not chunk:
+            if buffer[position:].strip():
+                raise ValueError('Некорректный JSON в файле ингредиентов.')
+            return
+
+
+def bulk_insert(model, objects, batch_size=BATCH_SIZE):
+    """
+    Вставляет объекты пакетами, пропуская нарушения уникальности.
+
+    Возвращает количество добавленных и пропущенных записей.
+    """
+    before = model.objects.count()
+    total = 0
+    objects = iter(objects)
+    while batch := list(islice(objects, batch_size)):
+        model.objects.bulk_create(batch, ignore_conflicts=True)
+        total += len(batch)
+    inserted = model.objects.count() - before
+    return inserted, total - inserted
+
+
+def load_ingredients(model, rows, batch_size=BATCH_SIZE):
+    """Загружает ингредиенты из пар (название, единица измерения)."""
+    return bulk_insert(model, (
+        model(name=name.strip(), measurement_unit=measurement_unit.strip())
+        for name, measurement_unit in rows
+    ), batch_size)
+
+
+def load_tags(model, tags, batch_size=BATCH_SIZE):
+    """
+    Загружает теги из пар (название, слаг).
+
+    Цвет вычисляется из слага и не совпадает с цветами других тегов:
+    иначе уникальный цвет молча отбросил бы тег при вставке.
+    """
+    used = {color.upper() for color in model.objects.values_list(
+        'color', flat=True)}
+
+    def with_colors():
+        for name, slug in tags:
+            color = slug_color(slug, used)
+            used.add(color)
+            yield model(name=name, slug=slug, color=color)
+
+    return bulk_insert(model, with_colors(), batch_size)
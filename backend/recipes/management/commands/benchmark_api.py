@@ -0,0 +1,431 @@
+import base64
+import json
+import statistics
+import time
+from contextlib import ExitStack
+from io import BytesIO
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import (
+    setup_test_environment, teardown_test_environment)
+from django.urls import NoReverseMatch, URLResolver, resolve, reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from recipes import urls
+from recipes.management.commands.generate_dataset import (
+    DEFAULT_PASSWORD, USERNAME_PREFIX)
+from recipes.management.commands.load_test import percentile
+from recipes.models import (
+    Favorite, Ingredient, IngredientRecipe, Recipe, ShoppingList, Tag)
+from users.models import Subscription
+
+User = get_user_model()
+
+API_PREFIX = '/api/'
+NEW_USER_EMAIL = 'bench-new-user@example.com'
+
+
+class QueryCounter:
+    """Обертка выполнения запросов, считающая SQL-запросы во всех базах."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self.stack = ExitStack()
+        for alias in connections:
+            self.stack.enter_context(
+                connections[alias].execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stack.close()
+
+
+class Endpoint:
+    """
+    Замеряемый запрос к API.
+
+    before и after выполняются вне замера: они готовят состояние и
+    откатывают изменения, чтобы каждый повтор начинался с одних данных.
+    before может вернуть значения для подстановки в путь.
+    """
+
+    def __init__(self, route, method, path, auth='user', data=None,
+                 before=None, after=None, label=''):
+        self.route = route
+        self.method = method
+        self.path = path
+        self.auth = auth
+        self.data = data
+        self.before = before
+        self.after = after
+        self.name = ' '.join(filter(None, (method, route, label)))
+
+
+def image_data():
+    """Возвращает небольшую картинку в формате data URL."""
+    buffer = BytesIO()
+    Image.new('RGB', (64, 48), (120, 160, 90)).save(buffer, 'PNG')
+    return ('data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+def api_routes():
+    """
+    Возвращает пары (метод, имя маршрута) из recipes/urls.py.
+
+    Учитываются только маршруты, которые действительно достаются
+    представлениям проекта, а не перекрыты djoser или другим путем.
+    """
+    routes = set()
+    patterns = list(urls.urlpatterns)
+    while patterns:
+        pattern = patterns.pop()
+        if isinstance(pattern, URLResolver):
+            patterns += pattern.url_patterns
+            continue
+        for kwargs in ({}, {'pk': 1}):
+            try:
+                match = resolve(reverse(pattern.name, kwargs=kwargs))
+            except NoReverseMatch:
+                continue
+            view = getattr(match.func, 'cls', None)
+            if (match.url_name != pattern.name or view is None
+                    or not view.__module__.startswith(
+                        ('recipes.', 'users.'))):
+                break
+            methods = getattr(match.func, 'actions', None) or [
+                method for method in view.http_method_names
+                if hasattr(view, method)]
+            routes.update(
+                (method.upper(), pattern.name) for method in methods
+                if method not in ('head', 'options'))
+            break
+    return routes
+
+
+class Command(BaseCommand):
+    help = ('Замеряет p50/p95 задержки и число SQL-запросов для каждого '
+            'эндпоинта API на данных generate_dataset и сохраняет '
+            'результаты в JSON для сравнения запусков.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', type=int, default=50,
+            help='Количество замеров каждого эндпоинта.')
+        parser.add_argument(
+            '--warmup', type=int, default=3,
+            help='Количество запросов без замера перед замерами.')
+        parser.add_argument(
+            '--only', nargs='+', default=(),
+            help='Замерять только эндпоинты, в названии которых '
+                 'есть одна из подстрок.')
+        parser.add_argument(
+            '--password', default=DEFAULT_PASSWORD,
+            help='Пароль сгенерированных пользователей.')
+        parser.add_argument(
+            '--output',
+            help='Файл для результатов; по умолчанию '
+                 'benchmark-<дата>.json в текущем каталоге.')
+        parser.add_argument(
+            '--compare',
+            help='Файл результатов прошлого запуска для сравнения.')
+
+    def handle(self, *args, **options):
+        previous = {}
+        if options['compare']:
+            try:
+                with open(options['compare']) as file:
+                    previous = json.load(file)['endpoints']
+            except (OSError, ValueError, KeyError) as error:
+                raise CommandError(
+                    f'Не удалось прочитать {options["compare"]}: {error}')
+        endpoints = [
+            endpoint for endpoint in self.prepare(options['password'])
+            if not options['only'] or any(
+                part in endpoint.name for part in options['only'])]
+        setup_test_environment()
+        try:
+            self.client = Client(raise_request_exception=False)
+            results = {}
+            self.stdout.write(
+                f'{"эндпоинт":<48}{"p50, мс":>9}{"p95, мс":>9}'
+                f'{"запросов":>9}{"ошибок":>8}')
+            for endpoint in endpoints:
+                result = self.measure(
+                    endpoint, options['repeat'], options['warmup'])
+                results[endpoint.name] = result
+                self.report(endpoint.name, result,
+                            previous.get(endpoint.name))
+        finally:
+            teardown_test_environment()
+        uncovered = api_routes() - {
+            (endpoint.method, endpoint.route) for endpoint in endpoints}
+        if uncovered and not options['only']:
+            self.stdout.write(self.style.WARNING(
+                'Без замеров: ' + ', '.join(
+                    f'{method} {route}'
+                    for method, route in sorted(uncovered))))
+        output = Path(options['output'] or timezone.now().strftime(
+            'benchmark-%Y%m%d-%H%M%S.json'))
+        output.write_text(json.dumps({
+            'created_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'repeat': options['repeat'],
+            'dataset': self.dataset,
+            'endpoints': results,
+        }, ensure_ascii=False, indent=2))
+        self.stdout.write(self.style.SUCCESS(
+            f'Результаты сохранены в {output}'))
+
+    def prepare(self, password):
+        """Выбирает данные для запросов и составляет список эндпоинтов."""
+        generated = User.objects.filter(
+            username__startswith=USERNAME_PREFIX, is_active=True)
+        user = generated.filter(recipes__isnull=False).annotate(
+            cart=Count('shopping_lists', distinct=True)
+        ).order_by('-cart', 'pk').first()
+        if user is None:
+            raise CommandError(
+                'Нет сгенерированных данных: '
+                'сначала выполните generate_dataset.')
+        other = generated.exclude(pk=user.pk).order_by('pk').first()
+        staff = User.objects.filter(is_staff=True, is_active=True).first()
+        self.users = {'user': user, 'other': other, 'staff': staff}
+        self.dataset = {
+            model._meta.model_name: model.objects.count()
+            for model in (User, Recipe, Favorite, ShoppingList,
+                          Subscription)}
+        popular = list(Recipe.objects.annotate(
+            popularity=Count('favorites')
+        ).order_by('-popularity', 'pk').values_list('pk', flat=True)[:200])
+        free = [
+            pk for pk in popular
+            if not Favorite.objects.filter(user=user, recipe=pk).exists()
+            and not ShoppingList.objects.filter(
+                user=user, recipe=pk).exists()][:10]
+        authors = list(generated.exclude(pk=user.pk).exclude(
+            following__user=user).order_by('pk').values_list(
+            'pk', flat=True)[:10])
+        own = user.recipes.order_by('pk').first()
+        ingredient = Ingredient.objects.order_by('pk').first()
+        tag = Tag.objects.order_by('pk').first()
+        if len(free) < 2 or len(authors) < 2 or not ingredient or not tag:
+            raise CommandError(
+                'Недостаточно данных для замеров: '
+                'увеличьте объем generate_dataset.')
+        ingredients = list(Ingredient.objects.order_by('pk').values_list(
+            'pk', flat=True)[:5])
+        recipe_data = {
+            'name': 'Тестовый рецепт',
+            'text': 'Рецепт для замера создания.',
+            'cooking_time': 30,
+            'image': image_data(),
+            'tags': [tag.pk],
+            'ingredients': [
+                {'id': pk, 'amount': 100} for pk in ingredients],
+        }
+        own_data = {
+            'name': own.name,
+            'text': own.text,
+            'cooking_time': own.cooking_time,
+            'tags': list(own.tags.values_list('pk', flat=True)),
+            'ingredients': [
+                {'id': pk, 'amount': amount}
+                for pk, amount in IngredientRecipe.objects.filter(
+                    recipe=own).values_list('ingredient', 'amount')],
+        }
+        with own.image.open('rb') as file:
+            own_image = 'data:image/{};base64,{}'.format(
+                own.image.name.rsplit('.', 1)[-1],
+                base64.b64encode(file.read()).decode())
+        self.context = {
+            'recipe': popular[0], 'free': free[0], 'own': own.pk,
+            'author': authors[0], 'tag': tag.pk, 'ingredient': ingredient.pk,
+            'search': ingredient.name[:3], 'tag_slug': tag.slug,
+        }
+        batch_recipes = {'ids': free}
+        batch_authors = {'ids': authors}
+        new_user = {
+            'email': NEW_USER_EMAIL, 'username': 'benchmark_signup',
+            'first_name': 'Новый', 'last_name': 'Пользователь',
+            'password': password,
+        }
+        login = {'email': other.email, 'password': password}
+
+        def send(method, path, data=None):
+            def hook(*args):
+                self.request(method, path, data)
+            return hook
+
+        def delete_created_recipe(response):
+            self.request('DELETE', f'recipes/{response.json()["id"]}/')
+
+        def create_recipe():
+            return {'new': self.request(
+                'POST', 'recipes/', recipe_data).json()['id']}
+
+        def delete_new_user(response):
+            User.objects.filter(email=NEW_USER_EMAIL).delete()
+
+        return [
+            Endpoint('tag-list', 'GET', 'tags/', auth=None),
+            Endpoint('tag-detail', 'GET', 'tags/{tag}/', auth=None),
+            Endpoint('ingredient-list', 'GET',
+                     'ingredients/?name={search}', auth=None),
+            Endpoint('ingredient-detail', 'GET',
+                     'ingredients/{ingredient}/', auth=None),
+            Endpoint('recipe-list', 'GET', 'recipes/', auth=None,
+                     label='anonymous'),
+            Endpoint('recipe-list', 'GET', 'recipes/'),
+            Endpoint('recipe-list', 'GET',
+                     'recipes/?tags={tag_slug}&is_favorited=1',
+                     label='filtered'),
+            Endpoint('recipe-list', 'GET', 'recipes/?search={search}',
+                     label='search'),
+            Endpoint('recipe-detail', 'GET', 'recipes/{recipe}/', auth=None,
+                     label='anonymous'),
+            Endpoint('recipe-detail', 'GET', 'recipes/{recipe}/'),
+            Endpoint('recipe-feed', 'GET', 'recipes/feed/'),
+            Endpoint('recipe-download-shopping-cart', 'GET',
+                     'recipes/download_shopping_cart/'),
+            Endpoint('recipe-shopping-cart-summary', 'GET',
+                     'recipes/shopping_cart_summary/'),
+            Endpoint('recipe-list', 'POST', 'recipes/', data=recipe_data,
+                     after=delete_created_recipe),
+            Endpoint('recipe-detail', 'PATCH', 'recipes/{own}/',
+                     data=own_data),
+            Endpoint('recipe-detail', 'PUT', 'recipes/{own}/',
+                     data={**own_data, 'image': own_image}),
+            Endpoint('recipe-detail', 'DELETE', 'recipes/{new}/',
+                     before=create_recipe),
+            Endpoint('recipe-favorite', 'POST', 'recipes/{free}/favorite/',
+                     after=send('DELETE', 'recipes/{free}/favorite/')),
+            Endpoint('recipe-favorite', 'DELETE', 'recipes/{free}/favorite/',
+                     before=send('POST', 'recipes/{free}/favorite/')),
+            Endpoint('recipe-manage-shopping-cart', 'POST',
+                     'recipes/{free}/shopping_cart/',
+                     after=send('DELETE', 'recipes/{free}/shopping_cart/')),
+            Endpoint('recipe-manage-shopping-cart', 'DELETE',
+                     'recipes/{free}/shopping_cart/',
+                     before=send('POST', 'recipes/{free}/shopping_cart/')),
+            Endpoint('recipe-batch-favorite', 'POST',
+                     'recipes/batch_favorite/', data=batch_recipes,
+                     after=send('DELETE', 'recipes/batch_favorite/',
+                                batch_recipes)),
+            Endpoint('recipe-batch-favorite', 'DELETE',
+                     'recipes/batch_favorite/', data=batch_recipes,
+                     before=send('POST', 'recipes/batch_favorite/',
+                                 batch_recipes)),
+            Endpoint('recipe-batch-shopping-cart', 'POST',
+                     'recipes/batch_shopping_cart/', data=batch_recipes,
+                     after=send('DELETE', 'recipes/batch_shopping_cart/',
+                                batch_recipes)),
+            Endpoint('recipe-batch-shopping-cart', 'DELETE',
+                     'recipes/batch_shopping_cart/', data=batch_recipes,
+                     before=send('POST', 'recipes/batch_shopping_cart/',
+                                 batch_recipes)),
+            Endpoint('user-list', 'GET', 'users/'),
+            Endpoint('user-list', 'POST', 'users/', auth=None,
+                     data=new_user, after=delete_new_user),
+            Endpoint('user-detail', 'GET', 'users/{author}/'),
+            Endpoint('user-me', 'GET', 'users/me/'),
+            Endpoint('user-subscriptions', 'GET', 'users/subscriptions/'),
+            Endpoint('user-subscribe-or-unsubscribe', 'POST',
+                     'users/{author}/subscribe/',
+                     after=send('DELETE', 'users/{author}/subscribe/')),
+            Endpoint('user-subscribe-or-unsubscribe', 'DELETE',
+                     'users/{author}/subscribe/',
+                     before=send('POST', 'users/{author}/subscribe/')),
+            Endpoint('user-batch-subscribe', 'POST', 'users/batch_subscribe/',
+                     data=batch_authors,
+                     after=send('DELETE', 'users/batch_subscribe/',
+                                batch_authors)),
+            Endpoint('user-batch-subscribe', 'DELETE',
+                     'users/batch_subscribe/', data=batch_authors,
+                     before=send('POST', 'users/batch_subscribe/',
+                                 batch_authors)),
+            Endpoint('login', 'POST', 'auth/token/login/', auth=None,
+                     data=login),
+            Endpoint('logout', 'POST', 'auth/token/logout/', auth='other'),
+            Endpoint('metrics', 'GET', 'metrics/', auth='staff'),
+        ]
+
+    def request(self, method, path, data=None, headers=None):
+        """Выполняет запрос к API и дочитывает потоковый ответ."""
+        response = self.client.generic(
+            method, API_PREFIX + path.format(**self.context),
+            json.dumps(data) if data is not None else '',
+            content_type='application/json',
+            headers=self.headers('user') if headers is None else headers)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    def headers(self, auth):
+        """Возвращает заголовок с токеном, создавая токен после выхода."""
+        if not auth:
+            return {}
+        token, _created = Token.objects.get_or_create(user=self.users[auth])
+        return {'Authorization': f'Token {token.key}'}
+
+    def measure(self, endpoint, repeat, warmup):
+        """Возвращает задержки и число SQL-запросов эндпоинта."""
+        if endpoint.auth and self.users[endpoint.auth] is None:
+            return {'route': endpoint.route, 'method': endpoint.method,
+                    'skipped': 'нет подходящего пользователя'}
+        timings, queries, statuses = [], [], []
+        for iteration in range(warmup + repeat):
+            context = self.context
+            if endpoint.before:
+                self.context = {**context, **(endpoint.before() or {})}
+            headers = self.headers(endpoint.auth)
+            with QueryCounter() as counter:
+                started = time.perf_counter()
+                response = self.request(
+                    endpoint.method, endpoint.path, endpoint.data, headers)
+                elapsed = time.perf_counter() - started
+            if endpoint.after:
+                endpoint.after(response)
+            self.context = context
+            if iteration >= warmup:
+                timings.append(elapsed * 1000)
+                queries.append(counter.count)
+                statuses.append(response.status_code)
+        timings.sort()
+        return {
+            'route': endpoint.route,
+            'method': endpoint.method,
+            'path': endpoint.path,
+            'status': statistics.mode(statuses),
+            'errors': sum(status >= 400 for status in statuses),
+            'p50_ms': round(percentile(timings, 0.5), 3),
+            'p95_ms': round(percentile(timings, 0.95), 3),
+            'mean_ms': round(statistics.mean(timings), 3),
+            'queries': round(statistics.mean(queries), 1),
+            'max_queries': max(queries),
+        }
+
+    def report(self, name, result, previous):
+        if 'skipped' in result:
+            self.stdout.write(f'{name:<48}пропущен: {result["skipped"]}')
+            return
+        line = (f'{name:<48}{result["p50_ms"]:>9.2f}{result["p95_ms"]:>9.2f}'
+                f'{result["queries"]:>9}{result["errors"]:>8}')
+        if previous and 'skipped' not in previous:
+            line += (
+                f'   p95 {result["p95_ms"] - previous["p95_ms"]:+.2f} мс, '
+                f'запросов {result["queries"] - previous["queries"]:+}')
+        self.stdout.write(line)
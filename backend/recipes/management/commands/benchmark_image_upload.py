@@ -0,0 +1,57 @@
+import base64
+import os
+import tracemalloc
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from PIL import Image
+from rest_framework import serializers
+
+from recipes.fields import Base64ImageField
+
+MB = 1024 * 1024
+
+
+def decode_in_memory(data):
+    """Декодирует всю строку base64 в память, как до потокового поля."""
+    _format, imgstr = data.split(';base64,')
+    file = ContentFile(base64.b64decode(imgstr), name='temp.png')
+    return serializers.ImageField().to_internal_value(file)
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пиковое потребление памяти при декодировании '
+            'большого изображения в base64 целиком и частями.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size', type=int, default=1800,
+            help='Сторона тестового изображения в пикселях.')
+
+    def handle(self, *args, **options):
+        side = options['size']
+        buffer = BytesIO()
+        Image.frombytes(
+            'RGB', (side, side), os.urandom(side * side * 3)
+        ).save(buffer, 'PNG')
+        payload = ('data:image/png;base64,'
+                   + base64.b64encode(buffer.getvalue()).decode())
+        self.stdout.write(
+            f'Изображение: {buffer.tell() / MB:.1f} МБ, '
+            f'base64: {len(payload) / MB:.1f} МБ')
+        decoders = (
+            ('целиком', decode_in_memory),
+            ('частями', Base64ImageField().to_internal_value),
+        )
+        with override_settings(
+                RECIPE_IMAGE_MAX_BYTES=len(payload),
+                RECIPE_IMAGE_MAX_DIMENSION=side):
+            for label, decode in decoders:
+                tracemalloc.start()
+                decode(payload).close()
+                _current, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                self.stdout.write(
+                    f'{label:<10}пик памяти {peak / MB:>8.1f} МБ')
@@ -0,0 +1,35 @@
+from timeit import timeit
+
+from django.core.management.base import BaseCommand
+
+from recipes.filters import IngredientFilter
+from recipes.ingredient_index import IngredientIndex
+from recipes.models import Ingredient
+
+QUERIES = ('а', 'мо', 'сыр', 'ябл', 'кар', 'ёж', 'соль')
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает задержку поиска ингредиентов по индексу в памяти '
+            'и через фильтр ORM.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', type=int, default=50,
+            help='Количество повторов каждого запроса.')
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        index = IngredientIndex.from_database()
+        self.stdout.write(
+            f'{"запрос":<8}{"индекс, мс":>12}{"ORM, мс":>12}')
+        for query in QUERIES:
+            index_time = timeit(lambda: index.search(query), number=repeat)
+            orm_time = timeit(
+                lambda: list(IngredientFilter(
+                    {'name': query},
+                    queryset=Ingredient.objects.all()).qs.values()),
+                number=repeat)
+            self.stdout.write(
+                f'{query:<8}{index_time / repeat * 1000:>12.3f}'
+                f'{orm_time / repeat * 1000:>12.3f}')
@@ -0,0 +1,85 @@
+from timeit import timeit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.pagination import Cursor
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from recipes.constants import PAGE_SIZE
+from recipes.models import Recipe
+from recipes.pagination import (
+    RecipeCursorPagination, StandardResultsSetPagination)
+
+LIST_URL = '/api/recipes/'
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает задержку выборки первой и дальней страницы '
+            'списка рецептов при постраничной пагинации и по курсору.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--page', type=int, default=1000,
+            help='Номер дальней страницы.')
+        parser.add_argument(
+            '--limit', type=int, default=PAGE_SIZE,
+            help='Количество рецептов на странице.')
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Количество повторов каждого замера.')
+
+    def handle(self, *args, **options):
+        limit = options['limit']
+        total = Recipe.objects.count()
+        if total <= limit:
+            raise CommandError(
+                'Рецептов меньше двух страниц, заполните базу командой '
+                'generate_dataset.')
+        far = min(options['page'], (total - 1) // limit + 1)
+        self.factory = APIRequestFactory()
+        self.queryset = Recipe.objects.select_related('author', 'snapshot')
+        self.stdout.write(
+            f'{"режим":<10}{"страница":>10}{"мс":>10}{"запросов":>10}')
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for page in (1, far):
+                self.measure('page', page, options['repeat'],
+                             self.paginate_by_number(page, limit))
+                self.measure('cursor', page, options['repeat'],
+                             self.paginate_by_cursor(page, limit))
+
+    def measure(self, label, page, repeat, paginate):
+        with CaptureQueriesContext(connection) as queries:
+            paginate()
+        elapsed = timeit(paginate, number=repeat)
+        self.stdout.write(
+            f'{label:<10}{page:>10}{elapsed / repeat * 1000:>10.2f}'
+            f'{len(queries):>10}')
+
+    def paginate_by_number(self, page, limit):
+        request = Request(self.factory.get(
+            LIST_URL, {'page': page, 'limit': limit}))
+        return lambda: list(StandardResultsSetPagination().paginate_queryset(
+            self.queryset, request))
+
+    def paginate_by_cursor(self, page, limit):
+        """
+        Готовит запрос с курсором на последний рецепт предыдущей страницы.
+
+        Так курсор совпадает с тем, что клиент получил бы в ссылке next,
+        пройдя все предыдущие страницы.
+        """
+        paginator = RecipeCursorPagination()
+        url = f'{LIST_URL}?cursor=&limit={limit}'
+        if page > 1:
+            previous = self.queryset.order_by(*paginator.ordering)[
+                (page - 1) * limit - 1]
+            paginator.base_url = url
+            url = paginator.encode_cursor(Cursor(
+                offset=0, reverse=False,
+                position=paginator._get_position_from_instance(
+                    previous, paginator.ordering)))
+        request = Request(self.factory.get(url))
+        return lambda: list(RecipeCursorPagination().paginate_queryset(
+            self.queryset, request))
@@ -0,0 +1,47 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.shopping_totals import live_totals, rebuild_totals, stored_totals
+
+User = get_user_model()
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = ('Сверяет сохраненные итоги списков покупок '
+            'с подсчетом по корзинам.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix', action='store_true',
+            help='Пересчитать итоги пользователей с расхождениями.')
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Количество пользователей в одной проверке.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        user_ids = list(User.objects.order_by('pk').values_list(
+            'pk', flat=True))
+        mismatched = []
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            live, stored = live_totals(batch), stored_totals(batch)
+            for user_id in batch:
+                if live.get(user_id, {}) != stored.get(user_id, {}):
+                    mismatched.append(user_id)
+                    self.stdout.write(
+                        f'Расхождение у пользователя {user_id}: '
+                        f'ожидалось {live.get(user_id, {})}, '
+                        f'сохранено {stored.get(user_id, {})}')
+        if not mismatched:
+            self.stdout.write(self.style.SUCCESS(
+                'Итоги списков покупок согласованы.'))
+            return
+        if not options['fix']:
+            raise CommandError(
+                f'Пользователей с расхождениями: {len(mismatched)}')
+        rebuild_totals(mismatched)
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитаны итоги пользователей: {len(mismatched)}'))
@@ -0,0 +1,94 @@
+import os
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from recipes.constants import IMAGE_VARIANTS
+from recipes.models import Recipe
+
+BATCH_SIZE = 500
+GRACE_HOURS = 24
+MB = 1024 * 1024
+
+
+def iter_files(storage, directory):
+    """Обходит файлы каталога хранилища, не загружая список целиком."""
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        try:
+            entries = os.scandir(storage.path(current))
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                name = f'{current}/{entry.name}'
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(name)
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    yield name, stat.st_size, stat.st_mtime
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def referenced_names(names):
+    """Возвращает имена из переданных, на которые ссылаются рецепты."""
+    query = Q(image__in=names)
+    for variant, _size in IMAGE_VARIANTS:
+        query |= Q(**{f'image_variants__{variant}__in': names})
+    referenced = set()
+    for image, variants in Recipe.objects.filter(query).values_list(
+            'image', 'image_variants'):
+        referenced.add(image)
+        referenced.update(variants.values())
+    return referenced
+
+
+class Command(BaseCommand):
+    help = ('Удаляет файлы картинок рецептов, на которые не ссылается '
+            'ни один рецепт и которые старше периода ожидания.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать файлы, которые будут удалены.')
+        parser.add_argument(
+            '--grace-hours', type=float, default=GRACE_HOURS,
+            help='Не трогать файлы моложе указанного количества часов.')
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Количество файлов в одной проверке.')
+
+    def handle(self, *args, **options):
+        field = Recipe._meta.get_field('image')
+        storage = field.storage
+        deadline = time.time() - options['grace_hours'] * 60 * 60
+        old_files = (
+            (name, size)
+            for name, size, mtime in iter_files(
+                storage, field.upload_to.rstrip('/'))
+            if mtime < deadline
+        )
+        removed = reclaimed = 0
+        for batch in batches(old_files, options['batch_size']):
+            referenced = referenced_names([name for name, _size in batch])
+            for name, size in batch:
+                if name in referenced:
+                    continue
+                if options['dry_run']:
+                    self.stdout.write(name)
+                else:
+                    storage.delete(name)
+                removed += 1
+                reclaimed += size
+        verb = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} файлов: {removed}, '
+            f'освобождено {reclaimed / MB:.1f} МБ'))
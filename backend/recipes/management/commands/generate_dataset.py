@@ -0,0 +1,268 @@
+import random
+from datetime import timedelta
+from io import BytesIO
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from recipes.cache import LIST_VERSION_KEY, touch_versions
+from recipes.feed import backfill_feed
+from recipes.images import render_variants
+from recipes.models import (
+    Favorite, Ingredient, IngredientRecipe, Recipe, ShoppingList, Tag,
+    TagRecipe)
+from recipes.search import update_search_index
+from recipes.serializers import RecipeSnapshotSerializer
+from recipes.shopping_totals import rebuild_totals
+from users.models import Subscription
+
+User = get_user_model()
+
+USERNAME_PREFIX = 'bench_'
+DEFAULT_PASSWORD = 'bench-password'
+BATCH_SIZE = 1000
+
+FIRST_NAMES = (
+    'Анна', 'Иван', 'Мария', 'Петр', 'Ольга', 'Сергей', 'Елена', 'Дмитрий',
+    'Наталья', 'Алексей', 'Ирина', 'Михаил', 'Татьяна', 'Андрей', 'Юлия')
+LAST_NAMES = (
+    'Иванова', 'Смирнов', 'Кузнецова', 'Попов', 'Васильева', 'Соколов',
+    'Михайлова', 'Новиков', 'Федорова', 'Морозов', 'Волкова', 'Лебедев')
+DISHES = (
+    'Суп', 'Салат', 'Пирог', 'Рагу', 'Запеканка', 'Каша', 'Омлет', 'Плов',
+    'Паста', 'Котлеты', 'Блины', 'Гратен', 'Ризотто', 'Жаркое', 'Суфле')
+STYLES = (
+    'по-домашнему', 'с травами', 'пряный', 'легкий', 'праздничный',
+    'быстрый', 'бабушкин', 'острый', 'летний', 'зимний', 'сытный')
+
+
+def popularity(count, exponent):
+    """
+    Возвращает накопленные веса рангов по закону Ципфа.
+
+    Элемент с рангом r выбирается с вероятностью, пропорциональной
+    1 / r ** exponent: немногие элементы получают большую часть выборов.
+    """
+    return list(accumulate(1 / rank ** exponent
+                           for rank in range(1, count + 1)))
+
+
+def sample_popular(rng, items, cum_weights, k, exclude=()):
+    """Выбирает до k разных элементов с учетом популярности."""
+    k = min(k, len(items) - len(exclude))
+    chosen = set()
+    for _ in range(10):
+        if len(chosen) >= k:
+            break
+        for item in rng.choices(items, cum_weights=cum_weights, k=k * 2):
+            if item not in exclude:
+                chosen.add(item)
+    return list(chosen)[:k]
+
+
+def activity(rng, mean, limit):
+    """Число действий пользователя: экспоненциальное распределение."""
+    if mean <= 0:
+        return 0
+    return min(limit, int(rng.expovariate(1 / mean)))
+
+
+def placeholder_image():
+    """Создает картинку, общую для всех сгенерированных рецептов."""
+    buffer = BytesIO()
+    Image.new('RGB', (640, 480), (230, 180, 120)).save(buffer, 'JPEG')
+    storage = Recipe._meta.get_field('image').storage
+    name = storage.save(
+        'recipes/images/generated.jpg', ContentFile(buffer.getvalue()))
+    return name, render_variants(name)
+
+
+class Command(BaseCommand):
+    help = ('Создает синтетические данные для нагрузочного тестирования: '
+            'пользователей, рецепты, избранное, корзины и подписки '
+            'с популярностью по степенному закону.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=1000,
+            help='Количество пользователей.')
+        parser.add_argument(
+            '--recipes', type=int, default=5000,
+            help='Количество рецептов.')
+        parser.add_argument(
+            '--favorites', type=float, default=20,
+            help='Среднее число рецептов в избранном пользователя.')
+        parser.add_argument(
+            '--cart', type=float, default=5,
+            help='Среднее число рецептов в корзине пользователя.')
+        parser.add_argument(
+            '--subscriptions', type=float, default=10,
+            help='Среднее число подписок пользователя.')
+        parser.add_argument(
+            '--exponent', type=float, default=1.1,
+            help='Показатель степенного закона популярности.')
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько последних дней распределить даты рецептов.')
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Зерно генератора: одинаковое зерно дает одинаковые данные.')
+        parser.add_argument(
+            '--password', default=DEFAULT_PASSWORD,
+            help='Пароль всех сгенерированных пользователей.')
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Удалить ранее сгенерированных пользователей с их данными.')
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Количество записей в одном INSERT.')
+
+    def handle(self, *args, **options):
+        generated = User.objects.filter(username__startswith=USERNAME_PREFIX)
+        if options['clear']:
+            deleted, _counts = generated.delete()
+            self.stdout.write(f'Удалено записей: {deleted}')
+        elif generated.exists():
+            raise CommandError(
+                'Сгенерированные данные уже есть. '
+                'Запустите команду с --clear, чтобы пересоздать их.')
+        if options['users'] < 2 or options['recipes'] < 1:
+            raise CommandError('Нужно хотя бы 2 пользователя и 1 рецепт.')
+        if not Tag.objects.exists():
+            call_command('load_tags', stdout=self.stdout)
+        if not Ingredient.objects.exists():
+            call_command('load_ingredients', stdout=self.stdout)
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        with transaction.atomic():
+            user_ids = self.create_users(
+                options['users'], options['password'])
+            authors = self.rng.sample(user_ids, len(user_ids))
+            author_weights = popularity(len(authors), options['exponent'])
+            recipe_ids = self.create_recipes(
+                options['recipes'], authors, author_weights,
+                options['exponent'], options['days'])
+            counts = self.create_relations(
+                user_ids, recipe_ids, authors, author_weights, options)
+        self.rebuild_derived(user_ids, recipe_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Пользователей: {len(user_ids)}, рецептов: {len(recipe_ids)}, '
+            f'в избранном: {counts[Favorite]}, '
+            f'в корзинах: {counts[ShoppingList]}, '
+            f'подписок: {counts[Subscription]}'))
+
+    def create_users(self, count, password):
+        password = make_password(password)
+        User.objects.bulk_create(
+            (User(
+                username=f'{USERNAME_PREFIX}{number}',
+                email=f'{USERNAME_PREFIX}{number}@example.com',
+                first_name=self.rng.choice(FIRST_NAMES),
+                last_name=self.rng.choice(LAST_NAMES),
+                password=password)
+             for number in range(1, count + 1)),
+            batch_size=self.batch_size)
+        return list(User.objects.filter(
+            username__startswith=USERNAME_PREFIX
+        ).order_by('pk').values_list('pk', flat=True))
+
+    def create_recipes(self, count, authors, author_weights, exponent, days):
+        rng = self.rng
+        tag_ids = list(Tag.objects.values_list('pk', flat=True))
+        ingredients = dict(Ingredient.objects.values_list('pk', 'name'))
+        ingredient_ids = rng.sample(list(ingredients), len(ingredients))
+        ingredient_weights = popularity(len(ingredient_ids), exponent)
+        image, variants = placeholder_image()
+        now = timezone.now()
+        created = sorted(
+            now - timedelta(seconds=rng.uniform(0, days * 24 * 3600))
+            for _ in range(count))
+        recipe_ids = []
+        for start in range(0, count, self.batch_size):
+            size = min(self.batch_size, count - start)
+            compositions = [
+                sample_popular(rng, ingredient_ids, ingredient_weights,
+                               rng.randint(3, 10))
+                for _ in range(size)]
+            recipes = Recipe.objects.bulk_create(
+                Recipe(
+                    author_id=rng.choices(
+                        authors, cum_weights=author_weights)[0],
+                    name=f'{rng.choice(DISHES)} {rng.choice(STYLES)}',
+                    text='Понадобится: ' + ', '.join(
+                        ingredients[pk] for pk in composition) + '.',
+                    image=image, image_variants=variants,
+                    cooking_time=rng.randint(5, 180))
+                for composition in compositions)
+            for recipe, created_at in zip(recipes, created[start:]):
+                recipe.created_at = created_at
+            Recipe.objects.bulk_update(recipes, ('created_at',))
+            IngredientRecipe.objects.bulk_create(
+                IngredientRecipe(
+                    recipe=recipe, ingredient_id=pk,
+                    amount=rng.randint(1, 500))
+                for recipe, composition in zip(recipes, compositions)
+                for pk in composition)
+            TagRecipe.objects.bulk_create(
+                TagRecipe(recipe=recipe, tag_id=pk)
+                for recipe in recipes
+                for pk in rng.sample(
+                    tag_ids, rng.randint(1, min(3, len(tag_ids)))))
+            recipe_ids += [recipe.pk for recipe in recipes]
+        return recipe_ids
+
+    def create_relations(self, user_ids, recipe_ids, authors,
+                         author_weights, options):
+        rng = self.rng
+        recipes = rng.sample(recipe_ids, len(recipe_ids))
+        recipe_weights = popularity(len(recipes), options['exponent'])
+        relations = (
+            (Favorite, 'recipe_id', options['favorites'],
+             recipes, recipe_weights),
+            (ShoppingList, 'recipe_id', options['cart'],
+             recipes, recipe_weights),
+            (Subscription, 'following_id', options['subscriptions'],
+             authors, author_weights),
+        )
+        counts = {}
+        for model, field, mean, items, weights in relations:
+            objects = []
+            for user_id in user_ids:
+                exclude = {user_id} if model is Subscription else ()
+                for pk in sample_popular(
+                        rng, items, weights,
+                        activity(rng, mean, len(items)), exclude):
+                    objects.append(model(user_id=user_id, **{field: pk}))
+            model.objects.bulk_create(objects, batch_size=self.batch_size)
+            counts[model] = len(objects)
+        return counts
+
+    def rebuild_derived(self, user_ids, recipe_ids):
+        """
+        Заполняет снимки, поисковый индекс, итоги корзин и ленты.
+
+        bulk_create не вызывает сигналы, поэтому производные таблицы
+        заполняются здесь так же, как при работе через API.
+        """
+        for start in range(0, len(recipe_ids), self.batch_size):
+            batch = recipe_ids[start:start + self.batch_size]
+            recipes = Recipe.objects.filter(pk__in=batch)
+            RecipeSnapshotSerializer.rebuild(recipes)
+            for recipe in recipes.only('name', 'text'):
+                update_search_index(recipe)
+        for start in range(0, len(user_ids), self.batch_size):
+            rebuild_totals(user_ids[start:start + self.batch_size])
+        following = {}
+        for user_id, author_id in Subscription.objects.filter(
+                user_id__in=user_ids).values_list('user_id', 'following_id'):
+            following.setdefault(user_id, []).append(author_id)
+        for user_id, author_ids in following.items():
+            backfill_feed(user_id, author_ids)
+        touch_versions([LIST_VERSION_KEY])
@@ -0,0 +1,53 @@
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from recipes.images import needs_variants, render_variants
+from recipes.models import Recipe
+from recipes.serializers import RecipeSnapshotSerializer
+
+
+class Command(BaseCommand):
+    help = ('Создает уменьшенные копии картинок рецептов, '
+            'для которых их еще нет, в нескольких процессах.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Количество процессов.')
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать копии для всех рецептов.')
+
+    def handle(self, *args, **options):
+        recipes = defaultdict(list)
+        for pk, image, variants in Recipe.objects.exclude(
+                image='').values_list('pk', 'image', 'image_variants'):
+            if options['force'] or needs_variants(image, variants):
+                recipes[image].append(pk)
+        connections.close_all()
+        updated, failed = [], 0
+        with ProcessPoolExecutor(
+                options['workers'], initializer=django.setup) as executor:
+            futures = {
+                executor.submit(render_variants, image): image
+                for image in recipes
+            }
+            for future in as_completed(futures):
+                image = futures[future]
+                try:
+                    variants = future.result()
+                except (OSError, ValueError) as error:
+                    failed += 1
+                    self.stderr.write(f'Картинка {image}: {error}')
+                    continue
+                Recipe.objects.filter(pk__in=recipes[image]).update(
+                    image_variants=variants)
+                updated.extend(recipes[image])
+        RecipeSnapshotSerializer.rebuild(Recipe.objects.filter(pk__in=updated))
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлено рецептов: {len(updated)}, ошибок: {failed}'))
@@ -0,0 +1,48 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.cache import INGREDIENTS_VERSION_KEY, touch_versions
+from recipes.loaders import (
+    BATCH_SIZE, iter_csv_rows, iter_json_rows, load_ingredients)
+from recipes.models import Ingredient
+
+READERS = {
+    'csv': iter_csv_rows,
+    'json': iter_json_rows,
+}
+
+
+class Command(BaseCommand):
+    help = 'Загружает ингредиенты из CSV или JSON пакетами.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?',
+            default=settings.BASE_DIR / 'ingredient_data' / 'ingredients.csv',
+            help='Путь к файлу с ингредиентами.')
+        parser.add_argument(
+            '--format', choices=READERS,
+            help='Формат файла; по умолчанию определяется по расширению.')
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Количество записей в одном INSERT.')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(
+                f'Неизвестный формат файла: {path.name}. '
+                'Укажите --format csv или --format json.')
+        try:
+            with open(path, encoding='utf-8') as file:
+                inserted, skipped = load_ingredients(
+                    Ingredient, READERS[file_format](file),
+                    options['batch_size'])
+        except (OSError, ValueError, KeyError) as error:
+            raise CommandError(f'Не удалось загрузить {path}: {error}')
+        touch_versions([INGREDIENTS_VERSION_KEY])
+        self.stdout.write(self.style.SUCCESS(
+            f'Добавлено: {inserted}, пропущено: {skipped}'))
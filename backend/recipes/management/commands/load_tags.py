@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from recipes.cache import TAGS_VERSION_KEY, touch_versions
+from recipes.constants import DEFAULT_TAGS
+from recipes.loaders import load_tags
+from recipes.models import Tag
+
+
+class Command(BaseCommand):
+    help = 'Добавляет предустановленные теги, пропуская существующие.'
+
+    def handle(self, *args, **options):
+        inserted, skipped = load_tags(Tag, DEFAULT_TAGS)
+        touch_versions([TAGS_VERSION_KEY])
+        self.stdout.write(self.style.SUCCESS(
+            f'Добавлено: {inserted}, пропущено: {skipped}'))
@@ -0,0 +1,124 @@
+import asyncio
+import ssl
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+def percentile(values, fraction):
+    """Возвращает перцентиль по отсортированному списку значений."""
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Target:
+    """Адрес для нагрузки с заранее собранным HTTP-запросом."""
+
+    def __init__(self, url, token=None):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise CommandError(f'Неверный адрес: {url}')
+        self.host = parts.hostname
+        self.ssl = ssl.create_default_context() if (
+            parts.scheme == 'https') else None
+        self.port = parts.port or (443 if self.ssl else 80)
+        path = parts.path or '/'
+        if parts.query:
+            path = f'{path}?{parts.query}'
+        headers = [
+            f'GET {path} HTTP/1.1',
+            f'Host: {parts.netloc}',
+            'Accept: */*',
+            'Connection: close',
+        ]
+        if token:
+            headers.append(f'Authorization: Token {token}')
+        self.request = ('\r\n'.join(headers) + '\r\n\r\n').encode()
+
+    async def fetch(self):
+        """Выполняет запрос в новом соединении и возвращает код ответа."""
+        reader, writer = await asyncio.open_connection(
+            self.host, self.port, ssl=self.ssl)
+        try:
+            writer.write(self.request)
+            await writer.drain()
+            status_line = await reader.readline()
+            while await reader.read(64 * 1024):
+                pass
+        finally:
+            writer.close()
+        return int(status_line.split()[1])
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест: держит заданное число одновременных '
+            'соединений и выводит пропускную способность и задержки. '
+            'Запускается против WSGI- и ASGI-развертывания по очереди.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'urls', nargs='+',
+            help='Адреса для GET-запросов, перебираются по кругу.')
+        parser.add_argument(
+            '--concurrency', type=int, nargs='+', default=[10, 50, 200],
+            help='Уровни числа одновременных соединений.')
+        parser.add_argument(
+            '--duration', type=float, default=10,
+            help='Длительность каждого уровня в секундах.')
+        parser.add_argument(
+            '--timeout', type=float, default=30,
+            help='Таймаут одного запроса в секундах.')
+        parser.add_argument(
+            '--token', help='Токен для заголовка Authorization.')
+
+    def handle(self, *args, **options):
+        targets = [Target(url, options['token']) for url in options['urls']]
+        self.stdout.write(
+            f'{"соединений":>10} {"запросов":>9} {"ошибок":>7} '
+            f'{"RPS":>8} {"p50, мс":>8} {"p95, мс":>8} {"p99, мс":>8}')
+        for concurrency in options['concurrency']:
+            latencies, errors, elapsed = asyncio.run(self.run_level(
+                targets, concurrency, options['duration'],
+                options['timeout']))
+            latencies.sort()
+            self.stdout.write(
+                f'{concurrency:>10} {len(latencies) + errors:>9} '
+                f'{errors:>7} {len(latencies) / elapsed:>8.1f} '
+                f'{percentile(latencies, 0.5) * 1000:>8.1f} '
+                f'{percentile(latencies, 0.95) * 1000:>8.1f} '
+                f'{percentile(latencies, 0.99) * 1000:>8.1f}')
+
+    async def run_level(self, targets, concurrency, duration, timeout):
+        """
+        Гоняет запросы в concurrency соединениях до истечения duration.
+
+        Успешными считаются ответы 2xx и 3xx; обрывы соединений,
+        таймауты и остальные коды учитываются как ошибки.
+        """
+        latencies = []
+        errors = 0
+        started = time.monotonic()
+        deadline = started + duration
+
+        async def worker(offset):
+            nonlocal errors
+            index = offset
+            while time.monotonic() < deadline:
+                target = targets[index % len(targets)]
+                index += 1
+                request_started = time.monotonic()
+                try:
+                    status = await asyncio.wait_for(target.fetch(), timeout)
+                except (OSError, ValueError, IndexError,
+                        asyncio.TimeoutError):
+                    errors += 1
+                    continue
+                if status >= 400:
+                    errors += 1
+                    continue
+                latencies.append(time.monotonic() - request_started)
+
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        return latencies, errors, time.monotonic() - started
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from recipes.constants import FEED_FANOUT_BATCH_SIZE
+from recipes.feed import process_fanout
+from recipes.models import FeedFanout
+
+
+class Command(BaseCommand):
+    help = ('Раздает в ленты подписчиков рецепты авторов, '
+            'у которых слишком много подписчиков для раздачи в запросе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=FEED_FANOUT_BATCH_SIZE,
+            help='Количество подписчиков в одной пачке.')
+
+    def handle(self, *args, **options):
+        processed = 0
+        for fanout in FeedFanout.objects.select_related('recipe'):
+            process_fanout(fanout, options['batch_size'])
+            processed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано рецептов: {processed}'))
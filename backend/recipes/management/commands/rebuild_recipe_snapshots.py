@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.serializers import RecipeSnapshotSerializer
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает JSON-снимки всех рецептов пакетами.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Количество рецептов в одном пакете.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        recipe_ids = list(
+            Recipe.objects.order_by('pk').values_list('pk', flat=True))
+        rebuilt = 0
+        for start in range(0, len(recipe_ids), batch_size):
+            batch = recipe_ids[start:start + batch_size]
+            rebuilt += RecipeSnapshotSerializer.rebuild(
+                Recipe.objects.filter(pk__in=batch))
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересобрано снимков: {rebuilt}'))
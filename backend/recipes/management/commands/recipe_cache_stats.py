@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from recipes.cache import get_stats
+
+
+class Command(BaseCommand):
+    help = 'Показывает попадания и промахи кэша ответов рецептов.'
+
+    def handle(self, *args, **options):
+        hits, misses = get_stats()
+        total = hits + misses
+        ratio = hits / total if total else 0
+        self.stdout.write(
+            f'Попаданий: {hits}\nПромахов: {misses}\n'
+            f'Доля попаданий: {ratio:.2%}')
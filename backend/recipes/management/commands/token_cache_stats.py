@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from users.authentication import token_cache_stats
+
+
+class Command(BaseCommand):
+    help = ('Показывает попадания в кэш токенов и среднее время '
+            'аутентификации при попадании и промахе.')
+
+    def handle(self, *args, **options):
+        stats = token_cache_stats.totals()
+        hits, misses = stats['hits'], stats['misses']
+        total = hits + misses
+        hit_us = stats['hit_seconds'] / hits * 10 ** 6 if hits else 0
+        miss_us = stats['miss_seconds'] / misses * 10 ** 6 if misses else 0
+        self.stdout.write(
+            f'Попаданий: {hits}\nПромахов: {misses}\n'
+            f'Доля попаданий: {hits / total if total else 0:.2%}\n'
+            f'Среднее время при попадании: {hit_us:.0f} мкс\n'
+            f'Среднее время при промахе: {miss_us:.0f} мкс')
@@ -0,0 +1,59 @@
+from django.db import connections, models, router
+
+
+class UserRelationManager(models.Manager):
+    """
+    Менеджер связей пользователя с объектом: избранное, корзина, подписки.
+
+    Добавление и удаление выполняются одним запросом и безопасны при
+    параллельных вызовах: результат показывает, изменилась ли таблица.
+    """
+
+    def __init__(self, target_field=None):
+        super().__init__()
+        self.target_field = target_field
+
+    @property
+    def write_db(self):
+        """База для записи: запросы менеджера изменяют таблицу."""
+        return self._db or router.db_for_write(self.model, **self._hints)
+
+    def _run(self, sql, params):
+        with connections[self.write_db].cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchone() is not None
+
+    def _columns(self):
+        quote = connections[self.write_db].ops.quote_name
+        meta = self.model._meta
+        target = meta.get_field(self.target_field)
+        target_meta = target.related_model._meta
+        return (
+            quote(meta.db_table),
+            quote(meta.get_field('user').column),
+            quote(target.column),
+            quote(target_meta.db_table),
+            quote(target_meta.pk.column),
+        )
+
+    def link(self, user_id, target_id):
+        """
+        Создает связь, если объект существует и связи еще нет.
+
+        Возвращает True, если строка была добавлена.
+        """
+        table, user, target, target_table, target_pk = self._columns()
+        return self._run(
+            f'INSERT INTO {table} ({user}, {target}) '
+            f'SELECT %s, {target_pk} FROM {target_table} '
+            f'WHERE {target_pk} = %s '
+            'ON CONFLICT DO NOTHING RETURNING 1',
+            (user_id, target_id))
+
+    def unlink(self, user_id, target_id):
+        """Удаляет связь; возвращает True, если строка была удалена."""
+        table, user, target, _target_table, _target_pk = self._columns()
+        return self._run(
+            f'DELETE FROM {table} WHERE {user} = %s AND {target} = %s '
+            'RETURNING 1',
+            (user_id, target_id))
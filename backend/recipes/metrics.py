@@ -0,0 +1,295 @@
+import atexit
+import json
+import os
+import socket
+import threading
+import time
+from contextvars import ContextVar
+from uuid import uuid4
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float('inf'))
+UNMATCHED_ROUTE = 'unmatched'
+
+RECIPE_CACHE_HITS = 'foodgram_recipe_cache_hits_total'
+RECIPE_CACHE_MISSES = 'foodgram_recipe_cache_misses_total'
+TOKEN_CACHE_HITS = 'foodgram_token_cache_hits_total'
+TOKEN_CACHE_MISSES = 'foodgram_token_cache_misses_total'
+TOKEN_CACHE_HIT_SECONDS = 'foodgram_token_cache_hit_seconds_total'
+TOKEN_CACHE_MISS_SECONDS = 'foodgram_token_cache_miss_seconds_total'
+COUNTERS = {
+    RECIPE_CACHE_HITS: 'Попадания в кэш ответов рецептов.',
+    RECIPE_CACHE_MISSES: 'Промахи кэша ответов рецептов.',
+    TOKEN_CACHE_HITS: 'Попадания в кэш токенов.',
+    TOKEN_CACHE_MISSES: 'Промахи кэша токенов.',
+    TOKEN_CACHE_HIT_SECONDS: 'Время аутентификации при попадании в кэш.',
+    TOKEN_CACHE_MISS_SECONDS: 'Время аутентификации при промахе кэша.',
+}
+
+_current_request = ContextVar('metrics_request', default=None)
+
+
+class RequestMetrics:
+    """Число и суммарное время SQL-запросов одного HTTP-запроса."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.query_seconds = 0.0
+
+
+def observe_query(execute, sql, params, many, context):
+    """Обертка выполнения запросов, учитывающая их в текущем запросе."""
+    metrics = _current_request.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.query_seconds += time.perf_counter() - started
+
+
+def install_query_observer(connection):
+    """Подключает observe_query к соединению один раз."""
+    if observe_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(observe_query)
+
+
+def start_request():
+    """Начинает сбор метрик запроса в текущем контексте."""
+    metrics = RequestMetrics()
+    _current_request.set(metrics)
+    return metrics
+
+
+def empty_stats():
+    """Возвращает пустые агрегаты маршрута."""
+    return {
+        'count': 0, 'seconds': 0.0, 'queries': 0, 'query_seconds': 0.0,
+        'buckets': [0] * len(LATENCY_BUCKETS),
+    }
+
+
+def route_name(request):
+    """Возвращает имя маршрута запроса, например recipe-list."""
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else UNMATCHED_ROUTE
+
+
+def is_stale_snapshot(path):
+    """Проверяет, принадлежит ли снимок завершившемуся процессу хоста."""
+    parts = os.path.basename(path).rsplit('-', 2)
+    if len(parts) != 3 or parts[0] != socket.gethostname():
+        return False
+    _host, pid, _suffix = parts
+    if not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+class MetricsRegistry:
+    """
+    Агрегаты метрик процесса с периодическим сбросом в файл.
+
+    Фоновый поток каждые METRICS_FLUSH_SECONDS секунд пишет снимок
+    процесса в METRICS_DIR, если были новые запросы или события. Экспорт
+    суммирует снимки всех процессов, поэтому счетчики воркеров складываются
+    независимо от того, общий ли у них кэш.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+        atexit.register(self.remove_snapshot)
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.path = os.path.join(
+            settings.METRICS_DIR,
+            f'{socket.gethostname()}-{self.pid}-{uuid4().hex[:8]}.json')
+        self.routes = {}
+        self.responses = {}
+        self.counters = {}
+        self.dirty = False
+        self.flusher = None
+
+    def observe(self, route, method, status, metrics):
+        """Учитывает завершенный запрос."""
+        duration = time.perf_counter() - metrics.started
+        with self.lock:
+            if os.getpid() != self.pid:
+                self.reset()
+            stats = self.routes.setdefault((route, method), empty_stats())
+            stats['count'] += 1
+            stats['seconds'] += duration
+            stats['queries'] += metrics.queries
+            stats['query_seconds'] += metrics.query_seconds
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if duration <= bound:
+                    stats['buckets'][index] += 1
+                    break
+            key = (route, method, str(status))
+            self.responses[key] = self.responses.get(key, 0) + 1
+            self.mark_dirty()
+
+    def increment(self, name, amount=1):
+        """Увеличивает счетчик процесса из COUNTERS."""
+        with self.lock:
+            if os.getpid() != self.pid:
+                self.reset()
+            self.counters[name] = self.counters.get(name, 0) + amount
+            self.mark_dirty()
+
+    def mark_dirty(self):
+        """Отмечает новые данные и запускает сброс; вызывается под lock."""
+        self.dirty = True
+        if self.flusher is None:
+            self.flusher = threading.Thread(
+                target=self.flush_periodically, daemon=True)
+            self.flusher.start()
+
+    def flush_periodically(self):
+        while True:
+            time.sleep(settings.METRICS_FLUSH_SECONDS)
+            if self.dirty:
+                self.flush()
+
+    def flush(self):
+        """Записывает снимок процесса атомарной заменой файла."""
+        with self.lock:
+            snapshot = json.dumps({
+                'routes': [[*key, stats]
+                           for key, stats in self.routes.items()],
+                'responses': [[*key, count]
+                              for key, count in self.responses.items()],
+                'counters': self.counters,
+            })
+            self.dirty = False
+            path = self.path
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        temporary = f'{path}.{threading.get_ident()}.tmp'
+        with open(temporary, 'w') as file:
+            file.write(snapshot)
+        os.replace(temporary, path)
+
+    def remove_snapshot(self):
+        """Удаляет снимок процесса при его завершении."""
+        if os.getpid() != self.pid:
+            return
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def collect(self):
+        """
+        Возвращает сумму снимков всех живых процессов.
+
+        Снимки завершившихся процессов этого хоста, не удаленные
+        при выходе (например, после SIGKILL), удаляются.
+        """
+        if self.dirty:
+            self.flush()
+        routes, responses = {}, {}
+        counters = dict.fromkeys(COUNTERS, 0)
+        try:
+            with os.scandir(settings.METRICS_DIR) as entries:
+                paths = [entry.path for entry in entries
+                         if entry.name.endswith('.json')]
+        except FileNotFoundError:
+            paths = []
+        for path in paths:
+            if is_stale_snapshot(path):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                continue
+            try:
+                with open(path) as file:
+                    snapshot = json.load(file)
+            except (OSError, ValueError):
+                continue
+            for route, method, stats in snapshot['routes']:
+                total = routes.setdefault((route, method), empty_stats())
+                for field in ('count', 'seconds', 'queries',
+                              'query_seconds'):
+                    total[field] += stats[field]
+                total['buckets'] = [
+                    a + b for a, b in zip(total['buckets'], stats['buckets'])]
+            for route, method, status, count in snapshot['responses']:
+                key = (route, method, status)
+                responses[key] = responses.get(key, 0) + count
+            for name, value in snapshot.get('counters', {}).items():
+                if name in counters:
+                    counters[name] += value
+        return routes, responses, counters
+
+
+registry = MetricsRegistry()
+
+
+def labels(**values):
+    """Форматирует метки Prometheus с экранированием значений."""
+    escaped = (
+        (name, str(value).replace('\\', r'\\').replace('"', r'\"')
+         .replace('\n', r'\n'))
+        for name, value in values.items())
+    return ','.join(f'{name}="{value}"' for name, value in escaped)
+
+
+def render_prometheus():
+    """Возвращает метрики всех процессов в текстовом формате Prometheus."""
+    routes, responses, counters = registry.collect()
+    lines = [
+        '# HELP foodgram_http_request_duration_seconds '
+        'Время обработки запроса.',
+        '# TYPE foodgram_http_request_duration_seconds histogram',
+    ]
+    for (route, method), stats in sorted(routes.items()):
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, stats['buckets']):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(
+                'foodgram_http_request_duration_seconds_bucket{'
+                f'{labels(route=route, method=method, le=le)}}} {cumulative}')
+        route_labels = labels(route=route, method=method)
+        lines.append(
+            'foodgram_http_request_duration_seconds_sum'
+            f'{{{route_labels}}} {stats["seconds"]}')
+        lines.append(
+            'foodgram_http_request_duration_seconds_count'
+            f'{{{route_labels}}} {stats["count"]}')
+    lines += [
+        '# HELP foodgram_http_responses_total Ответы по кодам статуса.',
+        '# TYPE foodgram_http_responses_total counter',
+    ]
+    for (route, method, status), count in sorted(responses.items()):
+        lines.append(
+            'foodgram_http_responses_total{'
+            f'{labels(route=route, method=method, status=status)}}} {count}')
+    for name, field, help_text in (
+            ('foodgram_db_queries_total', 'queries',
+             'Число SQL-запросов.'),
+            ('foodgram_db_query_duration_seconds_total', 'query_seconds',
+             'Суммарное время SQL-запросов.')):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for (route, method), stats in sorted(routes.items()):
+            lines.append(
+                f'{name}{{{labels(route=route, method=method)}}} '
+                f'{stats[field]}')
+    for name, help_text in COUNTERS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter',
+                  f'{name} {counters[name]}']
+    return '\n'.join(lines) + '\n'
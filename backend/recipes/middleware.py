@@ -0,0 +1,111 @@
+from functools import partial
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from rest_framework.permissions import SAFE_METHODS
+
+from recipes.cache import get_cache
+from recipes.db_router import (
+    apin_to_primary, can_read_from_replica, choose_replica, get_credentials,
+    pin_key, pin_to_primary, use_read_database)
+from recipes.metrics import registry, route_name, start_request
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Выбирает базу для чтений запроса и закрепляет писавших клиентов.
+
+    Безопасные запросы читают со случайной реплики, если клиент не
+    писал в последние DATABASE_PRIMARY_PIN_SECONDS секунд. Клиент
+    определяется по заголовку Authorization.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        credentials = get_credentials(request)
+        alias = None
+        if can_read_from_replica(request) and not (
+                credentials and get_cache().get(pin_key(credentials))):
+            alias = choose_replica()
+        use_read_database(alias)
+        response = self.get_response(request)
+        if credentials and request.method not in SAFE_METHODS:
+            pin_to_primary(credentials)
+        return response
+
+    async def __acall__(self, request):
+        credentials = get_credentials(request)
+        alias = None
+        if can_read_from_replica(request) and not (
+                credentials and await get_cache().aget(pin_key(credentials))):
+            alias = choose_replica()
+        use_read_database(alias)
+        response = await self.get_response(request)
+        if credentials and request.method not in SAFE_METHODS:
+            await apin_to_primary(credentials)
+        return response
+
+
+class MetricsMiddleware:
+    """
+    Собирает метрики по маршрутам: время ответа, число и время SQL.
+
+    Для потоковых ответов запрос считается завершенным после отдачи
+    всего содержимого, поэтому учитываются и запросы при выгрузке.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = start_request()
+        return self.observe(request, self.get_response(request), metrics)
+
+    async def __acall__(self, request):
+        metrics = start_request()
+        return self.observe(
+            request, await self.get_response(request), metrics)
+
+    def observe(self, request, response, metrics):
+        finish = partial(
+            registry.observe, route_name(request), request.method,
+            response.status_code, metrics)
+        if not response.streaming:
+            finish()
+        elif response.is_async:
+            response.streaming_content = self.afinish_after(
+                response.streaming_content, finish)
+        else:
+            response.streaming_content = self.finish_after(
+                response.streaming_content, finish)
+        return response
+
+    @staticmethod
+    def finish_after(content, finish):
+        try:
+            yield from content
+        finally:
+            finish()
+
+    @staticmethod
+    async def afinish_after(content, finish):
+        try:
+            async for chunk in content:
+                yield chunk
+        finally:
+            finish()
@@ -1,18 +1,15 @@
 from django.conf import settings
 from django.db import migrations
-from recipes.utils import random_color
+
+from recipes.constants import DEFAULT_TAGS
+from recipes.loaders import load_tags
+
 
 def add_tags(apps, schema_editor):
     if not settings.ENABLE_TAG_MIGRATIONS:
         return
     Tag = apps.get_model('recipes', 'Tag')
-    tags = [
-        ('веганский', 'vegan', random_color()),
-        ('безглютеновый', 'gluten_free', random_color()),
-        ('низкокалорийный', 'low_calorie', random_color()),
-    ]
-    for name, slug, color in tags:
-        Tag.objects.get_or_create(name=name, slug=slug, defaults={'color': color})
+    load_tags(Tag, DEFAULT_TAGS)
 
 class Migration(migrations.Migration):
     dependencies = [
@@ -0,0 +1,21 @@
+# Generated by Django 4.2 on 2026-10-18 03:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_alter_favorite_recipe_alter_favorite_user_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='recipe',
+            options={'ordering': ('-created_at', '-id'), 'verbose_name': 'рецепт', 'verbose_name_plural': 'Рецепты'},
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-created_at', '-id'], name='recipe_created_at_id_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2 on 2026-10-18 03:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_keyset_ordering'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSnapshot',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='snapshot', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('data', models.JSONField(verbose_name='Представление рецепта')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'снимок рецепта',
+                'verbose_name_plural': 'Снимки рецептов',
+            },
+        ),
+    ]
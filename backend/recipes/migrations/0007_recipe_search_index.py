@@ -0,0 +1,54 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'recipes_recipe_fts'
+SEARCH_VECTOR_INDEX = 'recipe_search_vector_idx'
+NAME_TRIGRAM_INDEX = 'recipe_name_trgm_idx'
+
+
+def search_indexes():
+    return (
+        GinIndex(SearchVector('name', 'text', config=SEARCH_CONFIG),
+                 name=SEARCH_VECTOR_INDEX),
+        GinIndex(fields=('name',), opclasses=('gin_trgm_ops',),
+                 name=NAME_TRIGRAM_INDEX),
+    )
+
+
+def create_search_index(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for index in search_indexes():
+            schema_editor.add_index(Recipe, index)
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5('
+            "name, text, tokenize = 'unicode61 remove_diacritics 2')")
+        schema_editor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, text) '
+            f'SELECT id, name, text FROM {Recipe._meta.db_table}')
+
+
+def drop_search_index(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        for index in search_indexes():
+            schema_editor.remove_index(Recipe, index)
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipesnapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
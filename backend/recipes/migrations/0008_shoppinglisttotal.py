@@ -0,0 +1,54 @@
+# Generated by Django 4.2 on 2026-10-18 03:24
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Sum
+
+
+def fill_shopping_list_totals(apps, schema_editor):
+    IngredientRecipe = apps.get_model('recipes', 'IngredientRecipe')
+    ShoppingListTotal = apps.get_model('recipes', 'ShoppingListTotal')
+    totals = IngredientRecipe.objects.filter(
+        recipe__shopping_lists__user__isnull=False
+    ).values(
+        'recipe__shopping_lists__user', 'ingredient'
+    ).annotate(amount=Sum('amount')).order_by()
+    ShoppingListTotal.objects.bulk_create(
+        ShoppingListTotal(
+            user_id=total['recipe__shopping_lists__user'],
+            ingredient_id=total['ingredient'],
+            amount=total['amount'])
+        for total in totals.iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0007_recipe_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.PositiveBigIntegerField(verbose_name='Количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list_totals', to='recipes.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list_totals', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'итог списка покупок',
+                'verbose_name_plural': 'Итоги списков покупок',
+                'ordering': ('user', 'ingredient'),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglisttotal',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='user_ingredient_total_unique'),
+        ),
+        migrations.RunPython(
+            fill_shopping_list_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 4.2 on 2026-10-18 03:30
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+from recipes.constants import FEED_BACKFILL_SIZE
+
+
+def fill_feeds(apps, schema_editor):
+    Subscription = apps.get_model('users', 'Subscription')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    FeedEntry = apps.get_model('recipes', 'FeedEntry')
+    subscriptions = Subscription.objects.values_list(
+        'user_id', 'following_id').order_by()
+    for user_id, author_id in subscriptions.iterator():
+        recipes = Recipe.objects.filter(author_id=author_id).order_by(
+            '-created_at', '-id'
+        ).values_list('id', 'created_at')[:FEED_BACKFILL_SIZE]
+        FeedEntry.objects.bulk_create(
+            FeedEntry(
+                user_id=user_id, author_id=author_id,
+                recipe_id=recipe_id, created_at=created_at)
+            for recipe_id, created_at in recipes
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0008_shoppinglisttotal'),
+        ('users', '0005_alter_subscription_following_alter_subscription_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedFanout',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='feed_fanout', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('last_user_id', models.PositiveBigIntegerField(verbose_name='Последний обработанный подписчик')),
+            ],
+            options={
+                'verbose_name': 'раздача рецепта в ленты',
+                'verbose_name_plural': 'Очередь раздачи в ленты',
+            },
+        ),
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(verbose_name='Дата публикации')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='recipes.recipe', verbose_name='Рецепт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to=settings.AUTH_USER_MODEL, verbose_name='Подписчик')),
+            ],
+            options={
+                'verbose_name': 'запись ленты',
+                'verbose_name_plural': 'Ленты подписок',
+                'ordering': ('-created_at', '-recipe'),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', '-created_at', '-recipe'], name='feed_entry_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', 'author'], name='feed_entry_author_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='feedentry',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='user_recipe_feed_entry_unique'),
+        ),
+        migrations.RunPython(fill_feeds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,257 @@
+from functools import partial, wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import ValidationError
+from django.db import close_old_connections
+from django.http import Http404
+from django.utils.cache import (
+    get_conditional_response, patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from recipes.cache import (
+    USER_VERSION_KEY, acached_response, aget_versions, cached_response,
+    get_versions, request_fingerprint)
+
+
+def in_thread_pool(view):
+    """
+    Оборачивает синхронное представление для запуска в пуле потоков.
+
+    Соединения с базой закрываются до и после запроса, как это делает
+    Django для синхронных представлений.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        close_old_connections()
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(wrapper, thread_sensitive=False)
+
+
+class AsyncReadMixin:
+    """
+    Миксин асинхронной обработки чтения для viewset'ов под ASGI.
+
+    При settings.ASYNC_VIEWS GET и HEAD для действий из async_actions
+    выполняются корутинами a<действие> через асинхронный ORM.
+    Остальные запросы выполняет обычное представление в пуле потоков.
+    """
+
+    async_actions = ('list', 'retrieve')
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+        if not settings.ASYNC_VIEWS:
+            return view
+        sync_view = in_thread_pool(view)
+        if 'get' in actions:
+            actions = {'head': actions['get'], **actions}
+
+        async def async_view(request, *args, **kwargs):
+            action = actions.get(request.method.lower())
+            if action not in cls.async_actions or request.method not in (
+                    'GET', 'HEAD'):
+                return await sync_view(request, *args, **kwargs)
+            self = cls(**initkwargs)
+            self.action_map = actions
+            return await self.adispatch(request, action, *args, **kwargs)
+
+        async_view.cls = cls
+        async_view.initkwargs = initkwargs
+        async_view.actions = actions
+        async_view.csrf_exempt = True
+        return async_view
+
+    async def adispatch(self, request, action, *args, **kwargs):
+        """Асинхронный вариант dispatch() для одного действия."""
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            # Формат согласуется до аутентификации, как в initial():
+            # от него зависит рендерер ответа с ошибкой.
+            self.format_kwarg = self.get_format_suffix(**kwargs)
+            request.accepted_renderer, request.accepted_media_type = (
+                self.perform_content_negotiation(request))
+            await self.aperform_authentication(request)
+            self.initial(request, *args, **kwargs)
+            response = await getattr(self, f'a{action}')(
+                request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        self.response = self.finalize_response(
+            request, response, *args, **kwargs)
+        return self.response
+
+    async def aperform_authentication(self, request):
+        """
+        Аутентифицирует запрос до синхронных проверок initial().
+
+        Аутентификаторы без aauthenticate() вызываются в потоке.
+        """
+        for authenticator in request.authenticators:
+            authenticate = getattr(authenticator, 'aauthenticate', None)
+            if authenticate is None:
+                authenticate = sync_to_async(authenticator.authenticate)
+            user_auth = await authenticate(request)
+            if user_auth is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = user_auth
+                return
+        request._authenticator = None
+        request.user, request.auth = AnonymousUser(), None
+
+    async def afilter_queryset(self, queryset):
+        """Применяет фильтры в потоке: их валидация может читать базу."""
+        return await sync_to_async(self.filter_queryset)(queryset)
+
+    async def apaginate_queryset(self, queryset):
+        if self.paginator is None:
+            return None
+        return await self.paginator.apaginate_queryset(
+            queryset, self.request, view=self)
+
+    async def aget_object(self):
+        queryset = await self.afilter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await queryset.aget(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except queryset.model.DoesNotExist:
+            raise Http404('No %s matches the given query.'
+                          % queryset.model._meta.object_name)
+        except (TypeError, ValueError, ValidationError):
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    async def aserialize(self, instance, many=False):
+        """
+        Возвращает данные сериализатора.
+
+        По умолчанию сериализация не обращается к базе и выполняется
+        в цикле событий; иначе метод нужно переопределить.
+        """
+        return self.get_serializer(instance, many=many).data
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = await self.afilter_queryset(self.get_queryset())
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                await self.aserialize(page, many=True))
+        return Response(await self.aserialize(
+            [obj async for obj in queryset], many=True))
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return Response(await self.aserialize(await self.aget_object()))
+
+
+class VersionedViewMixin:
+    """Миксин, связывающий представление со штампом версии данных."""
+
+    version_key = None
+
+    def get_version_key(self):
+        return self.version_key
+
+
+class AnonymousCacheMixin(VersionedViewMixin):
+    """Отдает list и retrieve анонимным пользователям из общего кэша."""
+
+    def list(self, request, *args, **kwargs):
+        return cached_response(
+            request, self.get_version_key(),
+            partial(super().list, request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return cached_response(
+            request, self.get_version_key(),
+            partial(super().retrieve, request, *args, **kwargs))
+
+    async def alist(self, request, *args, **kwargs):
+        return await acached_response(
+            request, self.get_version_key(),
+            partial(super().alist, request, *args, **kwargs))
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return await acached_response(
+            request, self.get_version_key(),
+            partial(super().aretrieve, request, *args, **kwargs))
+
+
+class ConditionalGetMixin(VersionedViewMixin):
+    """
+    Миксин условных GET-запросов для list и retrieve.
+
+    ETag и Last-Modified вычисляются из штампов версий в кэше,
+    поэтому ответ 304 отдается до обращения к базе и сериализаторам.
+    """
+
+    vary_on_user = False
+
+    def get_version_keys(self):
+        keys = [self.get_version_key()]
+        user = self.request.user
+        if self.vary_on_user and user.is_authenticated:
+            keys.append(USER_VERSION_KEY.format(pk=user.pk))
+        return keys
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, partial(super().list, request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, partial(super().retrieve, request, *args, **kwargs))
+
+    async def alist(self, request, *args, **kwargs):
+        return await self.aconditional_response(
+            request, partial(super().alist, request, *args, **kwargs))
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return await self.aconditional_response(
+            request, partial(super().aretrieve, request, *args, **kwargs))
+
+    def get_validators(self, request, versions):
+        """Возвращает ETag и Last-Modified для штампов версий."""
+        user_pk = request.user.pk if self.vary_on_user else None
+        etag = quote_etag(request_fingerprint(request, user_pk, *versions))
+        return etag, max(versions) // 10 ** 9
+
+    def conditional_response(self, request, build_response):
+        etag, last_modified = self.get_validators(
+            request, get_versions(self.get_version_keys()))
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = build_response()
+        return self.patch_validators(response, etag, last_modified)
+
+    async def aconditional_response(self, request, build_response):
+        """Асинхронный вариант conditional_response()."""
+        etag, last_modified = self.get_validators(
+            request, await aget_versions(self.get_version_keys()))
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = await build_response()
+        return self.patch_validators(response, etag, last_modified)
+
+    def patch_validators(self, response, etag, last_modified):
+        if response.status_code in (
+                status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+        if self.vary_on_user:
+            patch_vary_headers(response, ('Authorization',))
+        return response
@@ -6,6 +6,8 @@ from django.db import models
 from recipes.constants import (
     CHAR_MAX_LENGTH, SLUG_MAX_LENGTH, RETURN_STR_LENGTH,
     MIN_COOKING_TIME, MIN_INGREDIENT_AMOUNT)
+from recipes.managers import UserRelationManager
+from recipes.storage import get_recipe_image_storage
 from recipes.utils import random_color
 
 User = get_user_model()
@@ -73,7 +75,12 @@ class Recipe(models.Model):
         verbose_name='Теги')
     image = models.ImageField(
         upload_to='recipes/images/',
+        storage=get_recipe_image_storage,
+        db_index=True,
         verbose_name='Картинка')
+    image_variants = models.JSONField(
+        verbose_name='Уменьшенные копии картинки',
+        default=dict, blank=True, editable=False)
     cooking_time = models.PositiveIntegerField(
         verbose_name='Время приготовления',
         validators=[MinValueValidator(MIN_COOKING_TIME)])
@@ -89,7 +96,13 @@ class Recipe(models.Model):
     class Meta:
         verbose_name = 'рецепт'
         verbose_name_plural = 'Рецепты'
-        ordering = ('-created_at',)
+        ordering = ('-created_at', '-id')
+        indexes = (
+            models.Index(
+                fields=('-created_at', '-id'),
+                name='recipe_created_at_id_idx'
+            ),
+        )
 
     def __str__(self):
         return self.name[:RETURN_STR_LENGTH]
@@ -153,6 +166,8 @@ class ShoppingList(models.Model):
         Recipe, verbose_name="Рецепт", on_delete=models.CASCADE,
         related_name='shopping_lists')
 
+    objects = UserRelationManager('recipe')
+
     class Meta:
         ordering = ('recipe',)
         verbose_name = "список покупок"
@@ -177,6 +192,8 @@ class Favorite(models.Model):
         Recipe, verbose_name="Рецепт", on_delete=models.CASCADE,
         related_name='favorites')
 
+    objects = UserRelationManager('recipe')
+
     class Meta:
         ordering = ('recipe',)
         verbose_name = "избранное"
@@ -191,3 +208,99 @@ class Favorite(models.Model):
     def __str__(self):
         return (f'{self.user.username} избранное: '
                 f'"{self.recipe.name}"')[:RETURN_STR_LENGTH]
+
+
+class RecipeSnapshot(models.Model):
+    recipe = models.OneToOneField(
+        Recipe, verbose_name='Рецепт', on_delete=models.CASCADE,
+        primary_key=True, related_name='snapshot')
+    data = models.JSONField(
+        verbose_name='Представление рецепта')
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата обновления')
+
+    class Meta:
+        verbose_name = 'снимок рецепта'
+        verbose_name_plural = 'Снимки рецептов'
+
+    def __str__(self):
+        return f'Снимок рецепта {self.recipe_id}'
+
+
+class ShoppingListTotal(models.Model):
+    user = models.ForeignKey(
+        User, verbose_name="Пользователь", on_delete=models.CASCADE,
+        related_name='shopping_list_totals')
+    ingredient = models.ForeignKey(
+        Ingredient, verbose_name='Ингредиент', on_delete=models.CASCADE,
+        related_name='shopping_list_totals')
+    amount = models.PositiveBigIntegerField(
+        verbose_name='Количество')
+
+    class Meta:
+        ordering = ('user', 'ingredient')
+        verbose_name = 'итог списка покупок'
+        verbose_name_plural = 'Итоги списков покупок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='user_ingredient_total_unique'
+            ),
+        )
+
+    def __str__(self):
+        return (f'{self.user.username} — {self.ingredient.name}: '
+                f'{self.amount}')[:RETURN_STR_LENGTH]
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User, verbose_name='Подписчик', on_delete=models.CASCADE,
+        related_name='feed_entries')
+    recipe = models.ForeignKey(
+        Recipe, verbose_name='Рецепт', on_delete=models.CASCADE,
+        related_name='feed_entries')
+    author = models.ForeignKey(
+        User, verbose_name='Автор', on_delete=models.CASCADE,
+        related_name='+')
+    created_at = models.DateTimeField(
+        verbose_name='Дата публикации')
+
+    class Meta:
+        ordering = ('-created_at', '-recipe')
+        verbose_name = 'запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='user_recipe_feed_entry_unique'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-created_at', '-recipe'),
+                name='feed_entry_keyset_idx'),
+            models.Index(
+                fields=('user', 'author'),
+                name='feed_entry_author_idx'),
+        )
+
+    def __str__(self):
+        return (f'Лента {self.user.username}: '
+                f'"{self.recipe.name}"')[:RETURN_STR_LENGTH]
+
+
+class FeedFanout(models.Model):
+    recipe = models.OneToOneField(
+        Recipe, verbose_name='Рецепт', on_delete=models.CASCADE,
+        primary_key=True, related_name='feed_fanout')
+    last_user_id = models.PositiveBigIntegerField(
+        verbose_name='Последний обработанный подписчик')
+
+    class Meta:
+        verbose_name = 'раздача рецепта в ленты'
+        verbose_name_plural = 'Очередь раздачи в ленты'
+
+    def __str__(self):
+        return f'Раздача рецепта {self.recipe_id}'
@@ -1,9 +1,176 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
 from recipes.constants import (
-    PAGE_SIZE, MAX_PAGE_SIZE, PAGE_SIZE_QUERY_PARAM)
+    CURSOR_QUERY_PARAM, FEED_CURSOR_ORDERING, PAGE_SIZE, MAX_PAGE_SIZE,
+    PAGE_SIZE_QUERY_PARAM, RECIPE_CURSOR_ORDERING)
 
 
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = PAGE_SIZE
     page_size_query_param = PAGE_SIZE_QUERY_PARAM
     max_page_size = MAX_PAGE_SIZE
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        Асинхронный вариант paginate_queryset().
+
+        COUNT и выборка страницы выполняются через асинхронный ORM,
+        страница возвращается уже загруженной.
+        """
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)))
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        self.page.object_list = [
+            obj async for obj in self.page.object_list]
+        return list(self.page)
+
+
+class RecipeCursorPagination(CursorPagination):
+    """
+    Keyset-пагинация ленты рецептов по (created_at, id) без COUNT.
+
+    В отличие от CursorPagination из DRF, который хранит в курсоре только
+    первое поле сортировки и смещение для совпадений, курсор содержит
+    значения всех полей сортировки. Страница выбирается условием
+    (created_at, id) < (c, i) без OFFSET, даже когда у многих рецептов
+    одинаковое время создания.
+    """
+
+    page_size = PAGE_SIZE
+    page_size_query_param = PAGE_SIZE_QUERY_PARAM
+    max_page_size = MAX_PAGE_SIZE
+    cursor_query_param = CURSOR_QUERY_PARAM
+    ordering = RECIPE_CURSOR_ORDERING
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse, position = (
+            (False, None) if self.cursor is None
+            else (self.cursor.reverse, self.cursor.position))
+        ordering = self.ordering
+        if reverse:
+            ordering = [
+                field[1:] if field.startswith('-') else f'-{field}'
+                for field in ordering]
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(
+                self.keyset_filter(queryset.model, position, reverse))
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        following = None
+        if len(results) > len(self.page):
+            following = self._get_position_from_instance(
+                results[-1], self.ordering)
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.next_position = (
+                position is not None, position)
+            self.has_previous, self.previous_position = (
+                following is not None, following)
+        else:
+            self.has_next, self.next_position = (
+                following is not None, following)
+            self.has_previous, self.previous_position = (
+                position is not None, position)
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def keyset_filter(self, model, position, reverse):
+        """
+        Возвращает условие «после позиции» для всех полей сортировки.
+
+        Условие на первое поле продублировано отдельно, чтобы база могла
+        начать просмотр индекса прямо с позиции курсора.
+        """
+        try:
+            values = json.loads(position)
+            if len(values) != len(self.ordering):
+                raise ValueError(position)
+            values = [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, values)]
+        except (ValueError, TypeError, ValidationError, FieldDoesNotExist):
+            raise NotFound(self.invalid_cursor_message)
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') != reverse else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        first = self.ordering[0].lstrip('-')
+        bound = 'lte' if self.ordering[0].startswith('-') != reverse else 'gte'
+        return Q(**{f'{first}__{bound}': values[0]}) & condition
+
+    def _get_position_from_instance(self, instance, ordering):
+        """Возвращает значения всех полей сортировки записи в JSON."""
+        return json.dumps([
+            str(instance[field.lstrip('-')] if isinstance(instance, dict)
+                else getattr(instance, field.lstrip('-')))
+            for field in ordering])
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Выполняет разбор курсора и выборку страницы в потоке."""
+        return await sync_to_async(self.paginate_queryset)(
+            queryset, request, view)
+
+
+class FeedCursorPagination(RecipeCursorPagination):
+    """Keyset-пагинация ленты подписок по (created_at, recipe_id)."""
+
+    ordering = FEED_CURSOR_ORDERING
+
+
+class RecipeResultsSetPagination(StandardResultsSetPagination):
+    """
+    Постраничная пагинация рецептов с опциональным режимом курсора.
+
+    Клиенты, передающие page/limit, получают прежний ответ с count.
+    Наличие параметра cursor (в том числе пустого) включает keyset-режим.
+    """
+
+    cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if CURSOR_QUERY_PARAM in request.query_params:
+            self.cursor_paginator = RecipeCursorPagination()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        if CURSOR_QUERY_PARAM in request.query_params:
+            self.cursor_paginator = RecipeCursorPagination()
+            return await self.cursor_paginator.apaginate_queryset(
+                queryset, request, view)
+        return await super().apaginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
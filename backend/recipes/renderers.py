@@ -0,0 +1,109 @@
+import csv
+import json
+from abc import ABC, abstractmethod
+
+from rest_framework import renderers
+
+
+class EchoBuffer:
+    """Буфер, который возвращает записанную строку вместо хранения."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingListRenderer(ABC, renderers.BaseRenderer):
+    """
+    Базовый рендерер списка покупок.
+
+    Список отдается потоково через stream(), который определяет каждый
+    формат; render() используется только для сообщений об ошибках.
+    """
+
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            data = '\n'.join(f'{key}: {value}' for key, value in data.items())
+        return str(data).encode(self.charset)
+
+    @abstractmethod
+    def stream(self, items):
+        """Возвращает итератор частей файла для итератора строк списка."""
+
+    async def astream(self, items):
+        """
+        Асинхронный вариант stream() для асинхронного итератора строк.
+
+        Строки передаются в stream() по одной: следующая читается из
+        базы только после того, как stream() забрал предыдущую.
+        """
+        done = object()
+        pending = []
+
+        def take():
+            while True:
+                item = pending.pop()
+                if item is done:
+                    return
+                yield item
+
+        chunks = self.stream(take())
+        async for item in items:
+            pending.append(item)
+            while pending:
+                yield next(chunks)
+        pending.append(done)
+        for chunk in chunks:
+            yield chunk
+
+
+class CSVShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, items):
+        writer = csv.writer(EchoBuffer())
+        yield writer.writerow(['Ingredient', 'Amount', 'Unit'])
+        for item in items:
+            yield writer.writerow([item['ingredient__name'],
+                                   item['total_amount'],
+                                   item['ingredient__measurement_unit']])
+
+
+class TextShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, items):
+        yield 'Список покупок\n\n'
+        for item in items:
+            yield (f'[ ] {item["ingredient__name"]} — '
+                   f'{item["total_amount"]} '
+                   f'{item["ingredient__measurement_unit"]}\n')
+
+
+class JSONShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False).encode(self.charset)
+
+    def stream(self, items):
+        separator = '['
+        for item in items:
+            yield separator + json.dumps({
+                'name': item['ingredient__name'],
+                'amount': item['total_amount'],
+                'measurement_unit': item['ingredient__measurement_unit'],
+            }, ensure_ascii=False)
+            separator = ','
+        yield ']' if separator == ',' else '[]'
+
+
+SHOPPING_LIST_RENDERERS = (
+    CSVShoppingListRenderer,
+    TextShoppingListRenderer,
+    JSONShoppingListRenderer,
+)
@@ -0,0 +1,109 @@
+import re
+from functools import reduce
+from operator import or_
+
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector, TrigramSimilarity)
+from django.db import connections
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from recipes.constants import SEARCH_CONFIG
+
+FTS_TABLE = 'recipes_recipe_fts'
+EXCLUDED_WORD_RE = re.compile(r'(?<!\S)-(\w+)')
+PHRASE_RE = re.compile(r'"[^"]*"?')
+
+
+def search_recipes(queryset, query):
+    """
+    Полнотекстовый поиск рецептов по названию и описанию.
+
+    Возвращает найденные рецепты, отсортированные по релевантности
+    (аннотация rank). Для PostgreSQL используются tsvector с русской
+    морфологией и триграммы, для SQLite — виртуальная таблица FTS5.
+    """
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        queryset = search_postgresql(queryset, query)
+    elif vendor == 'sqlite':
+        queryset = search_sqlite(queryset, query)
+    else:
+        queryset = queryset.filter(
+            Q(name__icontains=query) | Q(text__icontains=query)
+        ).annotate(rank=Value(0, output_field=FloatField()))
+    return queryset.order_by('-rank', *queryset.model._meta.ordering)
+
+
+def search_postgresql(queryset, query):
+    """
+    Ищет по tsvector с синтаксисом websearch и по триграммам названия.
+
+    Триграммы исправляют опечатки, поэтому сравниваются только с отдельными
+    искомыми словами: фразы в кавычках ищутся точно, а исключенные через
+    минус слова не находятся и по триграммам.
+    """
+    vector = SearchVector('name', 'text', config=SEARCH_CONFIG)
+    search_query = SearchQuery(
+        query, config=SEARCH_CONFIG, search_type='websearch')
+    rank = SearchRank(vector, search_query)
+    found = Q(search=search_query)
+    words = fuzzy_words(query)
+    if words:
+        similar = Q(name__trigram_similar=words)
+        excluded = EXCLUDED_WORD_RE.findall(query)
+        if excluded:
+            similar &= ~Q(search=reduce(or_, (
+                SearchQuery(word, config=SEARCH_CONFIG)
+                for word in excluded)))
+        rank += TrigramSimilarity('name', words)
+        found |= similar
+    return queryset.annotate(search=vector, rank=rank).filter(found)
+
+
+def fuzzy_words(query):
+    """Возвращает слова запроса вне кавычек, кроме исключенных и OR."""
+    text = EXCLUDED_WORD_RE.sub(' ', PHRASE_RE.sub(' ', query))
+    return ' '.join(
+        word for word in re.findall(r'\w+', text) if word.lower() != 'or')
+
+
+def search_sqlite(queryset, query):
+    words = re.findall(r'\w+', query)
+    if not words:
+        return queryset.none().annotate(
+            rank=Value(0, output_field=FloatField()))
+    match = ' '.join(f'"{word}"*' for word in words)
+    table = queryset.model._meta.db_table
+    return queryset.filter(pk__in=RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        (match,),
+    )).annotate(rank=RawSQL(
+        f'SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} '
+        f'WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id',
+        (match,),
+    ))
+
+
+def update_search_index(recipe):
+    """Обновляет запись рецепта в индексе FTS5 (только для SQLite)."""
+    connection = connections[recipe._state.db or 'default']
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', (recipe.pk,))
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, text) '
+            'VALUES (%s, %s, %s)',
+            (recipe.pk, recipe.name, recipe.text))
+
+
+def remove_from_search_index(recipe):
+    """Удаляет рецепт из индекса FTS5 (только для SQLite)."""
+    connection = connections[recipe._state.db or 'default']
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', (recipe.pk,))
@@ -1,18 +1,23 @@
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from rest_framework import serializers
 
+from recipes.cache import invalidate_recipes
 from recipes.constants import (
-    MIN_INGREDIENT_AMOUNT, MIN_COOKING_TIME,
+    MAX_BATCH_SIZE, MIN_INGREDIENT_AMOUNT, MIN_COOKING_TIME,
     MAX_POSITIVE_INT_FIELD)
-from recipes.fields import Base64ImageField
+from recipes.fields import Base64ImageField, ImageVariantField
 from recipes.models import (
-    Favorite, Ingredient, IngredientRecipe,
-    Recipe, ShoppingList, Tag)
-from users.models import Subscription
+    Ingredient, IngredientRecipe, Recipe, RecipeSnapshot, ShoppingListTotal,
+    Tag)
+from recipes.shopping_totals import sync_recipe_totals
 
 
 User = get_user_model()
 
+IMAGE_FIELDS = ('image', 'image_thumbnail', 'image_medium')
+
 
 class UserSerializer(serializers.ModelSerializer):
     """Сериализатор для модели User."""
@@ -26,8 +31,10 @@ class UserSerializer(serializers.ModelSerializer):
             'last_name', 'is_subscribed')
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         current_user = self.context['request'].user
-        return (current_user.is_authenticated and obj.followers.filter(
+        return (current_user.is_authenticated and obj.following.filter(
             user=current_user).exists())
 
 
@@ -50,8 +57,7 @@ class IngredientSerializer(serializers.ModelSerializer):
 class IngredientRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для записи IngredientRecipe."""
 
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all())
+    id = serializers.IntegerField()
     amount = serializers.IntegerField(
         min_value=MIN_INGREDIENT_AMOUNT,
         max_value=MAX_POSITIVE_INT_FIELD)
@@ -75,11 +81,71 @@ class IngredientRecipeReadSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
+class AuthorSnapshotSerializer(serializers.ModelSerializer):
+    """Сериализатор автора для снимка рецепта, без is_subscribed."""
+
+    class Meta:
+        model = User
+        fields = tuple(
+            field for field in UserSerializer.Meta.fields
+            if field != 'is_subscribed')
+
+
+def recipe_relations():
+    """Связи рецепта, из которых собирается снимок."""
+    return (
+        'tags',
+        Prefetch('ingredients_recipes',
+                 queryset=IngredientRecipe.objects.select_related(
+                     'ingredient')))
+
+
+class RecipeSnapshotSerializer(serializers.ModelSerializer):
+    """
+    Сериализатор снимка Recipe.
+
+    Формирует представление RecipeReadSerializer без полей,
+    зависящих от текущего пользователя.
+    """
+
+    tags = TagSerializer(many=True, read_only=True)
+    ingredients = IngredientRecipeReadSerializer(
+        source='ingredients_recipes', many=True, read_only=True)
+    author = AuthorSnapshotSerializer(read_only=True)
+    image = serializers.ImageField(read_only=True)
+    image_thumbnail = ImageVariantField('thumbnail')
+    image_medium = ImageVariantField('medium')
+
+    class Meta:
+        model = Recipe
+        fields = (
+            'id', 'tags', 'author', 'ingredients',
+            'name', 'image', 'image_thumbnail', 'image_medium',
+            'text', 'cooking_time'
+        )
+
+    @classmethod
+    def rebuild(cls, recipes):
+        """Пересобирает снимки переданных рецептов одним upsert."""
+        recipes = recipes.select_related('author').prefetch_related(
+            *recipe_relations())
+        snapshots = [
+            RecipeSnapshot(recipe=recipe, data=cls(recipe).data)
+            for recipe in recipes
+        ]
+        RecipeSnapshot.objects.bulk_create(
+            snapshots, update_conflicts=True,
+            unique_fields=('recipe',),
+            update_fields=('data', 'updated_at'))
+        invalidate_recipes([snapshot.recipe_id for snapshot in snapshots])
+        return len(snapshots)
+
+
 class RecipeWriteSerializer(serializers.ModelSerializer):
     """Сериализатор для создания и обновления Recipe."""
 
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True, queryset=Tag.objects.all(), required=True)
+    tags = serializers.ListField(
+        child=serializers.IntegerField(), required=True)
     ingredients = IngredientRecipeSerializer(
         many=True, write_only=True, required=True)
     author = UserSerializer(read_only=True)
@@ -111,7 +177,46 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         ]
         return ingredient_recipes
 
+    @staticmethod
+    def update_ingredients(instance, ingredients_data):
+        """
+        Приводит ингредиенты рецепта к новому набору.
+
+        Выполняются только нужные удаления, вставки и изменения
+        количеств. Возвращает прежние и новые количества по id.
+        """
+        current = {
+            item.ingredient_id: item
+            for item in IngredientRecipe.objects.filter(
+                recipe=instance).only('id', 'ingredient_id', 'amount')
+        }
+        old_amounts = {
+            ingredient_id: item.amount
+            for ingredient_id, item in current.items()}
+        new_amounts = {
+            data['id'].pk: data['amount'] for data in ingredients_data}
+        removed = [
+            item.pk for ingredient_id, item in current.items()
+            if ingredient_id not in new_amounts]
+        if removed:
+            IngredientRecipe.objects.filter(pk__in=removed).delete()
+        changed = []
+        for ingredient_id, amount in new_amounts.items():
+            item = current.get(ingredient_id)
+            if item is not None and item.amount != amount:
+                item.amount = amount
+                changed.append(item)
+        IngredientRecipe.objects.bulk_update(changed, ('amount',))
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(
+                recipe=instance, ingredient_id=ingredient_id, amount=amount)
+            for ingredient_id, amount in new_amounts.items()
+            if ingredient_id not in current)
+        return old_amounts, new_amounts
+
     def to_representation(self, instance):
+        instance = Recipe.objects.select_related(
+            'author', 'snapshot').get(pk=instance.pk)
         return RecipeReadSerializer(
             instance, context=self.context).data
 
@@ -132,8 +237,28 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         if len(seen) != len(ingredients):
             raise serializers.ValidationError(
                 {"ingredients": "Ингредиенты не должны повторяться"})
+        ingredient_objects = Ingredient.objects.in_bulk(ingredients)
+        tag_objects = Tag.objects.in_bulk(data['tags'])
+        errors = {}
+        missing_ingredients = self.missing_ids(ingredients, ingredient_objects)
+        if missing_ingredients:
+            errors['ingredients'] = [
+                f'Ингредиенты не найдены: {missing_ingredients}.']
+        missing_tags = self.missing_ids(data['tags'], tag_objects)
+        if missing_tags:
+            errors['tags'] = [f'Теги не найдены: {missing_tags}.']
+        if errors:
+            raise serializers.ValidationError(errors)
+        for ingredient_data in data['ingredients']:
+            ingredient_data['id'] = ingredient_objects[ingredient_data['id']]
+        data['tags'] = [tag_objects[pk] for pk in data['tags']]
         return data
 
+    @staticmethod
+    def missing_ids(ids, objects):
+        """Возвращает через запятую id, не найденные в базе."""
+        return ', '.join(str(pk) for pk in ids if pk not in objects)
+
     def validate_tags(self, value):
         errors = []
         if not value:
@@ -145,6 +270,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError({"tags": errors})
         return value
 
+    @transaction.atomic
     def create(self, validated_data):
         tags_data = validated_data.pop('tags')
         ingredients_data = validated_data.pop(
@@ -155,20 +281,36 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         ingredient_recipes = self.add_ingredients_to_recipe(
             recipe, ingredients_data)
         IngredientRecipe.objects.bulk_create(ingredient_recipes)
+        RecipeSnapshotSerializer.rebuild(Recipe.objects.filter(pk=recipe.pk))
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.tags.clear()
-        tags_data = validated_data.pop('tags')
-        instance.tags.set(tags_data)
-        IngredientRecipe.objects.filter(
-            recipe=instance).delete()
-        ingredients_data = validated_data.pop('ingredients')
-        ingredient_recipes = self.add_ingredients_to_recipe(
-            instance, ingredients_data)
-        IngredientRecipe.objects.bulk_create(ingredient_recipes)
+        instance.tags.set(validated_data.pop('tags'))
+        old_amounts, new_amounts = self.update_ingredients(
+            instance, validated_data.pop('ingredients'))
+        sync_recipe_totals(instance.pk, old_amounts, new_amounts)
+        instance = super().update(instance, validated_data)
+        RecipeSnapshotSerializer.rebuild(
+            Recipe.objects.filter(pk=instance.pk))
+        return instance
+
+
+class RecipeReadListSerializer(serializers.ListSerializer):
+    """
+    Список рецептов для чтения.
+
+    Рецепты без снимка сериализуются из моделей, поэтому их теги
+    и ингредиенты загружаются заранее, двумя запросами на всю страницу.
+    """
 
-        return super().update(instance, validated_data)
+    def to_representation(self, data):
+        recipes = list(data.all() if hasattr(data, 'all') else data)
+        prefetch_related_objects(
+            [recipe for recipe in recipes
+             if self.child.get_snapshot(recipe) is None],
+            *recipe_relations())
+        return super().to_representation(recipes)
 
 
 class RecipeReadSerializer(serializers.ModelSerializer):
@@ -179,6 +321,8 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         source='ingredients_recipes', many=True, read_only=True)
     author = UserSerializer(read_only=True)
     image = Base64ImageField()
+    image_thumbnail = ImageVariantField('thumbnail')
+    image_medium = ImageVariantField('medium')
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
@@ -187,15 +331,57 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         fields = (
             'id', 'tags', 'author', 'ingredients',
             'is_favorited', "is_in_shopping_cart",
-            "name", "image", "text", "cooking_time"
+            "name", "image", "image_thumbnail", "image_medium",
+            "text", "cooking_time"
         )
+        list_serializer_class = RecipeReadListSerializer
+
+    @staticmethod
+    def get_snapshot(instance):
+        """Возвращает загруженный вместе с рецептом снимок или None."""
+        if not Recipe.snapshot.is_cached(instance):
+            return None
+        return getattr(instance, 'snapshot', None)
+
+    def to_representation(self, instance):
+        snapshot = self.get_snapshot(instance)
+        if snapshot is None:
+            if hasattr(instance, 'is_subscribed_to_author'):
+                instance.author.is_subscribed = (
+                    instance.is_subscribed_to_author)
+            return super().to_representation(instance)
+        return self.merge_viewer_fields(instance, snapshot.data)
+
+    def merge_viewer_fields(self, instance, data):
+        """Дополняет снимок рецепта полями текущего пользователя."""
+        request = self.context.get('request')
+        data = dict(data)
+        data['author'] = dict(
+            data['author'],
+            is_subscribed=self.get_is_author_subscribed(instance))
+        data['is_favorited'] = self.get_is_favorited(instance)
+        data['is_in_shopping_cart'] = self.get_is_in_shopping_cart(instance)
+        for field in IMAGE_FIELDS:
+            data.setdefault(field, data['image'])
+            if request and data[field]:
+                data[field] = request.build_absolute_uri(data[field])
+        return {field: data[field] for field in self.Meta.fields}
+
+    def get_is_author_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed_to_author'):
+            return obj.is_subscribed_to_author
+        return self.fields['author'].get_is_subscribed(obj.author)
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         return (request and request.user.is_authenticated
                 and obj.shopping_lists.filter(user=request.user).exists())
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         return (request and request.user.is_authenticated
                 and obj.favorites.filter(user=request.user).exists())
@@ -205,45 +391,21 @@ class RecipeShortSerializer(serializers.ModelSerializer):
     """Сериализатор для краткой информации о Recipe."""
 
     image = Base64ImageField()
+    image_thumbnail = ImageVariantField('thumbnail')
+    image_medium = ImageVariantField('medium')
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
-
-
-class SubscribeSerializer(serializers.ModelSerializer):
-    """Сериализатор для подписки на пользователя."""
-
-    class Meta:
-        model = Subscription
-        fields = ('following',)
-
-    def validate(self, data):
-        user = self.context['request'].user
-        following = data['following']
-        if user == following:
-            raise serializers.ValidationError(
-                "Вы не можете подписаться на себя.")
-        if Subscription.objects.filter(
-                user=user, following=following).exists():
-            raise serializers.ValidationError(
-                "Вы уже подписаны на этого пользователя.")
-        return data
-
-    def to_representation(self, instance):
-        context = self.context
-        context['request'].user = instance.user
-        serializer = SubscriptionSerializer(
-            instance.following, context=context)
-        return serializer.data
+        fields = (
+            'id', 'name', 'image', 'image_thumbnail', 'image_medium',
+            'cooking_time')
 
 
 class SubscriptionSerializer(UserSerializer):
     """Сериализатор для просмотра подписок пользователя."""
 
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(
-        source='recipes.count', read_only=True)
+    recipes_count = serializers.SerializerMethodField()
 
     class Meta(UserSerializer.Meta):
         fields = (UserSerializer.Meta.fields + ('recipes', 'recipes_count'))
@@ -256,42 +418,31 @@ class SubscriptionSerializer(UserSerializer):
         return RecipeShortSerializer(
             recipes, many=True, context=self.context).data
 
+    def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
+        return obj.recipes.count()
 
-class FavoriteRecipeSerializer(serializers.ModelSerializer):
-    """Сериализатор добавления рецепта в избранное"""
 
-    class Meta:
-        model = Favorite
-        fields = ('recipe',)
+class ShoppingListTotalSerializer(serializers.ModelSerializer):
+    """Сериализатор итогов списка покупок."""
 
-    def to_representation(self, instance):
-        serializer = RecipeShortSerializer(
-            instance.recipe, context=self.context)
-        return serializer.data
-
-    def validate(self, data):
-        user = self.context['request'].user
-        recipe = data['recipe']
-        if Favorite.objects.filter(user=user, recipe=recipe).exists():
-            raise serializers.ValidationError(
-                "Рецепт уже находится в избранном.")
-
-        return data
+    id = serializers.ReadOnlyField(source='ingredient.id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit')
 
+    class Meta:
+        model = ShoppingListTotal
+        fields = ('id', 'name', 'measurement_unit', 'amount')
 
-class ShoppingListSerializer(serializers.ModelSerializer):
 
-    class Meta:
-        model = ShoppingList
-        fields = ('recipe',)
+class BatchIdsSerializer(serializers.Serializer):
+    """Сериализатор списка id для пакетных операций."""
 
-    def validate_recipe(self, value):
-        user = self.context['request'].user
-        if ShoppingList.objects.filter(user=user, recipe=value).exists():
-            raise serializers.ValidationError(
-                'Этот рецепт уже в списке покупок')
-        return value
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False, max_length=MAX_BATCH_SIZE)
 
-    def to_representation(self, instance):
-        return RecipeShortSerializer(
-            instance.recipe, context=self.context).data
+    def validate_ids(self, value):
+        return list(dict.fromkeys(value))
@@ -0,0 +1,172 @@
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Sum
+
+from recipes.models import IngredientRecipe, ShoppingList, ShoppingListTotal
+
+User = get_user_model()
+
+
+def recipe_amounts(recipe_id):
+    """Возвращает количества ингредиентов рецепта по их id."""
+    return dict(IngredientRecipe.objects.filter(
+        recipe_id=recipe_id).values_list('ingredient_id', 'amount'))
+
+
+def recipes_amounts(recipe_ids):
+    """Возвращает суммарные количества ингредиентов нескольких рецептов."""
+    return dict(IngredientRecipe.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values('ingredient_id').annotate(
+        total=Sum('amount')
+    ).order_by().values_list('ingredient_id', 'total'))
+
+
+def amount_deltas(old_amounts, new_amounts):
+    """Возвращает ненулевые изменения количеств по ингредиентам."""
+    deltas = {
+        ingredient_id: new_amounts.get(ingredient_id, 0)
+        - old_amounts.get(ingredient_id, 0)
+        for ingredient_id in old_amounts.keys() | new_amounts.keys()
+    }
+    return {key: delta for key, delta in deltas.items() if delta}
+
+
+def lock_users(user_ids):
+    """
+    Блокирует строки пользователей до конца транзакции.
+
+    Все, что читается после блокировки (количества ингредиентов,
+    содержимое корзины, подписки), не меняется параллельными запросами
+    того же пользователя, поэтому они выполняются последовательно
+    и не учитывают одни и те же рецепты дважды.
+    """
+    list(User.objects.select_for_update().filter(
+        pk__in=user_ids).order_by('pk').values_list('pk', flat=True))
+
+
+def adjust_totals(user_ids, deltas):
+    """
+    Применяет изменения количеств к итогам списков покупок.
+
+    Вызывается в транзакции после lock_users() для тех же пользователей.
+    """
+    if not user_ids or not deltas:
+        return
+    totals = {
+        (total.user_id, total.ingredient_id): total
+        for total in ShoppingListTotal.objects.filter(
+            user_id__in=user_ids, ingredient_id__in=deltas)
+    }
+    to_create, to_update, to_delete = [], [], []
+    for user_id in user_ids:
+        for ingredient_id, delta in deltas.items():
+            total = totals.get((user_id, ingredient_id))
+            if total is None:
+                if delta > 0:
+                    to_create.append(ShoppingListTotal(
+                        user_id=user_id, ingredient_id=ingredient_id,
+                        amount=delta))
+                continue
+            total.amount += delta
+            if total.amount > 0:
+                to_update.append(total)
+            else:
+                to_delete.append(total.pk)
+    ShoppingListTotal.objects.bulk_create(to_create)
+    ShoppingListTotal.objects.bulk_update(to_update, ('amount',))
+    ShoppingListTotal.objects.filter(pk__in=to_delete).delete()
+
+
+def cart_user_ids(recipe_id):
+    """Возвращает id пользователей, у которых рецепт в корзине."""
+    return list(ShoppingList.objects.filter(
+        recipe_id=recipe_id).values_list('user_id', flat=True))
+
+
+@transaction.atomic
+def add_recipes_to_totals(user_id, recipe_ids):
+    """Добавляет ингредиенты рецептов в итоги списка покупок."""
+    lock_users([user_id])
+    adjust_totals([user_id], recipes_amounts(recipe_ids))
+
+
+@transaction.atomic
+def remove_recipes_from_totals(user_id, recipe_ids):
+    """Вычитает ингредиенты рецептов из итогов списка покупок."""
+    lock_users([user_id])
+    adjust_totals([user_id], {
+        ingredient_id: -amount
+        for ingredient_id, amount in recipes_amounts(recipe_ids).items()
+    })
+
+
+@transaction.atomic
+def remove_recipe_from_all_totals(recipe_id):
+    """Вычитает ингредиенты рецепта из итогов всех корзин с ним."""
+    user_ids = cart_user_ids(recipe_id)
+    if not user_ids:
+        return
+    lock_users(user_ids)
+    adjust_totals(user_ids, {
+        ingredient_id: -amount
+        for ingredient_id, amount in recipe_amounts(recipe_id).items()
+    })
+
+
+@transaction.atomic
+def sync_recipe_totals(recipe_id, old_amounts, new_amounts=None):
+    """Переносит изменение ингредиентов рецепта в итоги всех корзин."""
+    if new_amounts is not None and not amount_deltas(
+            old_amounts, new_amounts):
+        return
+    user_ids = cart_user_ids(recipe_id)
+    if not user_ids:
+        return
+    lock_users(user_ids)
+    if new_amounts is None:
+        new_amounts = recipe_amounts(recipe_id)
+    adjust_totals(user_ids, amount_deltas(old_amounts, new_amounts))
+
+
+def live_totals(user_ids=None):
+    """Считает итоги списков покупок напрямую по корзинам."""
+    items = IngredientRecipe.objects.filter(
+        recipe__shopping_lists__user__isnull=False)
+    if user_ids is not None:
+        items = IngredientRecipe.objects.filter(
+            recipe__shopping_lists__user__in=user_ids)
+    items = items.values(
+        'recipe__shopping_lists__user', 'ingredient'
+    ).annotate(amount=Sum('amount')).order_by()
+    totals = defaultdict(dict)
+    for item in items:
+        totals[item['recipe__shopping_lists__user']][
+            item['ingredient']] = item['amount']
+    return totals
+
+
+def stored_totals(user_ids=None):
+    """Возвращает сохраненные итоги списков покупок."""
+    items = ShoppingListTotal.objects.all()
+    if user_ids is not None:
+        items = items.filter(user_id__in=user_ids)
+    totals = defaultdict(dict)
+    for user_id, ingredient_id, amount in items.values_list(
+            'user_id', 'ingredient_id', 'amount'):
+        totals[user_id][ingredient_id] = amount
+    return totals
+
+
+@transaction.atomic
+def rebuild_totals(user_ids):
+    """Пересчитывает итоги списков покупок пользователей с нуля."""
+    ShoppingListTotal.objects.filter(user_id__in=user_ids).delete()
+    ShoppingListTotal.objects.bulk_create(
+        ShoppingListTotal(
+            user_id=user_id, ingredient_id=ingredient_id, amount=amount)
+        for user_id, amounts in live_totals(user_ids).items()
+        for ingredient_id, amount in amounts.items()
+    )
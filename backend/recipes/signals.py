@@ -0,0 +1,190 @@
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipes.cache import (
+    INGREDIENTS_VERSION_KEY, TAGS_VERSION_KEY, USER_VERSION_KEY,
+    invalidate_recipes, touch_versions)
+from recipes.db_router import pin_to_primary
+from recipes.feed import backfill_feed, publish_recipe, trim_feed
+from recipes.images import refresh_variants, release_image
+from recipes.metrics import install_query_observer
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingList, Tag
+from recipes.search import remove_from_search_index, update_search_index
+from recipes.serializers import (
+    AuthorSnapshotSerializer, RecipeSnapshotSerializer)
+from recipes.shopping_totals import remove_recipe_from_all_totals
+from users.authentication import TokenAuthentication
+from users.models import Subscription
+
+User = get_user_model()
+
+AUTHOR_SNAPSHOT_FIELDS = frozenset(AuthorSnapshotSerializer.Meta.fields)
+
+
+def affected_recipes(instance):
+    """Возвращает рецепты, в снимки которых входит тег или ингредиент."""
+    if isinstance(instance, Tag):
+        return instance.recipes.all()
+    return Recipe.objects.filter(ingredients_recipes__ingredient=instance)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def rebuild_related_snapshots(sender, instance, **kwargs):
+    """Пересобирает снимки рецептов после изменения тега или ингредиента."""
+    RecipeSnapshotSerializer.rebuild(affected_recipes(instance))
+
+
+@receiver(post_save, sender=User)
+def rebuild_author_snapshots(sender, instance, created, update_fields,
+                             **kwargs):
+    """Пересобирает снимки рецептов после изменения профиля автора."""
+    if created or (update_fields
+                   and AUTHOR_SNAPSHOT_FIELDS.isdisjoint(update_fields)):
+        return
+    RecipeSnapshotSerializer.rebuild(instance.recipes.all())
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def remember_affected_recipes(sender, instance, **kwargs):
+    """Запоминает рецепты, чьи снимки устареют после удаления."""
+    instance._affected_recipe_ids = list(
+        affected_recipes(instance).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def rebuild_affected_snapshots(sender, instance, **kwargs):
+    """Пересобирает снимки рецептов после удаления тега или ингредиента."""
+    RecipeSnapshotSerializer.rebuild(
+        Recipe.objects.filter(pk__in=instance._affected_recipe_ids))
+
+
+@receiver(post_delete, sender=Recipe)
+def invalidate_deleted_recipe(sender, instance, **kwargs):
+    """Сбрасывает кэш ответов после удаления рецепта."""
+    invalidate_recipes([instance.pk])
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def touch_tags_version(sender, **kwargs):
+    """Обновляет штамп версии списка тегов."""
+    touch_versions([TAGS_VERSION_KEY])
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def touch_ingredients_version(sender, **kwargs):
+    """Обновляет штамп версии списка ингредиентов."""
+    touch_versions([INGREDIENTS_VERSION_KEY])
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=ShoppingList)
+@receiver(post_delete, sender=ShoppingList)
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def touch_user_version(sender, instance, **kwargs):
+    """Обновляет штамп персональных полей пользователя в рецептах."""
+    touch_versions([USER_VERSION_KEY.format(pk=instance.user_id)])
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe(sender, instance, **kwargs):
+    """Обновляет рецепт в полнотекстовом индексе."""
+    update_search_index(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def unindex_recipe(sender, instance, **kwargs):
+    """Удаляет рецепт из полнотекстового индекса."""
+    remove_from_search_index(instance)
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_from_shopping_totals(sender, instance, **kwargs):
+    """Вычитает удаляемый рецепт из итогов списков покупок."""
+    remove_recipe_from_all_totals(instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+def create_image_variants(sender, instance, **kwargs):
+    """
+    Создает уменьшенные копии новой картинки рецепта.
+
+    Ошибка чтения картинки не мешает сохранению рецепта:
+    копии можно создать позже командой generate_image_variants.
+    """
+    try:
+        refresh_variants(instance)
+    except (OSError, ValueError):
+        pass
+
+
+@receiver(post_save, sender=Recipe)
+def publish_to_feeds(sender, instance, created, **kwargs):
+    """Раскладывает новый рецепт в ленты подписчиков автора."""
+    if created:
+        publish_recipe(instance)
+
+
+@receiver(post_save, sender=Subscription)
+def backfill_subscriber_feed(sender, instance, created, **kwargs):
+    """Добавляет в ленту подписчика рецепты нового автора."""
+    if created:
+        backfill_feed(instance.user_id, [instance.following_id])
+
+
+@receiver(post_delete, sender=Subscription)
+def trim_subscriber_feed(sender, instance, **kwargs):
+    """Убирает из ленты подписчика рецепты автора после отписки."""
+    trim_feed(instance.user_id, [instance.following_id])
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_previous_image(sender, instance, **kwargs):
+    """Запоминает прежнюю картинку рецепта перед сохранением."""
+    instance._previous_image = None if instance._state.adding else (
+        Recipe.objects.filter(pk=instance.pk).values_list(
+            'image', flat=True).first())
+
+
+@receiver(post_save, sender=Recipe)
+def release_replaced_image(sender, instance, **kwargs):
+    """Удаляет замененную картинку, если она больше не используется."""
+    previous = instance._previous_image
+    if previous and previous != instance.image.name:
+        transaction.on_commit(partial(release_image, previous))
+
+
+@receiver(post_delete, sender=Recipe)
+def release_deleted_image(sender, instance, **kwargs):
+    """Удаляет картинку удаленного рецепта, если она больше не используется."""
+    transaction.on_commit(partial(release_image, instance.image.name))
+
+
+@receiver(post_save, sender=Token)
+def pin_new_token(sender, instance, created, **kwargs):
+    """
+    Закрепляет за primary клиента с новым токеном.
+
+    Пока токен не дошел до реплик, запросы с ним читаются с primary.
+    """
+    if created:
+        pin_to_primary(f'{TokenAuthentication.keyword} {instance.key}')
+
+
+@receiver(connection_created)
+def observe_queries(sender, connection, **kwargs):
+    """Подключает учет SQL-запросов для метрик к новому соединению."""
+    install_query_observer(connection)
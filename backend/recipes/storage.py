@@ -0,0 +1,63 @@
+import hashlib
+import os
+import posixpath
+
+from django.core.files.storage import FileSystemStorage
+from django.db import connection
+
+
+def file_sha256(content):
+    """Считает SHA-256 содержимого файла, читая его частями."""
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def lock_name(name, shared=False):
+    """
+    Блокирует имя файла хранилища до конца текущей транзакции.
+
+    Загрузка берет разделяемую блокировку, удаление — исключительную,
+    поэтому файл не удаляется, пока не зафиксирован рецепт, который
+    только что его переиспользовал. Блокировка есть только в PostgreSQL,
+    в других базах функция ничего не делает.
+    """
+    if connection.vendor != 'postgresql' or not connection.in_atomic_block:
+        return
+    key = int.from_bytes(
+        hashlib.sha256(name.encode()).digest()[:8], 'big', signed=True)
+    function = ('pg_advisory_xact_lock_shared' if shared
+                else 'pg_advisory_xact_lock')
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT {function}(%s)', (key,))
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Файловое хранилище, где имя файла — хэш его содержимого.
+
+    Одинаковые файлы хранятся в одном экземпляре: если файл
+    с таким содержимым уже есть, запись на диск пропускается, а время
+    изменения обновляется, чтобы сборщик мусора не удалил его.
+    Сохранение берет блокировку имени (см. lock_name()), поэтому
+    вызывается в транзакции, которая создает ссылку на файл.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        directory, filename = posixpath.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        digest = getattr(content, 'sha256', None) or file_sha256(content)
+        name = posixpath.join(directory, digest + extension)
+        lock_name(name, shared=True)
+        if self.exists(name):
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length)
+
+
+def get_recipe_image_storage():
+    return ContentAddressedStorage()
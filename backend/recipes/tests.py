@@ -0,0 +1,1313 @@
+import asyncio
+import base64
+import importlib
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO, StringIO
+from unittest import skipUnless
+
+from asgiref.local import Local
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import (
+    InMemoryUploadedFile, TemporaryUploadedFile)
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.test import (
+    SimpleTestCase, TestCase, TransactionTestCase, skipUnlessDBFeature)
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import clear_url_caches, resolve
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient, APITestCase
+
+import foodgram.urls
+import recipes.urls
+from recipes.cache import (
+    LIST_VERSION_KEY, USER_VERSION_KEY, get_stats, get_versions)
+from recipes.checks import check_shared_caches
+from recipes.constants import IMAGE_VARIANTS
+from recipes.db_router import use_read_database
+from recipes.feed import fan_out_batch
+from recipes.fields import Base64ImageField
+from recipes.images import SOURCE_KEY
+from recipes.ingredient_index import IngredientIndex, get_ingredient_index
+from recipes.loaders import JSON_CHUNK_SIZE, load_tags
+from recipes.metrics import RECIPE_CACHE_HITS, MetricsRegistry, RequestMetrics
+from recipes.models import (
+    Favorite, FeedEntry, FeedFanout, Ingredient, IngredientRecipe, Recipe,
+    ShoppingList, ShoppingListTotal, Tag)
+from recipes.renderers import ShoppingListRenderer
+from recipes.search import update_search_index
+from recipes.serializers import RecipeSnapshotSerializer
+from recipes.shopping_totals import (
+    live_totals, rebuild_totals, stored_totals)
+from recipes.utils import slug_color
+from users.authentication import token_cache_stats
+from users.models import Subscription
+
+User = get_user_model()
+
+
+def clear_caches():
+    for cache in caches.all():
+        cache.clear()
+
+
+def run_concurrently(function, *arguments):
+    """Вызывает function для каждого аргумента одновременно в потоках."""
+    barrier = threading.Barrier(len(arguments))
+
+    def target(argument):
+        barrier.wait()
+        try:
+            return function(argument)
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(len(arguments)) as executor:
+        return list(executor.map(target, arguments))
+
+
+def create_user(username):
+    return User.objects.create_user(
+        username=username, email=f'{username}@example.com',
+        password='password', first_name=username, last_name=username)
+
+
+def image_bytes(color='red', size=(32, 32), image_format='PNG'):
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, image_format)
+    return buffer.getvalue()
+
+
+class TemporaryMediaMixin:
+    """Сохраняет файлы теста во временный MEDIA_ROOT."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        override = override_settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+
+class RecipeFixtureMixin:
+    """Авторы, теги, ингредиенты и рецепты для тестов API."""
+
+    recipes_count = 60
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('viewer')
+        cls.token = Token.objects.create(user=cls.user)
+        authors = [create_user(f'author{number}') for number in range(3)]
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тег {number}', slug=f'test_tag_{number}',
+                color=f'#00000{number}')
+            for number in range(2)]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Тестовый ингредиент {number}', measurement_unit='г')
+            for number in range(3)]
+        cls.recipes = []
+        for number in range(cls.recipes_count):
+            recipe = Recipe.objects.create(
+                author=authors[number % len(authors)],
+                name=f'Рецепт {number}', text='Описание',
+                image='recipes/images/test.jpg', cooking_time=10)
+            recipe.tags.set(cls.tags)
+            IngredientRecipe.objects.bulk_create(
+                IngredientRecipe(recipe=recipe, ingredient=ingredient,
+                                 amount=number + 1)
+                for ingredient in cls.ingredients)
+            cls.recipes.append(recipe)
+        Subscription.objects.create(user=cls.user, following=authors[0])
+        Favorite.objects.create(user=cls.user, recipe=cls.recipes[0])
+        ShoppingList.objects.create(user=cls.user, recipe=cls.recipes[1])
+
+    def setUp(self):
+        clear_caches()
+
+    def authenticate(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+
+class RecipeListQueriesTest(RecipeFixtureMixin, APITestCase):
+    """Число запросов списка рецептов не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        RecipeSnapshotSerializer.rebuild(Recipe.objects.all())
+
+    def assert_list_queries(self, queries):
+        for limit in (5, 50):
+            with self.subTest(limit=limit):
+                clear_caches()
+                with self.assertNumQueries(queries):
+                    response = self.client.get(f'/api/recipes/?limit={limit}')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']), limit)
+
+    def test_anonymous(self):
+        self.assert_list_queries(3)
+
+    def test_authenticated(self):
+        self.authenticate()
+        self.assert_list_queries(4)
+
+
+class RecipeListWithoutSnapshotsQueriesTest(
+        RecipeFixtureMixin, APITestCase):
+    """Рецепты без снимка догружают связи одним запросом на страницу."""
+
+    def assert_list_queries(self, queries):
+        for limit in (5, 50):
+            with self.subTest(limit=limit):
+                clear_caches()
+                with self.assertNumQueries(queries):
+                    response = self.client.get(f'/api/recipes/?limit={limit}')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']), limit)
+
+    def test_anonymous(self):
+        self.assert_list_queries(5)
+
+    def test_authenticated(self):
+        self.authenticate()
+        self.assert_list_queries(6)
+
+    def test_author_subscription(self):
+        self.authenticate()
+        response = self.client.get('/api/recipes/?limit=60')
+        subscribed = {
+            recipe['author']['username']: recipe['author']['is_subscribed']
+            for recipe in response.data['results']}
+        self.assertEqual(subscribed, {
+            'author0': True, 'author1': False, 'author2': False})
+
+
+class RecipeCursorPaginationTest(RecipeFixtureMixin, APITestCase):
+    """Курсор проходит рецепты с одинаковым временем создания без OFFSET."""
+
+    recipes_count = 20
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Recipe.objects.update(created_at=timezone.now())
+
+    def walk(self, url):
+        seen = []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(any(
+                'OFFSET' in query['sql']
+                for query in queries.captured_queries))
+            seen += [recipe['id'] for recipe in response.data['results']]
+            url = response.data['next']
+        return seen
+
+    def test_pages_follow_created_at_and_id(self):
+        expected = sorted(
+            (recipe.pk for recipe in self.recipes), reverse=True)
+        self.assertEqual(self.walk('/api/recipes/?cursor=&limit=7'), expected)
+
+    def test_previous_link_returns_same_page(self):
+        first = self.client.get('/api/recipes/?cursor=&limit=7').data
+        second = self.client.get(first['next']).data
+        back = self.client.get(second['previous']).data
+        self.assertEqual(
+            [recipe['id'] for recipe in back['results']],
+            [recipe['id'] for recipe in first['results']])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/recipes/?cursor=broken')
+        self.assertEqual(response.status_code, 404)
+
+
+class SubscriptionsQueriesTest(RecipeFixtureMixin, APITestCase):
+    """Число запросов подписок не зависит от числа авторов и рецептов."""
+
+    recipes_count = 12
+    url = '/api/users/subscriptions/'
+
+    def get_subscriptions(self, params):
+        clear_caches()
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_queries(self):
+        self.authenticate()
+        authors = User.objects.filter(username__startswith='author')
+        for params in ({}, {'recipes_limit': 2}):
+            with self.subTest(params=params):
+                Subscription.objects.filter(user=self.user).delete()
+                Subscription.objects.create(
+                    user=self.user, following=authors[0])
+                self.assertEqual(
+                    len(self.get_subscriptions(params)), 1)
+                Subscription.objects.bulk_create(
+                    Subscription(user=self.user, following=author)
+                    for author in authors[1:])
+                self.assertEqual(
+                    len(self.get_subscriptions(params)), 3)
+
+    def test_recipes_limit(self):
+        self.authenticate()
+        author = self.recipes[0].author
+        [subscription] = self.get_subscriptions({'recipes_limit': 2})
+        latest = Recipe.objects.filter(author=author).order_by(
+            '-created_at', '-id').values_list('id', flat=True)[:2]
+        self.assertEqual(
+            [recipe['id'] for recipe in subscription['recipes']],
+            list(latest))
+        self.assertEqual(subscription['recipes_count'], 4)
+
+
+class FeedTest(RecipeFixtureMixin, APITestCase):
+    """Лента подписок: раздача, дозаполнение, очистка и курсор."""
+
+    recipes_count = 12
+    url = '/api/recipes/feed/'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.followed, cls.other = (
+            User.objects.get(username=f'author{number}')
+            for number in range(2))
+
+    def setUp(self):
+        super().setUp()
+        self.authenticate()
+
+    def feed_ids(self):
+        response = self.client.get(self.url, {'limit': 100})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def recipe_ids(self, author):
+        return list(Recipe.objects.filter(author=author).order_by(
+            '-created_at', '-id').values_list('id', flat=True))
+
+    def create_recipe(self, author):
+        return Recipe.objects.create(
+            author=author, name='Новый рецепт', text='Описание',
+            image='recipes/images/test.jpg', cooking_time=10)
+
+    def test_publish(self):
+        recipe = self.create_recipe(self.followed)
+        self.create_recipe(self.other)
+        self.assertEqual(self.feed_ids(), self.recipe_ids(self.followed))
+        self.assertEqual(self.feed_ids()[0], recipe.pk)
+
+    def test_deferred_fanout(self):
+        followers = [create_user(f'follower{number}') for number in range(3)]
+        Subscription.objects.bulk_create(
+            Subscription(user=follower, following=self.followed)
+            for follower in followers)
+        [recipe] = Recipe.objects.bulk_create([Recipe(
+            author=self.followed, name='Новый рецепт', text='Описание',
+            image='recipes/images/test.jpg', cooking_time=10)])
+        FeedFanout.objects.create(
+            recipe=recipe, last_user_id=fan_out_batch(recipe, batch_size=1))
+        call_command('process_feed_fanout', batch_size=1, stdout=StringIO())
+        self.assertFalse(FeedFanout.objects.exists())
+        self.assertCountEqual(
+            FeedEntry.objects.filter(recipe=recipe).values_list(
+                'user', flat=True),
+            [self.user.pk] + [follower.pk for follower in followers])
+
+    def test_subscribe_backfills(self):
+        response = self.client.post(f'/api/users/{self.other.pk}/subscribe/')
+        self.assertEqual(response.status_code, 201)
+        self.assertCountEqual(
+            self.feed_ids(),
+            self.recipe_ids(self.followed) + self.recipe_ids(self.other))
+
+    def test_unsubscribe_trims(self):
+        response = self.client.delete(
+            f'/api/users/{self.followed.pk}/subscribe/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.feed_ids(), [])
+
+    def test_cursor_is_stable(self):
+        FeedEntry.objects.update(created_at=timezone.now())
+        expected = sorted(self.recipe_ids(self.followed), reverse=True)
+        seen = []
+        url = f'{self.url}?limit=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [recipe['id'] for recipe in response.data['results']]
+            self.create_recipe(self.followed)
+            url = response.data['next']
+        self.assertEqual(seen, expected)
+
+
+class AsyncViewsTest(RecipeFixtureMixin, APITestCase):
+    """Чтение под ASGI выполняют корутины alist и aretrieve."""
+
+    recipes_count = 3
+
+    @staticmethod
+    def reload_urls():
+        """Пересобирает маршруты: as_view() читает ASYNC_VIEWS при импорте."""
+        importlib.reload(recipes.urls)
+        importlib.reload(foodgram.urls)
+        clear_url_caches()
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(self.reload_urls)
+        override = override_settings(ASYNC_VIEWS=True)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.reload_urls()
+
+    def test_views_are_coroutines(self):
+        for url in ('/api/recipes/', f'/api/recipes/{self.recipes[0].pk}/',
+                    '/api/users/subscriptions/'):
+            with self.subTest(url=url):
+                self.assertTrue(
+                    asyncio.iscoroutinefunction(resolve(url).func))
+
+    async def test_list(self):
+        response = await self.async_client.get(
+            '/api/recipes/', {'limit': 2},
+            headers={'Authorization': f'Token {self.token.key}'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['count'], self.recipes_count)
+        self.assertEqual(
+            [recipe['id'] for recipe in data['results']],
+            [recipe.pk for recipe in reversed(self.recipes)][:2])
+        response = await self.async_client.get(
+            '/api/recipes/', {'limit': 2},
+            headers={'Authorization': f'Token {self.token.key}',
+                     'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_retrieve(self):
+        recipe = self.recipes[0]
+        response = await self.async_client.get(
+            f'/api/recipes/{recipe.pk}/',
+            headers={'Authorization': f'Token {self.token.key}'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['id'], recipe.pk)
+        self.assertTrue(data['is_favorited'])
+        self.assertFalse(data['is_in_shopping_cart'])
+        response = await self.async_client.get('/api/recipes/0/')
+        self.assertEqual(response.status_code, 404)
+
+
+class RecipeCacheStatsTest(RecipeFixtureMixin, APITestCase):
+    """Счетчики кэшей ответов и токенов учитываются в реестре метрик."""
+
+    recipes_count = 2
+
+    def test_hits_and_misses(self):
+        hits, misses = get_stats()
+        for _ in range(3):
+            self.client.get('/api/recipes/')
+        self.assertEqual(get_stats(), (hits + 2, misses + 1))
+
+    def test_token_hits_and_misses(self):
+        before = token_cache_stats.totals()
+        self.authenticate()
+        for _ in range(3):
+            self.client.get('/api/users/me/')
+        after = token_cache_stats.totals()
+        self.assertEqual(after['hits'] - before['hits'], 2)
+        self.assertEqual(after['misses'] - before['misses'], 1)
+
+
+class RecipeCacheInvalidationTest(RecipeFixtureMixin, APITestCase):
+    """Версии кэша ответов меняются после фиксации и только по делу."""
+
+    recipes_count = 2
+
+    def list_version(self):
+        return get_versions([LIST_VERSION_KEY])[0]
+
+    def test_version_changes_on_commit(self):
+        version = self.list_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            RecipeSnapshotSerializer.rebuild(
+                Recipe.objects.filter(pk=self.recipes[0].pk))
+            self.assertEqual(self.list_version(), version)
+        self.assertNotEqual(self.list_version(), version)
+
+    def test_user_without_recipes_keeps_version(self):
+        version = self.list_version()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            user = create_user('newcomer')
+            user.first_name = 'Новичок'
+            user.save()
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.list_version(), version)
+
+
+class ConditionalGetTest(RecipeFixtureMixin, APITestCase):
+    """Неизменный ресурс отдается с кодом 304, измененный - заново."""
+
+    recipes_count = 2
+
+    def get(self, url, **headers):
+        response = self.client.get(url, **headers)
+        self.assertIn(response.status_code, (200, 304))
+        return response
+
+    def assert_not_modified(self, url):
+        response = self.get(url)
+        self.assertEqual(response.status_code, 200)
+        for headers in (
+                {'HTTP_IF_NONE_MATCH': response['ETag']},
+                {'HTTP_IF_MODIFIED_SINCE': response['Last-Modified']}):
+            with self.subTest(url=url, headers=list(headers)):
+                self.assertEqual(self.get(url, **headers).status_code, 304)
+        return response['ETag']
+
+    def assert_modified(self, url, etag):
+        response = self.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_tags_and_ingredients(self):
+        for url in ('/api/tags/', f'/api/tags/{self.tags[0].pk}/',
+                    '/api/ingredients/', '/api/ingredients/?name=тест'):
+            self.assert_not_modified(url)
+
+    def test_favorite_changes_recipe(self):
+        self.authenticate()
+        url = f'/api/recipes/{self.recipes[1].pk}/'
+        etag = self.assert_not_modified(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'{url}favorite/')
+        self.assertEqual(response.status_code, 201)
+        self.assert_modified(url, etag)
+
+    def test_edit_changes_recipe(self):
+        recipe = self.recipes[0]
+        url = f'/api/recipes/{recipe.pk}/'
+        etags = {path: self.assert_not_modified(path)
+                 for path in (url, '/api/recipes/')}
+        token = Token.objects.create(user=recipe.author)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(url, {
+                'name': 'Новое название',
+                'ingredients': [
+                    {'id': ingredient.pk, 'amount': 1}
+                    for ingredient in self.ingredients],
+                'tags': [tag.pk for tag in self.tags]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.client.credentials()
+        for path, etag in etags.items():
+            with self.subTest(path=path):
+                self.assert_modified(path, etag)
+
+    def test_version_changes_on_commit(self):
+        self.authenticate()
+        key = USER_VERSION_KEY.format(pk=self.user.pk)
+        version, = get_versions([key])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/recipes/{self.recipes[1].pk}/favorite/')
+            self.assertEqual(get_versions([key]), [version])
+        self.assertNotEqual(get_versions([key]), [version])
+
+
+class IngredientIndexTest(TestCase):
+    """Подсказки ингредиентов из индекса в памяти."""
+
+    names = ('Соль морская', 'Фасоль', 'соль', 'Ёжевика', 'Сольник', 'Еда')
+
+    def search(self, query):
+        index = IngredientIndex([
+            {'id': pk, 'name': name, 'measurement_unit': 'г'}
+            for pk, name in enumerate(self.names)])
+        return [ingredient['name'] for ingredient in index.search(query)]
+
+    def test_prefix_matches_first(self):
+        self.assertEqual(
+            self.search('Соль'),
+            ['соль', 'Соль морская', 'Сольник', 'Фасоль'])
+
+    def test_yo_and_case(self):
+        for query in ('ёж', 'Еж', 'ЕЖЕВИКА'):
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query), ['Ёжевика'])
+        self.assertEqual(self.search('ёда'), ['Еда'])
+
+    def test_reload_after_change(self):
+        query = 'тестовая пряность'
+        self.assertEqual(get_ingredient_index().search(query), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredient = Ingredient.objects.create(
+                name='Тестовая пряность', measurement_unit='г')
+        self.assertEqual(
+            [item['id'] for item in get_ingredient_index().search(query)],
+            [ingredient.pk])
+
+
+class LoadersTest(TestCase):
+    """Загрузка ингредиентов и тегов пакетами с пропуском существующих."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.directory = directory
+        Ingredient.objects.create(name='Тестовая мука', measurement_unit='г')
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def load_ingredients(self, path, *args):
+        stdout = StringIO()
+        call_command('load_ingredients', path, *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_csv(self):
+        path = self.write('ingredients.csv', (
+            'Тестовая мука,г\n'
+            '"Тестовый сахар, тростниковый",г\n'
+            '\n'
+            'Тестовое молоко,мл\n'))
+        self.assertIn(
+            'Добавлено: 2, пропущено: 1', self.load_ingredients(path))
+        self.assertTrue(Ingredient.objects.filter(
+            name='Тестовый сахар, тростниковый', measurement_unit='г'
+        ).exists())
+
+    def test_json(self):
+        rows = [{'name': 'Тестовая мука', 'measurement_unit': 'г'}] + [
+            {'name': f'Тестовая специя {number}', 'measurement_unit': 'г'}
+            for number in range(2000)]
+        path = self.write('ingredients.data', json.dumps(
+            rows, ensure_ascii=False, indent=2))
+        self.assertGreater(os.path.getsize(path), 2 * JSON_CHUNK_SIZE)
+        self.assertIn(
+            'Добавлено: 2000, пропущено: 1',
+            self.load_ingredients(path, '--format', 'json'))
+        self.assertEqual(Ingredient.objects.filter(
+            name__startswith='Тестовая специя').count(), 2000)
+
+    def test_invalid_json(self):
+        path = self.write('ingredients.json', '[{"name": "Тестовая соль"')
+        with self.assertRaises(CommandError):
+            self.load_ingredients(path)
+
+    def test_tag_color_collision(self):
+        taken = slug_color('new_tag')
+        Tag.objects.create(name='Занятый цвет', slug='taken', color=taken)
+        tags = [('Новый тег', 'new_tag'), ('Еще тег', 'another_tag')]
+        self.assertEqual(load_tags(Tag, tags), (2, 0))
+        self.assertEqual(load_tags(Tag, tags), (0, 2))
+        self.assertEqual(
+            Tag.objects.get(slug='new_tag').color,
+            slug_color('new_tag', {taken}))
+        self.assertEqual(
+            Tag.objects.get(slug='another_tag').color,
+            slug_color('another_tag'))
+
+
+class SharedCacheCheckTest(SimpleTestCase):
+    """check --deploy предупреждает о кэшах в памяти процесса."""
+
+    def check_ids(self, backend):
+        cache = {'BACKEND': backend, 'LOCATION': tempfile.gettempdir()}
+        aliases = (settings.RECIPE_CACHE_ALIAS, settings.TOKEN_CACHE_ALIAS)
+        with override_settings(CACHES=dict.fromkeys(aliases, cache)):
+            return [warning.id for warning in check_shared_caches(None)]
+
+    def test_process_local_cache(self):
+        self.assertEqual(
+            self.check_ids('django.core.cache.backends.locmem.LocMemCache'),
+            ['recipes.W001', 'recipes.W003'])
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_process_local_cache_with_replicas(self):
+        self.assertEqual(
+            self.check_ids('django.core.cache.backends.locmem.LocMemCache'),
+            ['recipes.W001', 'recipes.W002', 'recipes.W003'])
+
+    def test_shared_cache(self):
+        self.assertEqual(
+            self.check_ids(
+                'django.core.cache.backends.filebased.FileBasedCache'),
+            [])
+
+
+class TokenCacheTest(RecipeFixtureMixin, APITestCase):
+    """Отозванный токен перестает действовать."""
+
+    recipes_count = 2
+
+    def me(self):
+        return self.client.get('/api/users/me/').status_code
+
+    def test_logout(self):
+        self.authenticate()
+        self.assertEqual(self.me(), 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.me(), 401)
+
+    @override_settings(TOKEN_CACHE_TIMEOUT=1)
+    def test_missed_invalidation_expires(self):
+        """Не сброшенный в этом процессе токен живет TOKEN_CACHE_TIMEOUT."""
+        self.authenticate()
+        self.assertEqual(self.me(), 200)
+        # Сброс ждет фиксации и в тесте не выполняется, как сброс
+        # в другом воркере, когда кэш токенов у каждого свой.
+        Token.objects.filter(pk=self.token.pk).delete()
+        self.assertEqual(self.me(), 200)
+        time.sleep(1.1)
+        self.assertEqual(self.me(), 401)
+
+
+class RecipeSearchTest(RecipeFixtureMixin, APITestCase):
+    """Поиск рецептов по названию и описанию с учетом релевантности."""
+
+    recipes_count = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.relevant = Recipe.objects.create(
+            author=cls.user, name='Борщ', text='Борщ, борщ и еще борщ',
+            image='recipes/images/test.jpg', cooking_time=10)
+        cls.other = Recipe.objects.create(
+            author=cls.user, name='Салат', text='Подается после борща',
+            image='recipes/images/test.jpg', cooking_time=10)
+        for recipe in (cls.relevant, cls.other):
+            update_search_index(recipe)
+
+    def test_admin_keeps_rank(self):
+        self.client.force_login(User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin'))
+        response = self.client.get('/admin/recipes/recipe/', {'q': 'борщ'})
+        self.assertEqual(
+            list(response.context['cl'].result_list),
+            [self.relevant, self.other])
+
+    def test_cursor_with_search(self):
+        response = self.client.get(
+            '/api/recipes/', {'search': 'борщ', 'cursor': ''})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('search', response.data)
+
+    def search(self, query):
+        response = self.client.get('/api/recipes/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['name'] for recipe in response.data['results']]
+
+    def test_api_orders_by_rank(self):
+        self.assertEqual(self.search('борщ'), ['Борщ', 'Салат'])
+
+    @skipUnless(connection.vendor == 'postgresql', 'морфология PostgreSQL')
+    def test_russian_morphology(self):
+        self.assertEqual(self.search('борщи'), ['Борщ', 'Салат'])
+
+    @skipUnless(connection.vendor == 'postgresql', 'websearch PostgreSQL')
+    def test_websearch_syntax(self):
+        self.assertEqual(self.search('борщ -салат'), ['Борщ'])
+        self.assertEqual(self.search('"подается после борща"'), ['Салат'])
+
+    @skipUnless(connection.vendor == 'postgresql', 'триграммы pg_trgm')
+    def test_typo_in_name(self):
+        self.assertEqual(self.search('Борш'), ['Борщ'])
+
+
+class ShoppingTotalsTest(RecipeFixtureMixin, APITestCase):
+    """Итоги списка покупок совпадают с пересчетом по корзине."""
+
+    recipes_count = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        rebuild_totals([cls.user.pk])
+
+    def assert_totals(self):
+        self.assertEqual(
+            stored_totals([self.user.pk]), live_totals([self.user.pk]))
+
+    def test_add_and_remove(self):
+        self.authenticate()
+        url = f'/api/recipes/{self.recipes[2].pk}/shopping_cart/'
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assert_totals()
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assert_totals()
+
+
+class ShoppingListDownloadTest(RecipeFixtureMixin, APITestCase):
+    """Выгрузка списка покупок в каждом формате."""
+
+    recipes_count = 2
+    url = '/api/recipes/download_shopping_cart/'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        rebuild_totals([cls.user.pk])
+
+    def download(self, file_format):
+        self.authenticate()
+        response = self.client.get(self.url, {'format': file_format})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response['Content-Disposition'],
+            f'attachment; filename=viewer_shopping_list.{file_format}')
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv(self):
+        self.assertEqual(self.download('csv').splitlines(), [
+            'Ingredient,Amount,Unit',
+            *(f'Тестовый ингредиент {number},2,г' for number in range(3))])
+
+    def test_txt(self):
+        self.assertEqual(self.download('txt').splitlines(), [
+            'Список покупок', '',
+            *(f'[ ] Тестовый ингредиент {number} — 2 г'
+              for number in range(3))])
+
+    def test_json(self):
+        self.assertEqual(json.loads(self.download('json')), [
+            {'name': f'Тестовый ингредиент {number}', 'amount': 2,
+             'measurement_unit': 'г'}
+            for number in range(3)])
+
+    def test_empty_json(self):
+        ShoppingListTotal.objects.filter(user=self.user).delete()
+        self.assertEqual(json.loads(self.download('json')), [])
+
+    def test_unknown_format(self):
+        self.authenticate()
+        response = self.client.get(self.url, {'format': 'pdf'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_renderer_requires_stream(self):
+        with self.assertRaises(TypeError):
+            ShoppingListRenderer()
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentBatchTest(RecipeFixtureMixin, TransactionTestCase):
+    """Пересекающиеся пакетные запросы учитывают каждый рецепт один раз."""
+
+    recipes_count = 5
+
+    def setUp(self):
+        self.setUpTestData()
+        rebuild_totals([self.user.pk])
+        super().setUp()
+
+    def post(self, url, data):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        return client.post(url, data, format='json').data
+
+    def test_batch_shopping_cart(self):
+        ids = [recipe.pk for recipe in self.recipes[2:]]
+        responses = run_concurrently(
+            lambda _: self.post('/api/recipes/batch_shopping_cart/',
+                                {'ids': ids}),
+            *range(4))
+        created = [result['id'] for results in responses
+                   for result in results if result['status'] == 201]
+        self.assertCountEqual(created, ids)
+        self.assertEqual(
+            stored_totals([self.user.pk]), live_totals([self.user.pk]))
+
+
+@skipUnlessDBFeature('test_db_allows_multiple_connections')
+class UserRelationManagerConcurrencyTest(
+        RecipeFixtureMixin, TransactionTestCase):
+    """Из параллельных link/unlink изменение видит ровно один вызов."""
+
+    recipes_count = 2
+
+    def setUp(self):
+        self.setUpTestData()
+        super().setUp()
+
+    def test_link_and_unlink(self):
+        recipe = self.recipes[1]
+        for method in (Favorite.objects.link, Favorite.objects.unlink):
+            with self.subTest(method=method.__name__):
+                results = run_concurrently(
+                    lambda _: method(self.user.pk, recipe.pk), *range(8))
+                self.assertEqual(results.count(True), 1)
+
+
+@skipUnlessDBFeature('test_db_allows_multiple_connections')
+class RelationActionsConcurrencyTest(RecipeFixtureMixin, TransactionTestCase):
+    """Из параллельных запросов действие выполняет ровно один."""
+
+    recipes_count = 3
+    parallel_requests = 8
+
+    def setUp(self):
+        self.setUpTestData()
+        rebuild_totals([self.user.pk])
+        super().setUp()
+
+    def request(self, method, url):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        return getattr(client, method)(url).status_code
+
+    def assert_one_succeeds(self, url):
+        for method, success in (('post', 201), ('delete', 204)):
+            with self.subTest(url=url, method=method):
+                codes = run_concurrently(
+                    lambda _: self.request(method, url),
+                    *range(self.parallel_requests))
+                self.assertCountEqual(
+                    codes, [success] + [400] * (self.parallel_requests - 1))
+
+    def test_favorite_and_shopping_cart(self):
+        recipe = self.recipes[2]
+        for action in ('favorite', 'shopping_cart'):
+            self.assert_one_succeeds(f'/api/recipes/{recipe.pk}/{action}/')
+        self.assertEqual(
+            stored_totals([self.user.pk]), live_totals([self.user.pk]))
+
+    def test_subscribe(self):
+        author = self.recipes[2].author
+        self.assert_one_succeeds(f'/api/users/{author.pk}/subscribe/')
+
+
+class RelationActionsTest(RecipeFixtureMixin, APITestCase):
+    """Действия с избранным, корзиной и подписками."""
+
+    recipes_count = 2
+
+    def test_invalid_pk(self):
+        self.authenticate()
+        for url in ('/api/recipes/abc/favorite/',
+                    '/api/recipes/abc/shopping_cart/',
+                    '/api/users/abc/subscribe/'):
+            for method in (self.client.post, self.client.delete):
+                with self.subTest(url=url, method=method.__name__):
+                    self.assertEqual(method(url).status_code, 404)
+
+
+class RecipeUpdateQueriesTest(RecipeFixtureMixin, APITestCase):
+    """Изменение одного количества не пересоздает ингредиенты рецепта."""
+
+    recipes_count = 2
+
+    def test_change_one_amount(self):
+        recipe = self.recipes[0]
+        token = Token.objects.create(user=recipe.author)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        ingredients = [
+            {'id': item.ingredient_id, 'amount': item.amount}
+            for item in recipe.ingredients_recipes.order_by('pk')]
+        ingredients[0]['amount'] += 1
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                f'/api/recipes/{recipe.pk}/',
+                {'ingredients': ingredients,
+                 'tags': [tag.pk for tag in self.tags]},
+                format='json')
+        self.assertEqual(response.status_code, 200)
+        table = IngredientRecipe._meta.db_table
+        writes = [
+            query['sql'].split()[0] for query in queries.captured_queries
+            if table in query['sql']
+            and not query['sql'].startswith('SELECT')]
+        self.assertEqual(writes, ['UPDATE'])
+        self.assertEqual(
+            IngredientRecipe.objects.get(
+                recipe=recipe, ingredient_id=ingredients[0]['id']).amount,
+            ingredients[0]['amount'])
+
+
+class RecipeWriteQueriesTest(
+        TemporaryMediaMixin, RecipeFixtureMixin, APITestCase):
+    """Число запросов записи рецепта не зависит от числа ингредиентов."""
+
+    recipes_count = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.ingredients += [
+            Ingredient.objects.create(
+                name=f'Тестовый ингредиент {number}', measurement_unit='г')
+            for number in range(3, 6)]
+
+    def setUp(self):
+        super().setUp()
+        self.authenticate()
+
+    def payload(self, ingredients, amount=1):
+        return {
+            'name': 'Новый рецепт', 'text': 'Описание', 'cooking_time': 10,
+            'image': 'data:image/png;base64,'
+                     + base64.b64encode(image_bytes()).decode(),
+            'tags': [tag.pk for tag in self.tags],
+            'ingredients': [
+                {'id': ingredient.pk, 'amount': amount}
+                for ingredient in ingredients],
+        }
+
+    def count_queries(self, method, url, payload, status_code):
+        clear_caches()
+        with CaptureQueriesContext(connection) as queries:
+            response = method(url, payload, format='json')
+        self.assertEqual(response.status_code, status_code)
+        return len(queries)
+
+    def test_create(self):
+        counts = [
+            self.count_queries(
+                self.client.post, '/api/recipes/',
+                self.payload(self.ingredients[:count]), 201)
+            for count in (1, len(self.ingredients))]
+        self.assertEqual(counts[0], counts[1])
+
+    def test_update(self):
+        recipe = self.client.post(
+            '/api/recipes/', self.payload(self.ingredients[:1]),
+            format='json').data
+        url = f'/api/recipes/{recipe["id"]}/'
+        counts = [
+            self.count_queries(
+                self.client.patch, url,
+                self.payload(self.ingredients, amount), 200)
+            for amount in (1, 2)]
+        self.assertEqual(counts[0], counts[1])
+
+    def test_missing_ids(self):
+        payload = self.payload(self.ingredients[:1])
+        payload['ingredients'] += [
+            {'id': 999998, 'amount': 1}, {'id': 999999, 'amount': 1}]
+        payload['tags'].append(999997)
+        response = self.client.post('/api/recipes/', payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['ingredients'], [
+            'Ингредиенты не найдены: 999998, 999999.'])
+        self.assertEqual(response.data['tags'], [
+            'Теги не найдены: 999997.'])
+
+
+class Base64ImageFieldTest(SimpleTestCase):
+    """Декодирование картинок из base64 с ограничениями."""
+
+    def decode(self, content, image_format='png'):
+        return Base64ImageField().decode(
+            f'data:image/{image_format};base64,'
+            + base64.b64encode(content).decode())
+
+    def assert_fails(self, content, code):
+        with self.assertRaises(ValidationError) as context:
+            self.decode(content)
+        self.assertEqual(context.exception.detail[0].code, code)
+
+    @override_settings(RECIPE_IMAGE_MAX_BYTES=64)
+    def test_too_large(self):
+        self.assert_fails(image_bytes(size=(64, 64)), 'too_large')
+
+    @override_settings(RECIPE_IMAGE_MAX_DIMENSION=16)
+    def test_too_many_pixels(self):
+        self.assert_fails(image_bytes(size=(32, 16)), 'too_many_pixels')
+
+    def test_malformed(self):
+        with self.assertRaises(ValidationError):
+            Base64ImageField().decode('data:image/png;base64,abc')
+
+    def test_in_memory(self):
+        content = image_bytes()
+        file = self.decode(content)
+        self.assertIsInstance(file, InMemoryUploadedFile)
+        self.assertEqual(file.read(), content)
+        self.assertEqual(file.size, len(content))
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=1024)
+    def test_large_file_moves_to_disk(self):
+        content = image_bytes(size=(64, 64), image_format='BMP')
+        self.assertGreater(len(content), 1024)
+        file = self.decode(content, 'bmp')
+        self.addCleanup(file.close)
+        self.assertIsInstance(file, TemporaryUploadedFile)
+        self.assertEqual(file.read(), content)
+        self.assertEqual(file.size, len(content))
+        self.assertEqual(file.sha256, hashlib.sha256(content).hexdigest())
+
+
+class RecipeImageReleaseTest(TemporaryMediaMixin, TestCase):
+    """Общий файл картинки удаляется вместе с последней ссылкой на него."""
+
+    def setUp(self):
+        super().setUp()
+        self.author = create_user('author')
+
+    def create_recipe(self, content):
+        return Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Описание',
+            image=ContentFile(content, name='image.png'), cooking_time=10)
+
+    def assert_files(self, recipe, exist):
+        storage = recipe.image.storage
+        names = [recipe.image.name] + [
+            name for variant, name in recipe.image_variants.items()
+            if variant != SOURCE_KEY]
+        self.assertEqual(len(names), 1 + len(IMAGE_VARIANTS))
+        for name in names:
+            with self.subTest(name=name):
+                self.assertIs(storage.exists(name), exist)
+
+    def delete(self, recipe):
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.delete()
+
+    def test_last_reference_deletes_file(self):
+        first, second = (self.create_recipe(image_bytes()) for _ in range(2))
+        self.assertEqual(first.image.name, second.image.name)
+        self.delete(first)
+        self.assert_files(second, exist=True)
+        self.delete(second)
+        self.assert_files(second, exist=False)
+
+    def test_replaced_image_is_deleted(self):
+        recipe = self.create_recipe(image_bytes())
+        previous = Recipe.objects.get(pk=recipe.pk)
+        recipe.image = ContentFile(image_bytes('blue'), name='image.png')
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.save()
+        self.assert_files(previous, exist=False)
+        self.assertTrue(recipe.image.storage.exists(recipe.image.name))
+
+
+class GenerateImageVariantsTest(TemporaryMediaMixin, TransactionTestCase):
+    """
+    Команда создает недостающие копии картинок в процессах.
+
+    TransactionTestCase нужен потому, что команда закрывает соединения
+    с базой перед запуском процессов.
+    """
+
+    def setUp(self):
+        super().setUp()
+        author = create_user('author')
+        self.recipe = Recipe.objects.create(
+            author=author, name='Рецепт', text='Описание',
+            image=ContentFile(image_bytes(), name='image.png'),
+            cooking_time=10)
+        self.broken = Recipe.objects.create(
+            author=author, name='Без файла', text='Описание',
+            image='recipes/images/missing.png', cooking_time=10)
+        Recipe.objects.update(image_variants={})
+
+    def test_generate(self):
+        stdout, stderr = StringIO(), StringIO()
+        call_command(
+            'generate_image_variants', '--workers', '2',
+            stdout=stdout, stderr=stderr)
+        self.assertIn('Обновлено рецептов: 1, ошибок: 1', stdout.getvalue())
+        self.assertIn(self.broken.image.name, stderr.getvalue())
+        self.recipe.refresh_from_db()
+        variants = self.recipe.image_variants
+        self.assertEqual(variants[SOURCE_KEY], self.recipe.image.name)
+        storage = self.recipe.image.storage
+        for variant, _size in IMAGE_VARIANTS:
+            with self.subTest(variant=variant):
+                self.assertTrue(storage.exists(variants[variant]))
+        self.assertEqual(
+            self.recipe.snapshot.data['image_thumbnail'],
+            storage.url(variants['thumbnail']))
+
+
+class CollectOrphanedMediaTest(TemporaryMediaMixin, TestCase):
+    """Сборщик удаляет только старые файлы без ссылок из рецептов."""
+
+    def setUp(self):
+        super().setUp()
+        recipe = Recipe.objects.create(
+            author=create_user('author'), name='Рецепт', text='Описание',
+            image=ContentFile(image_bytes(), name='image.png'),
+            cooking_time=10)
+        recipe.refresh_from_db()
+        self.storage = recipe.image.storage
+        self.referenced = [recipe.image.name] + [
+            name for variant, name in recipe.image_variants.items()
+            if variant != SOURCE_KEY]
+        self.assertEqual(len(self.referenced), 1 + len(IMAGE_VARIANTS))
+        self.orphan, self.fresh_orphan = (
+            self.storage.save(
+                'recipes/images/orphan.png', ContentFile(image_bytes(color)))
+            for color in ('blue', 'green'))
+        old = time.time() - 48 * 60 * 60
+        for name in self.referenced + [self.orphan]:
+            os.utime(self.storage.path(name), (old, old))
+
+    def collect(self, *args):
+        stdout = StringIO()
+        call_command(
+            'collect_orphaned_media', '--batch-size', '2', *args,
+            stdout=stdout)
+        return stdout.getvalue().splitlines()
+
+    def assert_kept(self):
+        for name in self.referenced + [self.fresh_orphan]:
+            with self.subTest(name=name):
+                self.assertTrue(self.storage.exists(name))
+
+    def test_dry_run(self):
+        output = self.collect('--dry-run')
+        self.assertEqual(output[:-1], [self.orphan])
+        self.assertIn('Будет удалено файлов: 1', output[-1])
+        self.assertTrue(self.storage.exists(self.orphan))
+        self.assert_kept()
+
+    def test_delete(self):
+        output = self.collect()
+        self.assertIn('Удалено файлов: 1', output[-1])
+        self.assertFalse(self.storage.exists(self.orphan))
+        self.assert_kept()
+
+
+class MetricsRegistryTest(SimpleTestCase):
+    """Экспорт складывает снимки живых процессов и удаляет остальные."""
+
+    def setUp(self):
+        metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, metrics_dir)
+        override = override_settings(METRICS_DIR=metrics_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def registry(self, route_count, hits):
+        registry = MetricsRegistry()
+        for _ in range(route_count):
+            registry.observe('recipe-list', 'GET', 200, RequestMetrics())
+        registry.increment(RECIPE_CACHE_HITS, hits)
+        registry.flush()
+        return registry
+
+    def test_sum_of_processes(self):
+        first, second = self.registry(1, 2), self.registry(3, 4)
+        self.assertNotEqual(first.path, second.path)
+        routes, responses, counters = first.collect()
+        self.assertEqual(routes[('recipe-list', 'GET')]['count'], 4)
+        self.assertEqual(responses[('recipe-list', 'GET', '200')], 4)
+        self.assertEqual(counters[RECIPE_CACHE_HITS], 6)
+        second.remove_snapshot()
+        self.assertFalse(os.path.exists(second.path))
+        self.assertEqual(first.collect()[2][RECIPE_CACHE_HITS], 2)
+
+    def test_dead_process_snapshot(self):
+        registry = self.registry(1, 1)
+        process = subprocess.Popen(['true'])
+        process.wait()
+        dead = registry.path.replace(f'-{os.getpid()}-', f'-{process.pid}-')
+        shutil.copy(registry.path, dead)
+        self.assertEqual(registry.collect()[2][RECIPE_CACHE_HITS], 1)
+        self.assertFalse(os.path.exists(dead))
+
+
+class ReplicaRoutingTest(SimpleTestCase):
+    """Безопасные запросы читают с реплики, кроме окна после записи."""
+
+    databases = {'default'}
+    replica_databases = {
+        alias: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}
+        for alias in ('default', 'replica')
+    }
+    credentials = 'Token replica-routing-test-token'
+
+    def setUp(self):
+        override = override_settings(
+            DATABASES=self.replica_databases, DATABASE_REPLICAS=['replica'])
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            override.enable()
+        self.addCleanup(override.disable)
+        self.use_connections(self.replica_databases)
+        # Middleware выбирает базу в начале каждого запроса, а выбор
+        # последнего запроса теста не должен достаться следующим тестам.
+        use_read_database(None)
+        self.addCleanup(use_read_database, None)
+        for alias in self.replica_databases:
+            with connections[alias].schema_editor() as editor:
+                for model in apps.get_models():
+                    if model._meta.managed and not model._meta.proxy:
+                        editor.create_model(model)
+            # Реплика содержит тех же пользователей, но свой тег, поэтому
+            # по ответу видно, из какой базы он прочитан.
+            users = [
+                User.objects.db_manager(alias).create_user(
+                    username=username, email=f'{username}@example.com',
+                    password='password')
+                for username in ('reader', 'author')]
+            self.author = users[1]
+            Token.objects.using(alias).create(
+                user=users[0], key=self.credentials.split()[1])
+            Tag.objects.using(alias).create(
+                name=alias, slug=alias, color='#000000')
+        clear_caches()
+
+    def use_connections(self, databases):
+        """Подменяет соединения Django на базы databases до конца теста."""
+        saved = (connections._settings, connections._connections,
+                 connections.__dict__.pop('settings', None))
+        connections._settings = connections.configure_settings(databases)
+        connections._connections = Local(connections.thread_critical)
+
+        def restore():
+            for alias in databases:
+                connections[alias].close()
+            (connections._settings, connections._connections,
+             connections.__dict__['settings']) = saved
+
+        self.addCleanup(restore)
+
+    def read_tags(self, **headers):
+        response = self.client.get('/api/tags/', **headers)
+        self.assertEqual(response.status_code, 200)
+        return [tag['name'] for tag in response.json()]
+
+    def test_safe_request_reads_replica(self):
+        self.assertEqual(self.read_tags(), ['replica'])
+        self.assertEqual(
+            self.read_tags(HTTP_AUTHORIZATION=self.credentials), ['replica'])
+
+    def test_reads_primary_after_write(self):
+        response = self.client.post(
+            f'/api/users/{self.author.pk}/subscribe/',
+            HTTP_AUTHORIZATION=self.credentials)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            self.read_tags(HTTP_AUTHORIZATION=self.credentials), ['default'])
+        self.assertEqual(self.read_tags(), ['replica'])
@@ -2,7 +2,7 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
 from recipes.views import (
-    IngredientViewSet, RecipeViewSet, TagViewSet,
+    IngredientViewSet, MetricsView, RecipeViewSet, TagViewSet,
     UserViewSet,)
 
 
@@ -14,8 +14,12 @@ router.register(r'users', UserViewSet)
 
 
 urlpatterns = [
+    path('metrics/', MetricsView.as_view(), name='metrics'),
     path('users/subscriptions/', UserViewSet.as_view({
         'get': 'list_subscriptions'}), name='user-subscriptions'),
+    path('users/batch_subscribe/', UserViewSet.as_view({
+        'post': 'batch_subscribe',
+        'delete': 'batch_subscribe'}), name='user-batch-subscribe'),
     path('', include('djoser.urls')),
     path('', include(router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
@@ -1,4 +1,6 @@
 import random
+from hashlib import sha256
+from itertools import count
 
 
 def random_color():
@@ -7,3 +9,22 @@ def random_color():
     g = random.randint(0, 255)
     b = random.randint(0, 255)
     return f'#{r:02X}{g:02X}{b:02X}'
+
+
+def slug_color(slug, used=()):
+    """
+    Вычисляет цвет в формате HEX из слага.
+
+    Если цвет уже есть в used, берется следующий вариант,
+    поэтому для одного набора цветов результат не меняется.
+    """
+    for attempt in count():
+        digest = sha256(f'{slug}:{attempt}'.encode()).hexdigest()
+        color = f'#{digest[:6].upper()}'
+        if color not in used:
+            return color
+
+
+def batch_result(pk, status_code, detail):
+    """Формирует результат обработки одного объекта пакетного запроса."""
+    return {'id': pk, 'status': status_code, 'detail': detail}
@@ -1,43 +1,65 @@
-import csv
+from functools import partial
 
+from asgiref.sync import sync_to_async
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef, Prefetch, Window
+from django.db.models.functions import RowNumber
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import (
-    IsAuthenticatedOrReadOnly, SAFE_METHODS, IsAuthenticated)
+    IsAdminUser, IsAuthenticatedOrReadOnly, SAFE_METHODS, IsAuthenticated)
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from recipes.cache import (
+    DETAIL_VERSION_KEY, INGREDIENTS_VERSION_KEY, LIST_VERSION_KEY,
+    TAGS_VERSION_KEY, USER_VERSION_KEY, touch_versions)
+from recipes.constants import (
+    RECIPE_CURSOR_ORDERING, SHOPPING_LIST_CHUNK_SIZE)
+from recipes.feed import backfill_feed, trim_feed
 from recipes.filters import IngredientFilter, RecipeFilter
+from recipes.ingredient_index import get_ingredient_index
+from recipes.metrics import render_prometheus
+from recipes.mixins import (
+    AnonymousCacheMixin, AsyncReadMixin, ConditionalGetMixin)
 from recipes.models import (
-    Favorite, Ingredient, IngredientRecipe, Recipe,
-    ShoppingList, Tag)
-from recipes.pagination import StandardResultsSetPagination
+    FeedEntry, Favorite, Ingredient, Recipe, ShoppingList,
+    ShoppingListTotal, Tag)
+from recipes.pagination import (
+    FeedCursorPagination, RecipeResultsSetPagination,
+    StandardResultsSetPagination)
 from recipes.permissions import IsAuthorOrReadOnly
+from recipes.renderers import SHOPPING_LIST_RENDERERS
 from recipes.serializers import (
-    FavoriteRecipeSerializer, IngredientSerializer,
-    RecipeReadSerializer, RecipeWriteSerializer,
+    BatchIdsSerializer, IngredientSerializer,
+    RecipeReadSerializer, RecipeShortSerializer, RecipeWriteSerializer,
     SubscriptionSerializer, TagSerializer,
-    UserSerializer, SubscribeSerializer,
-    ShoppingListSerializer)
+    UserSerializer, ShoppingListTotalSerializer)
+from recipes.shopping_totals import (
+    add_recipes_to_totals, lock_users, remove_recipes_from_totals)
+from recipes.utils import batch_result
 from users.models import Subscription
 
 
 User = get_user_model()
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ConditionalGetMixin, AsyncReadMixin,
+                 viewsets.ReadOnlyModelViewSet):
     """Viewset для работы с моделью тегов"""
 
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
+    version_key = TAGS_VERSION_KEY
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, AsyncReadMixin,
+                        viewsets.ReadOnlyModelViewSet):
     """Viewset для работы с моделью ингредиентов"""
 
     queryset = Ingredient.objects.all()
@@ -46,59 +68,119 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
     search_fields = ('^name',)
+    version_key = INGREDIENTS_VERSION_KEY
 
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if not name:
+            return super().list(request, *args, **kwargs)
+        return self.conditional_response(
+            request, partial(self.search_by_name, name))
 
-class RecipeViewSet(viewsets.ModelViewSet):
+    async def alist(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if not name:
+            return await super().alist(request, *args, **kwargs)
+        return await self.aconditional_response(
+            request, sync_to_async(partial(self.search_by_name, name)))
+
+    def search_by_name(self, name):
+        """Ищет ингредиенты по индексу в памяти, без запроса к базе."""
+        return Response(get_ingredient_index().search(name))
+
+
+class RecipeViewSet(ConditionalGetMixin, AnonymousCacheMixin,
+                    AsyncReadMixin, viewsets.ModelViewSet):
     """Viewset для работы с моделью рецептов"""
 
     queryset = Recipe.objects.all()
     serializer_class = RecipeReadSerializer
     permission_classes = (IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly)
-    pagination_class = StandardResultsSetPagination
+    pagination_class = RecipeResultsSetPagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    vary_on_user = True
+    async_actions = ('list', 'retrieve', 'download_shopping_cart')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method not in SAFE_METHODS:
+            return queryset
+        user = self.request.user
+        if user.is_authenticated:
+            queryset = queryset.annotate(
+                is_favorited=Exists(Favorite.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+                is_in_shopping_cart=Exists(ShoppingList.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+                is_subscribed_to_author=Exists(Subscription.objects.filter(
+                    user=user, following=OuterRef('author'))))
+        return queryset.select_related('author', 'snapshot')
+
+    def get_version_key(self):
+        if self.action == 'retrieve':
+            return DETAIL_VERSION_KEY.format(pk=self.kwargs['pk'])
+        return LIST_VERSION_KEY
 
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
             return RecipeReadSerializer
         return RecipeWriteSerializer
 
+    async def aserialize(self, instance, many=False):
+        """Рецепты без снимка сериализуются в потоке: им нужны запросы."""
+        recipes = instance if many else [instance]
+        if all(map(RecipeReadSerializer.get_snapshot, recipes)):
+            return await super().aserialize(instance, many=many)
+        return await sync_to_async(
+            lambda: self.get_serializer(instance, many=many).data)()
+
+    @transaction.atomic
     def _handle_recipe_action(
-            self, request, pk, model, serializer_class,
-            success_msg, error_msg):
+            self, request, pk, model, exists_error,
+            success_msg, error_msg, on_added=None, on_removed=None):
         user = request.user
+        try:
+            pk = Recipe._meta.pk.get_prep_value(pk)
+        except (TypeError, ValueError):
+            raise Http404
+        if on_added or on_removed:
+            # Итоги корзины читаются и меняются после вставки или удаления,
+            # поэтому такие действия пользователя выполняются по очереди.
+            lock_users([user.id])
         if request.method == 'POST':
-            try:
-                recipe = Recipe.objects.get(id=pk)
-            except Recipe.DoesNotExist:
+            if not model.objects.link(user.id, pk):
+                if not Recipe.objects.filter(pk=pk).exists():
+                    return Response(
+                        {"detail": "Рецепт не найден."},
+                        status=status.HTTP_400_BAD_REQUEST)
                 return Response(
-                    {"detail": "Рецепт не найден."},
-                    status=status.HTTP_400_BAD_REQUEST)
-
-            serializer = serializer_class(
-                data={'recipe': recipe.id}, context={'request': request})
-            serializer.is_valid(raise_exception=True)
-            serializer.save(user=user)
+                    exists_error, status=status.HTTP_400_BAD_REQUEST)
+            if on_added:
+                on_added(user.id, [pk])
+            touch_versions([USER_VERSION_KEY.format(pk=user.id)])
+            serializer = RecipeShortSerializer(
+                Recipe.objects.get(pk=pk), context={'request': request})
             return Response(serializer.data, status=status.HTTP_201_CREATED)
-        else:
-            recipe = get_object_or_404(Recipe, id=pk)
-            try:
-                item = model.objects.get(user=user, recipe=recipe)
-                item.delete()
-                return Response(
-                    {'status': success_msg},
-                    status=status.HTTP_204_NO_CONTENT)
-            except model.DoesNotExist:
-                return Response(
-                    {'error': error_msg},
-                    status=status.HTTP_400_BAD_REQUEST)
+        if not model.objects.unlink(user.id, pk):
+            get_object_or_404(Recipe, pk=pk)
+            return Response(
+                {'error': error_msg},
+                status=status.HTTP_400_BAD_REQUEST)
+        if on_removed:
+            on_removed(user.id, [pk])
+        touch_versions([USER_VERSION_KEY.format(pk=user.id)])
+        return Response(
+            {'status': success_msg},
+            status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=True, methods=['post', 'delete'], url_path='favorite')
     def favorite(self, request, pk=None):
         return self._handle_recipe_action(
             request, pk,
             model=Favorite,
-            serializer_class=FavoriteRecipeSerializer,
+            exists_error={
+                'non_field_errors': ['Рецепт уже находится в избранном.']},
             success_msg='Рецепт удален из избранного.',
             error_msg='Рецепт не найден в избранном.'
         )
@@ -108,54 +190,193 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return self._handle_recipe_action(
             request, pk,
             model=ShoppingList,
-            serializer_class=ShoppingListSerializer,
+            exists_error={'recipe': ['Этот рецепт уже в списке покупок']},
             success_msg='Рецепт удален из списка покупок.',
-            error_msg='Рецепта не было в вашем списке покупок.'
+            error_msg='Рецепта не было в вашем списке покупок.',
+            on_added=add_recipes_to_totals,
+            on_removed=remove_recipes_from_totals
+        )
+
+    @transaction.atomic
+    def _handle_recipe_batch_action(
+            self, request, model, messages,
+            on_added=None, on_removed=None):
+        serializer = BatchIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+        user = request.user
+        lock_users([user.id])
+        linked = dict(Recipe.objects.filter(pk__in=ids).annotate(
+            linked=Exists(model.objects.filter(
+                user=user, recipe=OuterRef('pk')))
+        ).values_list('pk', 'linked'))
+        if request.method == 'POST':
+            changed = [pk for pk in ids if linked.get(pk) is False]
+            model.objects.bulk_create(
+                [model(user=user, recipe_id=pk) for pk in changed],
+                ignore_conflicts=True)
+            if on_added:
+                on_added(user.id, changed)
+            touch_versions([USER_VERSION_KEY.format(pk=user.id)])
+        else:
+            changed = [pk for pk in ids if linked.get(pk)]
+            if on_removed:
+                on_removed(user.id, changed)
+            model.objects.filter(user=user, recipe_id__in=changed).delete()
+        results = []
+        for pk in ids:
+            if pk not in linked:
+                results.append(batch_result(
+                    pk, status.HTTP_400_BAD_REQUEST
+                    if request.method == 'POST'
+                    else status.HTTP_404_NOT_FOUND,
+                    messages['not_found']))
+            elif request.method == 'POST' and linked[pk]:
+                results.append(batch_result(
+                    pk, status.HTTP_400_BAD_REQUEST, messages['exists']))
+            elif request.method == 'POST':
+                results.append(batch_result(
+                    pk, status.HTTP_201_CREATED, messages['added']))
+            elif linked[pk]:
+                results.append(batch_result(
+                    pk, status.HTTP_204_NO_CONTENT, messages['removed']))
+            else:
+                results.append(batch_result(
+                    pk, status.HTTP_400_BAD_REQUEST, messages['missing']))
+        return Response(results)
+
+    @action(detail=False, methods=['post', 'delete'],
+            url_path='batch_favorite',
+            permission_classes=[IsAuthenticated])
+    def batch_favorite(self, request):
+        return self._handle_recipe_batch_action(
+            request,
+            model=Favorite,
+            messages={
+                'added': 'Рецепт добавлен в избранное.',
+                'removed': 'Рецепт удален из избранного.',
+                'exists': 'Рецепт уже находится в избранном.',
+                'missing': 'Рецепт не найден в избранном.',
+                'not_found': 'Рецепт не найден.',
+            }
+        )
+
+    @action(detail=False, methods=['post', 'delete'],
+            url_path='batch_shopping_cart',
+            permission_classes=[IsAuthenticated])
+    def batch_shopping_cart(self, request):
+        return self._handle_recipe_batch_action(
+            request,
+            model=ShoppingList,
+            messages={
+                'added': 'Рецепт добавлен в список покупок.',
+                'removed': 'Рецепт удален из списка покупок.',
+                'exists': 'Этот рецепт уже в списке покупок',
+                'missing': 'Рецепта не было в вашем списке покупок.',
+                'not_found': 'Рецепт не найден.',
+            },
+            on_added=add_recipes_to_totals,
+            on_removed=remove_recipes_from_totals
         )
 
+    @action(detail=False, methods=['get'], url_path='feed',
+            permission_classes=[IsAuthenticated],
+            pagination_class=FeedCursorPagination)
+    def feed(self, request):
+        return self.conditional_response(
+            request, partial(self.list_feed, request))
+
+    def list_feed(self, request):
+        entries = self.paginate_queryset(FeedEntry.objects.filter(
+            user=request.user).only('recipe', 'created_at'))
+        recipe_ids = [entry.recipe_id for entry in entries]
+        recipes = self.get_queryset().in_bulk(recipe_ids)
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in recipe_ids if pk in recipes], many=True)
+        return self.get_paginated_response(serializer.data)
+
     @action(detail=False, methods=['get'],
             url_path='download_shopping_cart',
-            permission_classes=[IsAuthenticated])
+            permission_classes=[IsAuthenticated],
+            renderer_classes=SHOPPING_LIST_RENDERERS)
     def download_shopping_cart(self, request):
-        user = request.user
-        shopping_items = self.get_shopping_list_data(user)
-        filename = f'{user.username}_shopping_list.csv'
-        return self.prepare_and_send_csv(shopping_items, filename, user)
+        shopping_items = self.get_shopping_list_data(request.user).iterator(
+            chunk_size=SHOPPING_LIST_CHUNK_SIZE)
+        return self.shopping_list_response(
+            request, request.accepted_renderer.stream(shopping_items))
+
+    async def adownload_shopping_cart(self, request):
+        shopping_items = self.get_shopping_list_data(request.user).aiterator(
+            chunk_size=SHOPPING_LIST_CHUNK_SIZE)
+        return self.shopping_list_response(
+            request, request.accepted_renderer.astream(shopping_items))
+
+    def shopping_list_response(self, request, content):
+        renderer = request.accepted_renderer
+        filename = (f'{request.user.username}_shopping_list.'
+                    f'{renderer.format}')
+        return StreamingHttpResponse(
+            content,
+            content_type=f'{renderer.media_type}; charset={renderer.charset}',
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
+        )
+
+    @action(detail=False, methods=['get'],
+            url_path='shopping_cart_summary',
+            permission_classes=[IsAuthenticated])
+    def shopping_cart_summary(self, request):
+        totals = ShoppingListTotal.objects.filter(
+            user=request.user
+        ).select_related('ingredient').order_by('ingredient__name')
+        serializer = ShoppingListTotalSerializer(totals, many=True)
+        return Response(serializer.data)
 
     def get_shopping_list_data(self, user):
-        return IngredientRecipe.objects.filter(
-            recipe__shopping_lists__user=user
+        return ShoppingListTotal.objects.filter(
+            user=user
         ).values(
             'ingredient__name', 'ingredient__measurement_unit'
         ).annotate(
-            total_amount=Sum('amount')
+            total_amount=F('amount')
         ).order_by('ingredient__name')
 
-    def prepare_and_send_csv(self, shopping_items, filename, user):
-        response = HttpResponse(
-            content_type='text/csv',
-            headers={'Content-Disposition': f'attachment; filename={filename}'}
-        )
-        writer = csv.writer(response)
-        writer.writerow(['Ingredient', 'Amount', 'Unit'])
-        for item in shopping_items:
-            writer.writerow([item['ingredient__name'],
-                             item['total_amount'],
-                             item['ingredient__measurement_unit']])
-        return response
-
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(AsyncReadMixin, viewsets.ModelViewSet):
     """Viewset для работы с моделью пользователя"""
 
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = StandardResultsSetPagination
+    async_actions = ('list_subscriptions',)
+
+    def get_subscriptions_queryset(self, queryset):
+        """
+        Аннотирует авторов числом рецептов и подгружает их последние рецепты.
+
+        Первые recipes_limit рецептов каждого автора выбираются одним
+        запросом через ROW_NUMBER() с разбиением по автору.
+        """
+        recipes = Recipe.objects.only(
+            'id', 'author_id', 'name', 'image', 'image_variants',
+            'cooking_time')
+        limit = self.request.query_params.get('recipes_limit')
+        if limit and limit.isdigit():
+            recipes = recipes.annotate(row_number=Window(
+                RowNumber(), partition_by=F('author'),
+                order_by=RECIPE_CURSOR_ORDERING)
+            ).filter(row_number__lte=int(limit))
+        return queryset.annotate(
+            recipes_count=Count('recipes', distinct=True),
+            is_subscribed=Exists(Subscription.objects.filter(
+                user=self.request.user, following=OuterRef('pk')))
+        ).order_by(*User._meta.ordering).prefetch_related(
+            Prefetch('recipes', queryset=recipes))
 
     @action(methods=['get'], detail=False, url_path='subscriptions')
     def list_subscriptions(self, request):
-        following_users = User.objects.filter(following__user=request.user)
+        following_users = self.get_subscriptions_queryset(
+            User.objects.filter(following__user=request.user))
         page = self.paginate_queryset(following_users)
         if page is not None:
             serializer = SubscriptionSerializer(
@@ -165,25 +386,119 @@ class UserViewSet(viewsets.ModelViewSet):
             following_users, many=True, context={'request': request})
         return Response(serializer.data)
 
+    async def alist_subscriptions(self, request):
+        following_users = self.get_subscriptions_queryset(
+            User.objects.filter(following__user=request.user))
+        page = await self.apaginate_queryset(following_users)
+        if page is not None:
+            serializer = SubscriptionSerializer(
+                page, many=True, context={'request': request})
+            return self.get_paginated_response(serializer.data)
+        serializer = SubscriptionSerializer(
+            [user async for user in following_users], many=True,
+            context={'request': request})
+        return Response(serializer.data)
+
     @action(detail=True, methods=['post', 'delete'], url_path='subscribe')
+    @transaction.atomic
     def subscribe_or_unsubscribe(self, request, pk=None):
+        user = request.user
+        try:
+            pk = User._meta.pk.get_prep_value(pk)
+        except (TypeError, ValueError):
+            raise Http404
         if request.method == 'POST':
-            user = request.user
-            following = get_object_or_404(User, id=pk)
-            serializer = SubscribeSerializer(
-                data={'following': following.id}, context={'request': request})
-            serializer.is_valid(raise_exception=True)
-            serializer.save(user=user)
-            return Response(
-                serializer.data, status=status.HTTP_201_CREATED)
-        else:
-            following = get_object_or_404(User, id=pk)
-            try:
-                subscription = Subscription.objects.get(
-                    user=request.user, following=following.id)
-            except Subscription.DoesNotExist:
+            if pk == user.id:
+                return Response(
+                    {'non_field_errors': [
+                        'Вы не можете подписаться на себя.']},
+                    status=status.HTTP_400_BAD_REQUEST)
+            if not Subscription.objects.link(user.id, pk):
+                get_object_or_404(User, pk=pk)
                 return Response(
-                    {"detail": "Подписка не найдена."},
+                    {'non_field_errors': [
+                        'Вы уже подписаны на этого пользователя.']},
                     status=status.HTTP_400_BAD_REQUEST)
-            subscription.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
+            backfill_feed(user.id, [pk])
+            touch_versions([USER_VERSION_KEY.format(pk=user.id)])
+            serializer = SubscriptionSerializer(
+                self.get_subscriptions_queryset(User.objects).get(pk=pk),
+                context={'request': request})
+            return Response(
+                serializer.data, status=status.HTTP_201_CREATED)
+        if not Subscription.objects.unlink(user.id, pk):
+            get_object_or_404(User, pk=pk)
+            return Response(
+                {"detail": "Подписка не найдена."},
+                status=status.HTTP_400_BAD_REQUEST)
+        trim_feed(user.id, [pk])
+        touch_versions([USER_VERSION_KEY.format(pk=user.id)])
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=False, methods=['post', 'delete'],
+            url_path='batch_subscribe')
+    @transaction.atomic
+    def batch_subscribe(self, request):
+        serializer = BatchIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+        user = request.user
+        lock_users([user.id])
+        subscribed = dict(User.objects.filter(pk__in=ids).annotate(
+            subscribed=Exists(Subscription.objects.filter(
+                user=user, following=OuterRef('pk')))
+        ).values_list('pk', 'subscribed'))
+        results = []
+        if request.method == 'POST':
+            changed = [
+                pk for pk in ids
+                if subscribed.get(pk) is False and pk != user.id]
+            Subscription.objects.bulk_create(
+                [Subscription(user=user, following_id=pk) for pk in changed],
+                ignore_conflicts=True)
+            backfill_feed(user.id, changed)
+            touch_versions([USER_VERSION_KEY.format(pk=user.id)])
+            for pk in ids:
+                if pk not in subscribed:
+                    results.append(batch_result(
+                        pk, status.HTTP_404_NOT_FOUND,
+                        'Пользователь не найден.'))
+                elif pk == user.id:
+                    results.append(batch_result(
+                        pk, status.HTTP_400_BAD_REQUEST,
+                        'Вы не можете подписаться на себя.'))
+                elif subscribed[pk]:
+                    results.append(batch_result(
+                        pk, status.HTTP_400_BAD_REQUEST,
+                        'Вы уже подписаны на этого пользователя.'))
+                else:
+                    results.append(batch_result(
+                        pk, status.HTTP_201_CREATED,
+                        'Подписка оформлена.'))
+            return Response(results)
+        changed = [pk for pk in ids if subscribed.get(pk)]
+        Subscription.objects.filter(
+            user=user, following_id__in=changed).delete()
+        for pk in ids:
+            if pk not in subscribed:
+                results.append(batch_result(
+                    pk, status.HTTP_404_NOT_FOUND,
+                    'Пользователь не найден.'))
+            elif subscribed[pk]:
+                results.append(batch_result(
+                    pk, status.HTTP_204_NO_CONTENT, 'Подписка отменена.'))
+            else:
+                results.append(batch_result(
+                    pk, status.HTTP_400_BAD_REQUEST, 'Подписка не найдена.'))
+        return Response(results)
+
+
+class MetricsView(APIView):
+    """Метрики запросов в текстовом формате Prometheus для персонала."""
+
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return HttpResponse(
+            render_prometheus(),
+            content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,137 @@
+import time
+from hashlib import sha256
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework import authentication, exceptions
+
+from recipes.metrics import (
+    TOKEN_CACHE_HIT_SECONDS, TOKEN_CACHE_HITS, TOKEN_CACHE_MISS_SECONDS,
+    TOKEN_CACHE_MISSES, registry)
+
+TOKEN_CACHE_KEY = 'auth:token:{digest}'
+
+
+def get_token_cache():
+    """Возвращает кэш соответствий токенов пользователям."""
+    return caches[settings.TOKEN_CACHE_ALIAS]
+
+
+def token_cache_key(key):
+    """Возвращает ключ кэша для токена; сам токен в ключ не попадает."""
+    return TOKEN_CACHE_KEY.format(digest=sha256(key.encode()).hexdigest())
+
+
+def invalidate_tokens(keys):
+    """Удаляет токены из кэша, чтобы следующий запрос проверил их в базе."""
+    get_token_cache().delete_many([token_cache_key(key) for key in keys])
+
+
+class TokenCacheStats:
+    """
+    Счетчики попаданий в кэш токенов и времени поиска.
+
+    Счетчики ведет реестр метрик: каждый процесс сбрасывает их
+    в METRICS_DIR, поэтому итоги складываются по всем воркерам
+    независимо от бэкенда кэша токенов.
+    """
+
+    def record(self, hit, seconds):
+        """Учитывает поиск токена."""
+        if hit:
+            registry.increment(TOKEN_CACHE_HITS)
+            registry.increment(TOKEN_CACHE_HIT_SECONDS, seconds)
+        else:
+            registry.increment(TOKEN_CACHE_MISSES)
+            registry.increment(TOKEN_CACHE_MISS_SECONDS, seconds)
+
+    def totals(self):
+        """Возвращает общие счетчики всех процессов."""
+        _routes, _responses, counters = registry.collect()
+        return {
+            'hits': counters[TOKEN_CACHE_HITS],
+            'misses': counters[TOKEN_CACHE_MISSES],
+            'hit_seconds': counters[TOKEN_CACHE_HIT_SECONDS],
+            'miss_seconds': counters[TOKEN_CACHE_MISS_SECONDS],
+        }
+
+
+token_cache_stats = TokenCacheStats()
+
+
+class TokenAuthentication(authentication.TokenAuthentication):
+    """
+    Аутентификация по токену с кэшем и асинхронным вариантом для ASGI.
+
+    Токен вместе с пользователем хранится в кэше TOKEN_CACHE_ALIAS
+    TOKEN_CACHE_TIMEOUT секунд. Выход, смена пароля и деактивация
+    удаляют его из кэша (см. users.signals).
+    """
+
+    def get_key(self, request):
+        """Возвращает ключ из заголовка Authorization или None."""
+        auth = authentication.get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) == 1:
+            raise exceptions.AuthenticationFailed(
+                _('Invalid token header. No credentials provided.'))
+        if len(auth) > 2:
+            raise exceptions.AuthenticationFailed(_(
+                'Invalid token header. '
+                'Token string should not contain spaces.'))
+        try:
+            return auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed(_(
+                'Invalid token header. '
+                'Token string should not contain invalid characters.'))
+
+    def authenticate(self, request):
+        key = self.get_key(request)
+        if key is None:
+            return None
+        return self.authenticate_credentials(key)
+
+    def authenticate_credentials(self, key):
+        started = time.perf_counter()
+        cache = get_token_cache()
+        cache_key = token_cache_key(key)
+        token = cache.get(cache_key)
+        hit = token is not None
+        if not hit:
+            model = self.get_model()
+            try:
+                token = model.objects.select_related('user').get(key=key)
+            except model.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            cache.set(cache_key, token, settings.TOKEN_CACHE_TIMEOUT)
+        token_cache_stats.record(hit, time.perf_counter() - started)
+        return self.check_user(token)
+
+    async def aauthenticate(self, request):
+        key = self.get_key(request)
+        if key is None:
+            return None
+        started = time.perf_counter()
+        cache = get_token_cache()
+        cache_key = token_cache_key(key)
+        token = await cache.aget(cache_key)
+        hit = token is not None
+        if not hit:
+            model = self.get_model()
+            try:
+                token = await model.objects.select_related('user').aget(
+                    key=key)
+            except model.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            await cache.aset(cache_key, token, settings.TOKEN_CACHE_TIMEOUT)
+        token_cache_stats.record(hit, time.perf_counter() - started)
+        return self.check_user(token)
+
+    def check_user(self, token):
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.'))
+        return token.user, token
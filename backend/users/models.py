@@ -2,6 +2,7 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 
 from recipes.constants import RETURN_STR_LENGTH
+from recipes.managers import UserRelationManager
 from users.constants import EMAIL_MAX_LENGTH, USER_MAX_LENGTH
 from users.validators import validate_username
 
@@ -42,6 +43,8 @@ class Subscription(models.Model):
         User, verbose_name='Подписка',
         on_delete=models.CASCADE, related_name='following')
 
+    objects = UserRelationManager('following')
+
     class Meta:
         verbose_name = 'подписка'
         verbose_name_plural = 'Подписки'
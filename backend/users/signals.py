@@ -0,0 +1,40 @@
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from users.authentication import invalidate_tokens
+
+User = get_user_model()
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """
+    Сбрасывает кэш удаленного токена: выход или удаление пользователя.
+
+    Запись удаляется после фиксации: иначе параллельный запрос успел бы
+    снова закэшировать еще не удаленный в базе токен.
+    """
+    transaction.on_commit(partial(invalidate_tokens, [instance.key]))
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, update_fields=None,
+                           **kwargs):
+    """
+    Сбрасывает кэш токенов пользователя после изменения его данных.
+
+    Так смена пароля и деактивация действуют сразу. Обновление одного
+    last_login при входе кэш не сбрасывает.
+    """
+    if created or (update_fields is not None
+                   and set(update_fields) <= {'last_login'}):
+        return
+    keys = list(
+        Token.objects.filter(user=instance).values_list('key', flat=True))
+    if keys:
+        transaction.on_commit(partial(invalidate_tokens, keys))